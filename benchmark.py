@@ -0,0 +1,848 @@
+# -*- coding: utf-8 -*-
+"""
+QQ NT 聊天记录导出性能测试工具
+
+功能:
+- 生成合成的 QQ NT 数据库 (nt_msg.decrypt.db 与 profile_info.decrypt.db)，无需真实的聊天记录。
+  消息内容覆盖 MSG_TYPE_MAP 中的全部类型，并包含引用、灰字提示、Ark卡片以及用于触发“内容抢救”的损坏数据。
+- 按阶段 (查询、解码、各格式写入) 计时，报告每秒处理的消息数与内存峰值。
+- 可与之前保存的结果比较，吞吐量下降超过阈值时以退出码 1 结束，便于发现性能退化。
+- 一致性校验 (verify)：检查各项加速手段的结果与原有实现相同——快速Protobuf解码与 blackboxprotobuf、
+  时间格式化与 datetime、增量解密与完整解密、增量导出与完整导出，发现不一致时以退出码 1 结束。
+
+用法:
+    python benchmark.py generate --rows 1M --workdir bench_data
+    python benchmark.py run --workdir bench_data --json result.json
+    python benchmark.py run --workdir bench_data --baseline result.json
+    python benchmark.py verify --workdir bench_data
+
+依赖:
+- 与 export_chats.py 相同 (blackboxprotobuf)。
+- 增量解密的一致性校验需要 pycryptodome 或 cryptography (与 qqnt_decrypt.py 相同)，缺少时跳过该项。
+"""
+
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import random
+import shutil
+import struct
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+from bisect import bisect
+from datetime import datetime
+
+try:
+    import resource # 仅 Unix 可用，用于读取内存峰值
+except ImportError:
+    resource = None
+
+import export_chats as ec
+import blackboxprotobuf
+import qqnt_decrypt as qd
+
+# --- 常量定义 ---
+_DEFAULT_PEERS = 200 # 默认的会话 (好友) 数量
+_NON_FRIEND_RATIO = 0.1 # 非好友会话数量占好友数量的比例
+_GROUP_NAMES = ["我的好友", "同学", "同事", "家人", "特别关心"]
+_INSERT_BATCH_SIZE = 10000 # 生成数据时每批写入的行数
+_REGRESSION_THRESHOLD = 0.15 # 与基准结果比较时允许的吞吐量下降比例
+_MY_UID = "u_bench_master"
+_MY_QQ = 10000
+_START_TS = int(datetime(2021, 1, 1).timestamp())
+_VERIFY_DECODER_SAMPLES = 20000 # 解码一致性校验从数据库中取的消息数 (另有同样数量的改写副本)
+_VERIFY_FORMATTER_SAMPLES = 200000 # 时间格式化一致性校验在每个时区下依次格式化的时间戳数量
+_VERIFY_TIMEZONES = ["Asia/Shanghai", "UTC", "America/New_York", "Europe/London", "Australia/Lord_Howe", "America/Santiago"]
+_VERIFY_SITE_PAGE_SIZE = 200 # 增量导出校验中 HTML 分页站点每页的消息数
+_VERIFY_MAX_REPORTS = 5 # 每项校验最多列出的不一致详情
+_RUN_TIMESTAMP_RE = re.compile(r"_\d{10}(?![0-9])") # 导出文件 (及分页站点目录) 名中的运行时间戳
+_GEN_TIME_RE = re.compile(r"(文件生成时间:(?:</strong>)?) [0-9: -]+")
+_DB_HASH_RE = re.compile(r"(\(sha256\): (?:<code>)?)[0-9a-f]{64}")
+
+_WORDS = ["你好", "哈哈哈", "在吗", "晚上一起吃饭", "收到", "好的", "明天见", "hello", "ok", "233",
+          "这个怎么弄", "https://example.com/a?b=1", "<b>&amp;</b>", "[表情]", "😀", "换行\n第二行"]
+
+# --- Protobuf 编码 ---
+def _varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7f
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+def _vi(field, value):
+    """varint 字段"""
+    return _varint(int(field) << 3) + _varint(value)
+
+def _ld(field, data):
+    """长度分隔字段 (字节串、字符串或嵌套消息)"""
+    if isinstance(data, str): data = data.encode("utf-8")
+    return _varint((int(field) << 3) | 2) + _varint(len(data)) + data
+
+def _seg(msg_type, *fields):
+    """构建一个消息段 (40800 容器中的一项)"""
+    return _ld(ec.PB_MSG_CONTAINER, _vi(ec.PB_MSG_TYPE, msg_type) + b"".join(fields))
+
+# --- 合成消息 ---
+def _text(rng):
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 6)))
+
+def _ark(rng):
+    kind = rng.randrange(7)
+    if kind == 0:
+        data = {"app": "com.tencent.map", "view": "LocationShare", "prompt": "[位置]",
+                "meta": {"Location.Search": {"name": "人民广场", "address": "上海市黄浦区"}}}
+    elif kind == 1:
+        data = {"app": "com.tencent.music.lua", "view": "music", "prompt": "[分享]",
+                "meta": {"music": {"title": "晴天", "desc": "周杰伦"}}}
+    elif kind == 2:
+        data = {"app": "com.tencent.contact.lua", "prompt": "推荐联系人: 某某"}
+    elif kind == 3:
+        data = {"app": "com.tencent.miniapp_01", "prompt": "[QQ小程序]哔哩哔哩"}
+    elif kind == 4:
+        data = {"app": "com.tencent.multimsg", "prompt": "[聊天记录]",
+                "meta": {"detail": {"source": "群聊的聊天记录", "summary": "查看3条转发消息"}}}
+    elif kind == 5:
+        data = {"app": "com.tencent.unknown", "prompt": "[未知卡片]"} # 被过滤的卡片
+    else:
+        return _seg(10, _ld(ec.PB_ARK_JSON, "{not json")) # 解析失败的卡片
+    return _seg(10, _ld(ec.PB_ARK_JSON, json.dumps(data, ensure_ascii=False)))
+
+def _gray_tip(rng, sender, peer):
+    kind = rng.randrange(3)
+    if kind == 0: # 拍一拍
+        xml = f'<gtip><qq uin="{sender}" /><nor txt="拍了拍"/><qq uin="{peer}" /><nor txt="的肩膀"/></gtip>'
+        return _seg(8, _ld(ec.PB_GRAYTIP_INTERACTIVE_XML, xml))
+    if kind == 1: # 撤回
+        return _seg(8, _ld(ec.PB_RECALLER_UID, sender), _ld(ec.PB_RECALLER_NAME, "撤回者"), _ld(ec.PB_RECALL_SUFFIX, "你猜猜撤回了什么。"))
+    return _seg(8, _vi(ec.PB_MSG_SUBTYPE, 1)) # 其他灰字提示 (被过滤)
+
+def _reply(rng, history, peer):
+    origin_ts, origin_sender, origin_receiver = rng.choice(history)
+    origin_obj = _vi(ec.PB_MSG_TYPE, 1) + _ld(ec.PB_TEXT_CONTENT, "原消息内容")
+    summary = "" if rng.random() < 0.3 else "原消息摘要" # 摘要为空时使用内嵌的原消息对象
+    quote = _seg(7, _ld(ec.PB_REPLY_ORIGIN_SENDER_UID, origin_sender), _ld(ec.PB_REPLY_ORIGIN_RECEIVER_UID, origin_receiver),
+                 _vi(ec.PB_REPLY_ORIGIN_TS, origin_ts), _ld(ec.PB_REPLY_ORIGIN_SUMMARY_TEXT, summary),
+                 _ld(ec.PB_REPLY_ORIGIN_OBJ, origin_obj))
+    return quote + _seg(1, _ld(ec.PB_TEXT_CONTENT, _text(rng)))
+
+def _corrupted(rng):
+    """损坏的消息内容，用于覆盖内容抢救逻辑"""
+    kind = rng.randrange(3)
+    if kind == 0:
+        return b"\x0a\xff\xfe\x01garbage[\xe5\x9b\xbe\xe7\x89\x87]"
+    if kind == 1:
+        return _seg(1, _ld(ec.PB_TEXT_CONTENT, "被截断的消息"))[:-4]
+    return bytes(rng.randrange(256) for _ in range(rng.randint(8, 64)))
+
+# (权重, 生成函数)，生成函数参数为 (rng, 发送者, 会话, 该会话已有消息)
+_MESSAGE_KINDS = [
+    (40, lambda rng, s, p, h: _seg(1, _ld(ec.PB_TEXT_CONTENT, _text(rng)))),
+    (8, lambda rng, s, p, h: _seg(2, _vi(ec.PB_MSG_SUBTYPE, 0), _vi(ec.PB_IMG_WIDTH, 1080), _vi(ec.PB_IMG_HEIGHT, 1920))),
+    (1, lambda rng, s, p, h: _seg(2, _vi(ec.PB_IMAGE_IS_FLASH, 1))),
+    (2, lambda rng, s, p, h: _seg(2, _vi(ec.PB_MSG_SUBTYPE, 7), _ld(ec.PB_STICKER_DESC, "[嘿嘿]"))),
+    (1, lambda rng, s, p, h: _seg(2, _vi(ec.PB_MSG_SUBTYPE, 1), _ld(ec.PB_APOLLO_TEXT, "七夕快乐"))),
+    (1, lambda rng, s, p, h: _seg(3, _ld(ec.PB_FILE_NAME, "报告.pdf"))),
+    (3, lambda rng, s, p, h: _seg(4, _vi(ec.PB_VOICE_DURATION, rng.randint(1, 60)), _ld(ec.PB_VOICE_TO_TEXT, "语音转文字"))),
+    (2, lambda rng, s, p, h: _seg(5, _vi(ec.PB_VID_DURATION, 75), _vi(ec.PB_VID_WIDTH, 1280), _vi(ec.PB_VID_HEIGHT, 720))),
+    (5, lambda rng, s, p, h: _seg(6, _ld(ec.PB_EMOJI_DESC, "/捂脸"))),
+    (1, lambda rng, s, p, h: _seg(6, _vi(ec.PB_MSG_SUBTYPE, 5), _vi(ec.PB_INTERACTIVE_EMOJI_ID, rng.randint(1, 6)))),
+    (8, lambda rng, s, p, h: _reply(rng, h, p) if h else _seg(1, _ld(ec.PB_TEXT_CONTENT, _text(rng)))),
+    (4, lambda rng, s, p, h: _gray_tip(rng, s, p)),
+    (1, lambda rng, s, p, h: _seg(9, _vi(ec.PB_REDPACKET_TYPE, rng.choice([2, 6, 15, 3])), _ld(ec.PB_REDPACKET_INFO, _ld(ec.PB_REDPACKET_TITLE, "恭喜发财")))),
+    (2, lambda rng, s, p, h: _ark(rng)),
+    (1, lambda rng, s, p, h: _seg(11, _ld(ec.PB_MARKET_FACE_TEXT, "[贴贴]"))),
+    (1, lambda rng, s, p, h: _seg(14, _ld(ec.PB_TEXT_CONTENT, "**Markdown** 消息"))),
+    (1, lambda rng, s, p, h: _seg(21, _ld(ec.PB_CALL_STATUS, "通话时长 00:10"), _vi(ec.PB_CALL_TYPE, rng.choice([1, 2])))),
+    (1, lambda rng, s, p, h: _seg(27, _ld(ec.PB_GIFT_TEXT, "[榴莲]x1"))),
+    (1, lambda rng, s, p, h: _seg(28, _ld(ec.PB_LOCATION_SHARE_TEXT, "发起了位置共享"))),
+    (3, lambda rng, s, p, h: _seg(1, _ld(ec.PB_TEXT_CONTENT, _text(rng))) + _seg(6, _ld(ec.PB_EMOJI_DESC, "/微笑"))),
+    (1, lambda rng, s, p, h: _corrupted(rng)),
+]
+
+def parse_count(value: str) -> int:
+    """解析行数参数，支持 k/M 后缀 (如 10k、2.5M)。"""
+    value = value.strip().lower()
+    scale = {'k': 1000, 'm': 1000 ** 2}.get(value[-1:], 1)
+    if scale != 1: value = value[:-1]
+    try:
+        count = int(float(value) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的行数: '{value}'")
+    if count <= 0:
+        raise argparse.ArgumentTypeError("行数必须大于 0。")
+    return count
+
+def generate_fixture(workdir, rows, peers=_DEFAULT_PEERS, seed=1):
+    """在 workdir 中生成合成的 nt_msg.decrypt.db 与 profile_info.decrypt.db (已存在时覆盖)。"""
+    rng = random.Random(seed)
+    os.makedirs(workdir, exist_ok=True)
+    msg_db_path = os.path.join(workdir, ec._DB_FILENAME)
+    profile_db_path = os.path.join(workdir, ec._PROFILE_DB_FILENAME)
+    for path in (msg_db_path, profile_db_path, os.path.join(workdir, ec._INDEX_DB_FILENAME), os.path.join(workdir, ec._DECODE_CACHE_FILENAME)):
+        if os.path.exists(path): os.remove(path)
+
+    friends = [f"u_bench_friend_{i:06d}" for i in range(peers)]
+    non_friends = [f"u_bench_stranger_{i:06d}" for i in range(max(1, int(peers * _NON_FRIEND_RATIO)))]
+
+    # 1. 用户信息数据库
+    print(f"正在生成 '{profile_db_path}' ({len(friends)} 个好友, {len(non_friends)} 个非好友)...")
+    with sqlite3.connect(profile_db_path) as con:
+        group_list = b"".join(_ld(ec.PROF_COL_GROUP_LIST_PB, _vi(ec.PB_GROUP_ID, gid) + _ld(ec.PB_GROUP_NAME, name))
+                              for gid, name in enumerate(_GROUP_NAMES))
+        con.execute(f'CREATE TABLE {ec.CATEGORY_LIST_TABLE} ("{ec.PROF_COL_UID}" TEXT, "{ec.PROF_COL_GROUP_LIST_PB}" BLOB)')
+        con.execute(f'INSERT INTO {ec.CATEGORY_LIST_TABLE} VALUES (?, ?)', (_MY_UID, group_list))
+        con.execute(f'CREATE TABLE {ec.PROFILE_INFO_TABLE} ("{ec.PROF_COL_UID}" TEXT, "{ec.PROF_COL_QID}" TEXT, "{ec.PROF_COL_QQ}" INTEGER, '
+                    f'"{ec.PROF_COL_NICKNAME}" TEXT, "{ec.PROF_COL_REMARK}" TEXT, "{ec.PROF_COL_SIGNATURE}" TEXT)')
+        con.execute(f'CREATE TABLE {ec.BUDDY_LIST_TABLE} ("{ec.PROF_COL_UID}" TEXT, "{ec.PROF_COL_QQ}" INTEGER, "{ec.PROF_COL_GROUP_ID}" INTEGER)')
+        profiles = [(_MY_UID, "", _MY_QQ, "主人", "", "个性签名")]
+        profiles += [(uid, "", 20000 + i, f"好友{i}", f"备注{i}" if i % 3 == 0 else "", "") for i, uid in enumerate(friends)]
+        profiles += [(uid, "", 900000 + i, f"陌生人{i}", "", "") for i, uid in enumerate(non_friends)]
+        con.executemany(f'INSERT INTO {ec.PROFILE_INFO_TABLE} VALUES (?, ?, ?, ?, ?, ?)', profiles)
+        con.executemany(f'INSERT INTO {ec.BUDDY_LIST_TABLE} VALUES (?, ?, ?)',
+                        [(uid, 20000 + i, i % len(_GROUP_NAMES)) for i, uid in enumerate(friends)])
+
+    # 2. 消息数据库：会话的消息量按长尾分布，时间戳整体递增
+    print(f"正在生成 '{msg_db_path}' ({rows} 条消息)...")
+    all_peers = friends + non_friends
+    peer_weights = list(_cumulative(1.0 / (i + 1) ** 0.8 for i in range(len(all_peers))))
+    kind_weights = list(_cumulative(weight for weight, _ in _MESSAGE_KINDS))
+    history = {} # 每个会话最近的消息 (时间戳, 发送者, 接收者)，供引用消息使用
+
+    def messages():
+        ts = _START_TS
+        for _ in range(rows):
+            ts += rng.choice((0, 1, 5, 30, 60, 600, 3600, 40000))
+            peer = all_peers[bisect(peer_weights, rng.random() * peer_weights[-1])]
+            sender = _MY_UID if rng.random() < 0.5 else peer
+            peer_history = history.setdefault(peer, [])
+            build = _MESSAGE_KINDS[bisect(kind_weights, rng.random() * kind_weights[-1])][1]
+            yield sender, peer, ts, build(rng, sender, peer, peer_history)
+            peer_history.append((ts, sender, peer if sender == _MY_UID else _MY_UID))
+            if len(peer_history) > 16: del peer_history[:8]
+
+    with sqlite3.connect(msg_db_path) as con:
+        con.execute("PRAGMA journal_mode = OFF")
+        con.execute("PRAGMA synchronous = OFF")
+        con.execute(f'CREATE TABLE {ec.TABLE_NAME} ("40001" INTEGER PRIMARY KEY, "{ec.COL_SENDER_UID}" TEXT, '
+                    f'"{ec.COL_PEER_UID}" TEXT, "{ec.COL_TIMESTAMP}" INTEGER, "{ec.COL_MSG_CONTENT}" BLOB)')
+        insert = (f'INSERT INTO {ec.TABLE_NAME} ("{ec.COL_SENDER_UID}", "{ec.COL_PEER_UID}", "{ec.COL_TIMESTAMP}", "{ec.COL_MSG_CONTENT}") '
+                  f'VALUES (?, ?, ?, ?)')
+        generated = 0
+        batch = []
+        for message in messages():
+            batch.append(message)
+            if len(batch) >= _INSERT_BATCH_SIZE:
+                con.executemany(insert, batch)
+                generated += len(batch)
+                batch = []
+                print(f"\r  已生成 {generated}/{rows} 条", end="", flush=True)
+        if batch:
+            con.executemany(insert, batch)
+            generated += len(batch)
+        print(f"\r  已生成 {generated}/{rows} 条")
+    print("生成完毕。")
+
+def _cumulative(weights):
+    total = 0
+    for weight in weights:
+        total += weight
+        yield total
+
+# --- 性能测试 ---
+class StageTimer:
+    """累计各阶段耗时。timed() 包装迭代器，将每次取值的耗时计入指定阶段。"""
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, stage, elapsed):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+
+    def timed(self, iterable, stage):
+        it = iter(iterable)
+        clock = time.perf_counter
+        while True:
+            start = clock()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(stage, clock() - start)
+                return
+            self.add(stage, clock() - start)
+            yield item
+
+def _peak_rss_mb():
+    """当前进程的内存峰值 (MB)，不支持的平台返回 None。"""
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1) # macOS 单位为字节，Linux 为KB
+
+def _setup_paths(workdir, output_dir):
+    """设置 export_chats 的路径变量，与其 main() 中的设置方式一致。"""
+    script_dir = os.path.dirname(os.path.abspath(ec.__file__))
+    ec.DB_PATH = os.path.join(workdir, ec._DB_FILENAME)
+    ec.PROFILE_DB_PATH = os.path.join(workdir, ec._PROFILE_DB_FILENAME)
+    ec.INDEX_DB_PATH = os.path.join(workdir, ec._INDEX_DB_FILENAME)
+    ec.DECODE_CACHE_PATH = os.path.join(workdir, ec._DECODE_CACHE_FILENAME)
+    ec.TEMPLATE_DIR_PATH = os.path.join(script_dir, ec._TEMPLATE_DIR_NAME)
+    ec.OUTPUT_DIR = output_dir
+
+def _export_pass(con, peers, profile_mgr, config, formats, timer):
+    """
+    按 export_chats 的单次扫描流程导出全部会话 (每个会话每种格式一个文件)，各阶段耗时计入 timer：
+    query (取行)、decode (解码，已扣除取行)、write_<格式> (对应格式的写入，含打开与关闭文件)。
+    返回 (数据库行数, 有效消息数)。
+    """
+    writer_funcs = {'txt': ec._write_txt, 'md': ec._write_md}
+    scope_info = {'type': 'individual'}
+    row_count = 0
+    message_count = 0
+    for ord_, rows in ec.iter_peer_runs(con, peers):
+        scope_info['friend_uid'] = peers[ord_]
+        process_config = config.copy()
+        process_config['is_timeline'] = False
+        process_config['quote_resolver'] = ec.QuoteResolver(con)
+
+        rows = timer.timed(rows, 'query')
+        records = timer.timed(ec.decode_rows(rows, profile_mgr, process_config), 'decode_total')
+        first_record = next(records, None)
+        if first_record is None: continue
+
+        files = []
+        writers = []
+        for fmt in formats:
+            start = time.perf_counter()
+            f = open(os.path.join(ec.OUTPUT_DIR, f"{ord_}.{fmt}"), "w", encoding="utf-8")
+            if fmt == 'html':
+                writer = ec._write_html(f, profile_mgr, process_config, scope_info)
+            else:
+                writer = writer_funcs[fmt](f, profile_mgr, process_config)
+            next(writer)
+            files.append(f)
+            writers.append((fmt, writer))
+            timer.add(f"write_{fmt}", time.perf_counter() - start)
+
+        clock = time.perf_counter
+        record = first_record
+        while record is not None:
+            message_count += 1
+            for fmt, writer in writers:
+                start = clock()
+                writer.send(record)
+                timer.add(f"write_{fmt}", clock() - start)
+            record = next(records, None)
+
+        for (fmt, writer), f in zip(writers, files):
+            start = time.perf_counter()
+            ec._finish_writer(writer)
+            f.close()
+            timer.add(f"write_{fmt}", time.perf_counter() - start)
+
+    query_time = timer.seconds.get('query', 0.0)
+    timer.seconds['decode'] = timer.seconds.pop('decode_total', 0.0) - query_time
+    row_count = con.execute(f"SELECT COUNT(*) FROM {ec.TABLE_NAME}").fetchone()[0]
+    return row_count, message_count
+
+def run_benchmark(workdir, formats, decode_cache='off', use_index=True, keep_output=False):
+    """
+    对 workdir 中的数据库执行一次完整的性能测试，返回结果字典。
+    :param decode_cache: 'off' 不使用消息解码缓存；'cold' 清空后使用 (含写入缓存的开销)；'warm' 先预热一遍再计时。
+    """
+    workdir = os.path.abspath(workdir)
+    output_dir = tempfile.mkdtemp(prefix="benchmark_output_", dir=workdir)
+    _setup_paths(workdir, output_dir)
+    if not os.path.exists(ec.DB_PATH) or not os.path.exists(ec.PROFILE_DB_PATH):
+        raise FileNotFoundError(f"'{workdir}' 中缺少数据库文件，请先运行: python benchmark.py generate --workdir {workdir}")
+
+    stages = {}
+    try:
+        profile_mgr = ec.ProfileManager(ec.PROFILE_DB_PATH)
+        profile_mgr.load_data()
+        export_config = dict(ec.ConfigManager(os.path.join(output_dir, ec._CONFIG_FILENAME)).default_config)
+        export_config.update(export_format=list(formats), add_file_header=False, use_index_db=use_index,
+                             use_decode_cache=decode_cache != 'off')
+        config = {
+            "start_ts": None, "end_ts": None, "name_style": export_config['name_style'], "name_format": export_config['name_format'],
+            "profile_mgr": profile_mgr, "run_timestamp": "", "export_config": export_config
+        }
+
+        # 1. 辅助索引数据库 (不存在或已过期时建立)
+        start = time.perf_counter()
+        index_ready = use_index and ec.ensure_index_db()
+        stages['index_build'] = time.perf_counter() - start
+
+        with sqlite3.connect(f"file:{ec.DB_PATH}?mode=ro", uri=True) as con:
+            if index_ready:
+                ec.attach_index_db(con)
+            peers = [row[0] for row in con.execute(f"SELECT DISTINCT `{ec.COL_PEER_UID}` FROM {ec.TABLE_NAME} ORDER BY 1")]
+
+            # 2. 解码缓存
+            if decode_cache != 'off':
+                if decode_cache == 'cold' and os.path.exists(ec.DECODE_CACHE_PATH):
+                    os.remove(ec.DECODE_CACHE_PATH)
+                ec.open_decode_cache()
+                if decode_cache == 'warm':
+                    print("正在预热消息解码缓存...")
+                    _export_pass(con, peers, profile_mgr, config, [], StageTimer())
+                    ec.DECODE_CACHE.flush()
+
+            # 3. 计时导出
+            print(f"正在导出 {len(peers)} 个会话 (格式: {', '.join(formats)})...")
+            timer = StageTimer()
+            start = time.perf_counter()
+            rows, messages = _export_pass(con, peers, profile_mgr, config, formats, timer)
+            ec.close_decode_cache()
+            stages['total'] = time.perf_counter() - start
+            stages.update(timer.seconds)
+    finally:
+        ec.close_decode_cache()
+        if not keep_output:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    order = ['index_build', 'query', 'decode'] + [f"write_{fmt}" for fmt in formats] + ['total']
+    return {
+        'rows': rows, 'messages': messages, 'peers': len(peers), 'formats': list(formats),
+        'decode_cache': decode_cache, 'use_index_db': bool(index_ready),
+        'stages': {name: {'seconds': round(stages.get(name, 0.0), 3),
+                          'msgs_per_sec': round(messages / stages[name]) if stages.get(name) and name != 'index_build' else None}
+                   for name in order},
+        'peak_rss_mb': _peak_rss_mb(),
+        'python': sys.version.split()[0], 'sqlite': sqlite3.sqlite_version,
+        'output_dir': output_dir if keep_output else None,
+    }
+
+_STAGE_LABELS = {'index_build': "建立索引", 'query': "查询", 'decode': "解码", 'total': "合计"}
+
+def print_report(result):
+    """打印易读的测试结果。"""
+    print(f"\n===== 性能测试结果 =====")
+    print(f"数据库: {result['rows']} 行, {result['peers']} 个会话, 有效消息 {result['messages']} 条")
+    print(f"解码缓存: {result['decode_cache']}    辅助索引: {'开' if result['use_index_db'] else '关'}    "
+          f"Python {result['python']} / SQLite {result['sqlite']}")
+    print(f"\n{'阶段':<12}{'耗时(秒)':>12}{'消息/秒':>14}")
+    for name, stage in result['stages'].items():
+        label = _STAGE_LABELS.get(name) or f"写入 {name[6:].upper()}"
+        rate = f"{stage['msgs_per_sec']:,}" if stage['msgs_per_sec'] is not None else "-"
+        print(f"{label:<12}{stage['seconds']:>14.3f}{rate:>16}")
+    if result['peak_rss_mb'] is not None:
+        print(f"\n内存峰值: {result['peak_rss_mb']} MB")
+    if result.get('output_dir'):
+        print(f"导出文件保留在: {result['output_dir']}")
+
+def compare_with_baseline(result, baseline, threshold=_REGRESSION_THRESHOLD):
+    """与基准结果比较，返回吞吐量下降超过阈值的阶段说明列表。建立索引阶段与规模有关，不参与比较。"""
+    regressions = []
+    for name, stage in result['stages'].items():
+        base = baseline.get('stages', {}).get(name, {})
+        if name == 'index_build' or not stage['msgs_per_sec'] or not base.get('msgs_per_sec'):
+            continue
+        ratio = stage['msgs_per_sec'] / base['msgs_per_sec']
+        if ratio < 1 - threshold:
+            regressions.append(f"{_STAGE_LABELS.get(name, name)}: {base['msgs_per_sec']:,} -> {stage['msgs_per_sec']:,} 消息/秒 ({ratio - 1:+.1%})")
+    return regressions
+
+# --- 一致性校验 ---
+def verify_decoder(workdir, samples=_VERIFY_DECODER_SAMPLES, seed=1):
+    """
+    快速Protobuf解码器与 blackboxprotobuf 的一致性：取数据库中的消息内容及其随机改写的副本，
+    快速路径给出结果时须与 blackboxprotobuf 的结果 (按结构表裁剪后) 相同，判定数据无效时 blackboxprotobuf 也须报错。
+    返回不一致的说明列表。
+    """
+    rng = random.Random(seed)
+    with sqlite3.connect(f"file:{os.path.join(workdir, ec._DB_FILENAME)}?mode=ro", uri=True) as con:
+        total = con.execute(f"SELECT MAX(rowid) FROM {ec.TABLE_NAME}").fetchone()[0] or 0
+        step = max(1, total // samples)
+        blobs = [row[0] for row in con.execute(f'SELECT "{ec.COL_MSG_CONTENT}" FROM {ec.TABLE_NAME} WHERE rowid % ? = 0', (step,))
+                 if isinstance(row[0], bytes)]
+
+    def mutated(blob):
+        data = bytearray(blob)
+        for _ in range(rng.randint(1, 3)):
+            if data: data[rng.randrange(len(data))] = rng.randrange(256)
+        return bytes(data)
+
+    problems = []
+    mismatches = fallbacks = 0
+    cases = blobs + [mutated(blob) for blob in blobs]
+    for data in cases:
+        try:
+            fast = ec._pb_walk(data, 0, len(data), ec._PB_MESSAGE_SCHEMA, {})[0]
+        except ec._PbInvalid:
+            fast = ec._PbInvalid
+        except (ec._PbFallback, IndexError):
+            fallbacks += 1 # 交回 blackboxprotobuf 处理，结果必然一致
+            continue
+        try:
+            expected = ec._pb_prune(blackboxprotobuf.decode_message(data)[0], ec._PB_MESSAGE_SCHEMA)
+        except Exception:
+            expected = ec._PbInvalid
+        if fast != expected:
+            mismatches += 1
+            if len(problems) < _VERIFY_MAX_REPORTS:
+                problems.append(f"内容 {data[:48].hex()}{'...' if len(data) > 48 else ''}: 快速解码 {fast!r}，blackboxprotobuf {expected!r}")
+    print(f"  已比较 {len(cases)} 条 (其中 {len(cases) - len(blobs)} 条为改写的副本，{fallbacks} 条回退到 blackboxprotobuf)，不一致 {mismatches} 条。")
+    return problems
+
+def _offset_transitions(start, end):
+    """[start, end) 内本地UTC偏移发生变化的时刻 (按小时查找，精确到小时)。"""
+    transitions = []
+    previous = time.localtime(start).tm_gmtoff
+    for ts in range(start, end, 3600):
+        offset = time.localtime(ts).tm_gmtoff
+        if offset != previous:
+            transitions.append(ts)
+            previous = offset
+    return transitions
+
+def verify_formatter(samples=_VERIFY_FORMATTER_SAMPLES, seed=1):
+    """
+    TimestampFormatter 与 datetime.fromtimestamp + strftime 的一致性：在若干时区 (含半小时夏令时、
+    0点切换夏令时的时区) 下，按聊天记录的节奏依次格式化时间戳，并密集采样各次夏令时切换的前后两天。
+    不支持 time.tzset 的平台 (Windows) 只检查本地时区。返回不一致的说明列表。
+    """
+    zones = _VERIFY_TIMEZONES if hasattr(time, 'tzset') else [None]
+    saved_tz = os.environ.get('TZ')
+    problems = []
+    mismatches = checked = 0
+    try:
+        for zone in zones:
+            if zone is not None:
+                os.environ['TZ'] = zone
+                time.tzset()
+            rng = random.Random(seed)
+            ts = _START_TS - 366 * 86400
+            timestamps = []
+            for _ in range(samples):
+                ts += rng.choice((1, 7, 60, 1800, 3600, 5000, 86400, -30)) # 多数在同一天内前进，偶尔跨天或倒退
+                timestamps.append(ts)
+            for transition in _offset_transitions(_START_TS - 366 * 86400, ts):
+                timestamps += range(transition - 2 * 86400, transition + 2 * 86400, 599)
+            timestamps += [rng.randrange(0, 2 ** 31) for _ in range(samples // 10)]
+
+            formatter = ec.TimestampFormatter()
+            for ts in timestamps:
+                dt_object = datetime.fromtimestamp(ts)
+                expected = (dt_object.strftime("%Y-%m-%d"), dt_object.strftime("%H:%M:%S"))
+                result = formatter.split(ts)
+                if result != expected:
+                    mismatches += 1
+                    if len(problems) < _VERIFY_MAX_REPORTS:
+                        problems.append(f"时区 {zone or '本地'}, 时间戳 {ts}: {result}，datetime 为 {expected}")
+            checked += len(timestamps)
+    finally:
+        if zones != [None]:
+            if saved_tz is None: os.environ.pop('TZ', None)
+            else: os.environ['TZ'] = saved_tz
+            time.tzset()
+    print(f"  已在 {len(zones)} 个时区下比较 {checked} 个时间戳，不一致 {mismatches} 个。")
+    return problems
+
+def _load_aes_encryptor():
+    """返回 AES-256-CBC 加密函数 encrypt(key, iv, data)，与 qqnt_decrypt 使用同样的库，没有可用的库时返回 None。"""
+    try:
+        from Crypto.Cipher import AES
+        return lambda key, iv, data: AES.new(key, AES.MODE_CBC, iv).encrypt(data)
+    except ImportError:
+        pass
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError:
+        return None
+
+    def encrypt(key, iv, data):
+        encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+        return encryptor.update(data) + encryptor.finalize()
+    return encrypt
+
+def _create_reserved_db(path):
+    """
+    新建一个空的 SQLite 数据库，每页末尾保留 qd.RESERVE_SIZE 字节 (与 SQLCipher 数据库相同，用于存放 IV 与 HMAC)。
+    sqlite3 模块无法设置保留区大小，因此在只有文件头的空数据库中直接修改文件头的保留区字节与第1页的内容区起点。
+    """
+    with sqlite3.connect(path) as con:
+        con.execute(f"PRAGMA page_size = {qd.PAGE_SIZE}")
+        con.execute("VACUUM")
+    con.close()
+    with open(path, "r+b") as f:
+        f.seek(20)
+        f.write(bytes([qd.RESERVE_SIZE]))
+        f.seek(100 + 5)
+        f.write((qd.PAGE_SIZE - qd.RESERVE_SIZE).to_bytes(2, "big"))
+
+def _encrypt_database(plain_path, enc_path, key, salt, encrypt, previous=None):
+    """
+    按 qqnt_decrypt 的参数将 plain_path 加密为带 QQ 文件头的数据库 enc_path，返回 (明文, 密文)。
+    previous 为上一次的 (明文, 密文)：内容未变的页沿用原来的密文，与 SQLCipher 只改写变化的页相同。
+    """
+    with open(plain_path, "rb") as f:
+        plain = f.read()
+    cipher_key, hmac_key = qd.derive_keys(key, salt)
+    header = bytearray(qd.QQ_HEADER_SIZE)
+    header[:len(qd.QQ_HEADER_MARKER) + qd.RAND_LENGTH] = qd.QQ_HEADER_MARKER + b"Bench123"
+    out = bytearray(header)
+    data_end = qd.PAGE_SIZE - qd.RESERVE_SIZE
+    for start in range(0, len(plain), qd.PAGE_SIZE):
+        page = plain[start:start + qd.PAGE_SIZE]
+        if previous is not None and previous[0][start:start + qd.PAGE_SIZE] == page:
+            out += previous[1][qd.QQ_HEADER_SIZE + start:qd.QQ_HEADER_SIZE + start + qd.PAGE_SIZE]
+            continue
+        pgno = start // qd.PAGE_SIZE + 1
+        offset = qd.SALT_SIZE if pgno == 1 else 0
+        iv = os.urandom(qd.IV_SIZE)
+        body = (salt if pgno == 1 else b"") + encrypt(cipher_key, iv, page[offset:data_end]) + iv
+        mac = hmac.new(hmac_key, body[offset:], qd.HMAC_ALGORITHM)
+        mac.update(struct.pack("<I", pgno))
+        out += body + mac.digest() + bytes(qd.PAGE_SIZE - len(body) - qd.HMAC_SIZE)
+    with open(enc_path, "wb") as f:
+        f.write(out)
+    return plain, bytes(out)
+
+def verify_incremental_decrypt(workdir):
+    """
+    增量解密与完整解密的一致性：将合成的消息表加密为 QQ NT 数据库，依次经历修改与插入、删除后 VACUUM (页数减少) 两次变化，
+    每次变化后增量解密的结果须与完整解密、以及明文数据库逐字节相同。没有 AES 库时跳过，返回 None；否则返回不一致的说明列表。
+    """
+    encrypt = _load_aes_encryptor()
+    if encrypt is None or qd._AES_DECRYPT is None:
+        print("  跳过: 缺少 AES 库 (pip install pycryptodome)。")
+        return None
+    temp_dir = tempfile.mkdtemp(prefix="verify_decrypt_", dir=workdir)
+    try:
+        plain_path = os.path.join(temp_dir, "plain.db")
+        enc_path = os.path.join(temp_dir, "nt_msg.db")
+        inc_path = os.path.join(temp_dir, "incremental.db")
+        full_path = os.path.join(temp_dir, "full.db")
+        key = hashlib.md5(b"benchmark").hexdigest()
+        salt = os.urandom(qd.SALT_SIZE)
+
+        _create_reserved_db(plain_path)
+        with sqlite3.connect(plain_path) as con:
+            con.execute("ATTACH DATABASE ? AS src", (f"file:{os.path.join(workdir, ec._DB_FILENAME)}?mode=ro",))
+            con.execute(f"CREATE TABLE {ec.TABLE_NAME} AS SELECT * FROM src.{ec.TABLE_NAME}")
+        con.close()
+        steps = [
+            ("首次解密", None),
+            ("修改与插入", [f'UPDATE {ec.TABLE_NAME} SET "{ec.COL_MSG_CONTENT}" = X\'0a00\' WHERE rowid % 97 = 0',
+                         f'INSERT INTO {ec.TABLE_NAME} SELECT * FROM {ec.TABLE_NAME} WHERE rowid % 50 = 0']),
+            ("删除后 VACUUM", [f"DELETE FROM {ec.TABLE_NAME} WHERE rowid % 3 = 0", "VACUUM"]),
+        ]
+
+        problems = []
+        previous = None
+        for label, statements in steps:
+            if statements:
+                con = sqlite3.connect(plain_path, isolation_level=None)
+                for statement in statements: con.execute(statement)
+                con.close()
+            previous = _encrypt_database(plain_path, enc_path, key, salt, encrypt, previous)
+            page_count, decrypted = qd.decrypt_database(enc_path, inc_path, key, jobs=1, incremental=True)
+            qd.decrypt_database(enc_path, full_path, key, jobs=1)
+            with open(inc_path, "rb") as f_inc, open(full_path, "rb") as f_full:
+                incremental, full = f_inc.read(), f_full.read()
+            print(f"  {label}: 共 {page_count} 页，增量解密 {decrypted} 页。")
+            if incremental != full:
+                problems.append(f"{label}: 增量解密的结果与完整解密不同。")
+            if full != previous[0]:
+                problems.append(f"{label}: 完整解密的结果与明文数据库不同。")
+        return problems
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def _read_export_tree(output_dir):
+    """读取导出目录中的全部导出文件，返回 {相对路径: 内容}。文件名中的运行时间戳与文件头中的生成时间不参与比较。"""
+    files = {}
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            if name in (ec._INCREMENTAL_STATE_FILENAME, ec._CONFIG_FILENAME): continue
+            path = os.path.join(root, name)
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                content = _GEN_TIME_RE.sub(r"\1 -", f.read())
+            files[_RUN_TIMESTAMP_RE.sub("", os.path.relpath(path, output_dir))] = content
+    return files
+
+def _same_second_cut(rows, target):
+    """从 target 起找到与前一行属于同一会话且同一秒的位置作为截断点，使这一秒的消息分属前后两次导出；找不到时返回 target。"""
+    for i in range(max(target, 1), len(rows)):
+        if rows[i][1:] == rows[i - 1][1:]: return i
+    return target
+
+def verify_incremental_export(workdir, formats=tuple(ec._EXPORT_FORMATS)):
+    """
+    增量导出与完整导出的一致性：在工作目录的副本中模拟数据库的增长，依次只保留约前 1/3 (截断在同一会话同一秒的两条消息之间)、
+    再多一条、前 2/3 与全部消息各增量导出一次，再运行一次没有新消息的增量导出；每一步的结果都须与对当时数据库的完整导出相同。
+    HTML 分别按单文件与分页站点各检查一遍。返回不一致的说明列表。
+    """
+    source_path = os.path.join(workdir, ec._DB_FILENAME)
+    temp_dir = tempfile.mkdtemp(prefix="verify_export_", dir=workdir)
+    try:
+        db_path = os.path.join(temp_dir, ec._DB_FILENAME)
+        shutil.copy2(source_path, db_path)
+        shutil.copy2(os.path.join(workdir, ec._PROFILE_DB_FILENAME), temp_dir)
+        with sqlite3.connect(f"file:{source_path}?mode=ro", uri=True) as con:
+            rows = con.execute(f'SELECT rowid, "{ec.COL_PEER_UID}", "{ec.COL_TIMESTAMP}" FROM {ec.TABLE_NAME} ORDER BY rowid').fetchall()
+        cut = _same_second_cut(rows, len(rows) // 3)
+        # 第二步只增加一条与上次最后一条同会话、同一秒的消息 (没有更晚的消息可供发现)
+        stages = [rows[cut - 1][0], rows[min(cut, len(rows) - 1)][0], rows[len(rows) * 2 // 3][0], rows[-1][0]]
+        output_dir = os.path.join(temp_dir, f"{_MY_QQ}_output")
+        incremental_dir = os.path.join(temp_dir, "incremental_output") # 完整导出期间暂存增量导出的结果
+        # export_chats.py 会在脚本所在目录写入配置、非好友缓存与哈希缓存，因此运行临时目录中的副本，不改动安装目录
+        script_dir = os.path.dirname(os.path.abspath(ec.__file__))
+        script = os.path.join(temp_dir, os.path.basename(ec.__file__))
+        shutil.copy2(os.path.join(script_dir, os.path.basename(ec.__file__)), script)
+        shutil.copytree(os.path.join(script_dir, ec._TEMPLATE_DIR_NAME), os.path.join(temp_dir, ec._TEMPLATE_DIR_NAME))
+
+        def load_rows(last_rowid):
+            """使副本数据库恰好包含原数据库中 rowid 不超过 last_rowid 的消息。"""
+            con = sqlite3.connect(db_path, isolation_level=None)
+            con.execute("ATTACH DATABASE ? AS src", (f"file:{source_path}?mode=ro",))
+            con.execute(f"DELETE FROM main.{ec.TABLE_NAME} WHERE rowid > ?", (last_rowid,))
+            con.execute(f"INSERT INTO main.{ec.TABLE_NAME} SELECT * FROM src.{ec.TABLE_NAME} "
+                        f"WHERE rowid > (SELECT IFNULL(MAX(rowid), 0) FROM main.{ec.TABLE_NAME}) AND rowid <= ?", (last_rowid,))
+            con.close()
+
+        def export(*extra):
+            command = [sys.executable, script, '--workdir', temp_dir, '--mode', '5', '--group', 'all'] + list(extra)
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='replace')
+            if result.returncode != 0:
+                raise RuntimeError(f"导出失败 (退出码 {result.returncode}): {' '.join(command[2:])}\n{result.stdout[-2000:]}")
+
+        problems = []
+        for label, options in (("单文件", ['--format', *formats, '--html-split', 'off']),
+                               ("HTML 分页站点", ['--format', 'html', '--html-split', str(_VERIFY_SITE_PAGE_SIZE)])):
+            if label != "单文件" and 'html' not in formats: continue
+            shutil.rmtree(output_dir, ignore_errors=True)
+            compared = mismatched = 0
+            expected, previous = None, {}
+            for step, last_rowid in zip(("约前 1/3", "再多一条", "前 2/3", "全部", "再次运行"), stages + stages[-1:]):
+                load_rows(last_rowid)
+                export(*options, '--incremental')
+                actual = _read_export_tree(output_dir)
+                if expected is None or step != "再次运行":
+                    # 完整导出使用同一个数据库文件，文件头中的数据库摘要也应相同
+                    os.replace(output_dir, incremental_dir)
+                    export(*options)
+                    expected = _read_export_tree(output_dir)
+                    shutil.rmtree(output_dir)
+                    os.replace(incremental_dir, output_dir)
+                differing = sorted(set(expected) ^ set(actual)) + sorted(
+                    path for path in set(expected) & set(actual) if expected[path] != actual[path]
+                    # 没有新消息的会话 (以及分页站点中沿用的页面) 不会改动文件，文件头中的数据库摘要停留在上次写入时，这是预期的
+                    and not (actual[path] == previous.get(path) and _DB_HASH_RE.sub(r"\1-", expected[path]) == _DB_HASH_RE.sub(r"\1-", actual[path])))
+                previous = actual
+                compared += len(expected)
+                mismatched += len(differing)
+                problems += [f"{label} ({step}): {path}" for path in differing[:_VERIFY_MAX_REPORTS]]
+            print(f"  {label}: 分 5 步增量导出，共比较 {compared} 个文件，不一致 {mismatched} 个。")
+        return problems
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+_VERIFY_CHECKS = {
+    'decoder': ("快速Protobuf解码 与 blackboxprotobuf", lambda workdir: verify_decoder(workdir)),
+    'formatter': ("时间格式化 与 datetime", lambda workdir: verify_formatter()),
+    'decrypt': ("增量解密 与 完整解密", verify_incremental_decrypt),
+    'export': ("增量导出 与 完整导出", verify_incremental_export),
+}
+
+def run_verify(workdir, checks):
+    """依次执行指定的一致性校验并打印结果，全部通过 (或跳过) 时返回 True。"""
+    workdir = os.path.abspath(workdir)
+    if not os.path.exists(os.path.join(workdir, ec._DB_FILENAME)) or not os.path.exists(os.path.join(workdir, ec._PROFILE_DB_FILENAME)):
+        raise FileNotFoundError(f"'{workdir}' 中缺少数据库文件，请先运行: python benchmark.py generate --workdir {workdir}")
+    failed = []
+    for name in checks:
+        label, check = _VERIFY_CHECKS[name]
+        print(f"\n[{label}]")
+        problems = check(workdir)
+        if problems:
+            failed.append(label)
+            for line in problems: print(f"  - {line}")
+        print(f"  结果: {'跳过' if problems is None else '不一致' if problems else '一致'}")
+    if failed:
+        print(f"\n一致性校验未通过: {', '.join(failed)}")
+        return False
+    print("\n一致性校验全部通过。")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="QQ NT 聊天记录导出性能测试工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    gen = subparsers.add_parser('generate', help='生成合成的测试数据库')
+    gen.add_argument('--workdir', type=str, default='benchmark_data', help='数据库存放目录，默认为 benchmark_data。')
+    gen.add_argument('--rows', type=parse_count, default=parse_count('100k'), help='消息行数，支持 k/M 后缀 (如 10k、10M)，默认为 100k。')
+    gen.add_argument('--peers', type=int, default=_DEFAULT_PEERS, help=f'好友数量，默认为 {_DEFAULT_PEERS}。')
+    gen.add_argument('--seed', type=int, default=1, help='随机数种子，相同参数生成相同的数据库，默认为 1。')
+
+    run = subparsers.add_parser('run', help='对数据库执行性能测试')
+    run.add_argument('--workdir', type=str, default='benchmark_data', help='数据库所在目录，默认为 benchmark_data。')
+    run.add_argument('--rows', type=parse_count, help='目录中没有数据库时，先生成指定行数的合成数据库。')
+    run.add_argument('--formats', type=str, nargs='+', choices=list(ec._EXPORT_FORMATS), default=list(ec._EXPORT_FORMATS), help='参与测试的导出格式，默认为全部。')
+    run.add_argument('--decode-cache', type=str, choices=['off', 'cold', 'warm'], default='off', help='消息解码缓存: off 不使用 (默认)，cold 从空缓存开始，warm 预热后再计时。')
+    run.add_argument('--no-index', action='store_true', help='不使用辅助索引数据库。')
+    run.add_argument('--json', type=str, help='将测试结果写入JSON文件 (可作为之后的 --baseline)。')
+    run.add_argument('--baseline', type=str, help='与之前保存的JSON结果比较，吞吐量下降超过阈值时退出码为 1。')
+    run.add_argument('--threshold', type=float, default=_REGRESSION_THRESHOLD, help=f'判定为性能退化的吞吐量下降比例，默认为 {_REGRESSION_THRESHOLD}。')
+    run.add_argument('--keep-output', action='store_true', help='保留导出的文件 (默认测试结束后删除)。')
+
+    verify = subparsers.add_parser('verify', help='校验各项加速手段的结果与原有实现一致')
+    verify.add_argument('--workdir', type=str, default='benchmark_data', help='数据库所在目录，默认为 benchmark_data。')
+    verify.add_argument('--rows', type=parse_count, help='目录中没有数据库时，先生成指定行数的合成数据库。')
+    verify.add_argument('--checks', type=str, nargs='+', choices=list(_VERIFY_CHECKS), default=list(_VERIFY_CHECKS),
+                        help='要执行的校验: decoder (Protobuf解码)、formatter (时间格式化)、decrypt (增量解密)、export (增量导出)，默认为全部。')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate_fixture(args.workdir, args.rows, args.peers, args.seed)
+        return 0
+
+    if args.command == 'verify':
+        if args.rows and not os.path.exists(os.path.join(args.workdir, ec._DB_FILENAME)):
+            generate_fixture(args.workdir, args.rows)
+        try:
+            return 0 if run_verify(args.workdir, args.checks) else 1
+        except (FileNotFoundError, RuntimeError) as e:
+            print(f"错误: {e}")
+            return 1
+
+    if args.rows and not os.path.exists(os.path.join(args.workdir, ec._DB_FILENAME)):
+        generate_fixture(args.workdir, args.rows)
+    try:
+        result = run_benchmark(args.workdir, args.formats, args.decode_cache, not args.no_index, args.keep_output)
+    except FileNotFoundError as e:
+        print(f"错误: {e}")
+        return 1
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f"测试结果已保存到: {args.json}")
+
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"错误: 无法读取基准结果 '{args.baseline}'。{e}")
+            return 1
+        regressions = compare_with_baseline(result, baseline, args.threshold)
+        if regressions:
+            print(f"\n发现性能退化 (阈值 {args.threshold:.0%}):")
+            for line in regressions: print(f"  - {line}")
+            return 1
+        print(f"\n与基准结果相比未发现性能退化 (阈值 {args.threshold:.0%})。")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
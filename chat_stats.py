@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+QQ NT 聊天记录统计工具
+
+功能:
+- 统计每个会话的消息数 (发送/接收)、首次与最近聊天时间，以及消息最多的会话排行。
+- 统计按小时、按星期×小时 (热力图)、按月、按日的消息分布，以及活跃天数与最活跃的一天。
+- 只读取会话、发送者、时间戳三列 (40021/40020/40050)，不解码任何消息内容 (40800)：
+  优先在辅助索引数据库 nt_msg.index.db (与 export_chats.py 共用) 上用聚合SQL统计，
+  时间分布先在SQL中按15分钟分桶计数，再逐桶换算为本地时间 (所有时区的偏移都是15分钟的整数倍)，
+  因此耗时只与时间跨度有关，与消息数基本无关。
+- 生成 TXT 报告与 JSON 数据，可选生成 HTML 摘要页，保存在 export_chats.py 的输出目录中。
+
+用法:
+    python chat_stats.py
+    python chat_stats.py --peer 12345678 --start 2024-01-01 --end 2024-12-31 --html
+    python chat_stats.py --top 50 --name-style qq
+
+依赖:
+- 与 export_chats.py 相同 (blackboxprotobuf)。
+"""
+
+import os
+import sys
+import json
+import time
+import html
+import sqlite3
+import argparse
+from datetime import datetime
+from collections import Counter
+
+import export_chats as ec
+
+# --- 常量定义 ---
+_STATS_FILENAME_BASE = "chat_stats" # 统计报告文件名前缀
+_BUCKET_SECONDS = 900 # 时间分布的分桶粒度 (秒)，所有时区偏移都是15分钟的整数倍，每个桶只属于一个本地小时
+_DEFAULT_TOP = 20 # TXT 与 HTML 报告中会话排行显示的数量
+_WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+_BAR_WIDTH = 40 # TXT 报告中柱状图的最大宽度 (字符)
+_HEAT_CHARS = " ░▒▓█" # TXT 报告中热力图的浓淡字符
+
+def _setup_paths(workdir):
+    """设置 export_chats 的路径变量，与其 main() 中的设置方式一致。"""
+    script_dir = os.path.dirname(os.path.abspath(ec.__file__))
+    ec.DB_PATH = os.path.join(workdir, ec._DB_FILENAME)
+    ec.PROFILE_DB_PATH = os.path.join(workdir, ec._PROFILE_DB_FILENAME)
+    ec.INDEX_DB_PATH = os.path.join(workdir, ec._INDEX_DB_FILENAME)
+    ec.CONFIG_PATH = os.path.join(script_dir, ec._CONFIG_FILENAME)
+    ec.NON_FRIENDS_CACHE_PATH = os.path.join(script_dir, ec._NON_FRIENDS_CACHE_FILENAME)
+
+# --- 统计 ---
+def _query_source(con, my_uid, peer_uids=None, start_ts=None, end_ts=None):
+    """
+    返回聚合查询所需的 (FROM 子句, 会话列, 发送者列, 时间列, WHERE 子句, 参数, 主人的发送者标识)。
+    已附加辅助索引数据库时使用其中的 msg_index (会话与发送者为整数ID)，否则直接使用消息表的三列。
+    """
+    if ec._index_attached(con):
+        source, peer_col, sender_col, ts_col = "idx.msg_index i", "i.peer_id", "i.sender_id", "i.ts"
+        row = con.execute("SELECT id FROM idx.uids WHERE uid = ?", (my_uid,)).fetchone()
+        me = row[0] if row else None
+        peer_clause = "i.peer_id IN (SELECT id FROM idx.uids WHERE uid IN ({}))"
+    else:
+        source = ec.TABLE_NAME
+        peer_col, sender_col, ts_col = f"`{ec.COL_PEER_UID}`", f"`{ec.COL_SENDER_UID}`", f"`{ec.COL_TIMESTAMP}`"
+        me = my_uid
+        peer_clause = f"`{ec.COL_PEER_UID}` IN ({{}})"
+
+    clauses, params = [f"{peer_col} IS NOT NULL"], []
+    if peer_uids:
+        clauses.append(peer_clause.format(", ".join("?" for _ in peer_uids)))
+        params.extend(peer_uids)
+    if start_ts:
+        clauses.append(f"{ts_col} >= ?")
+        params.append(start_ts)
+    if end_ts:
+        clauses.append(f"{ts_col} <= ?")
+        params.append(end_ts)
+    return source, peer_col, sender_col, ts_col, " AND ".join(clauses), params, me
+
+def collect_stats(con, my_uid, peer_uids=None, start_ts=None, end_ts=None):
+    """
+    用两条聚合查询统计消息分布，返回原始统计字典:
+    - peers:   {会话UID: {"count", "sent", "first_ts", "last_ts"}}
+    - hours:   24 个小时的消息数；heatmap: 7×24 (周一至周日 × 小时) 的消息数
+    - daily:   {"YYYY-MM-DD": 消息数}；monthly: {"YYYY-MM": 消息数}
+    """
+    source, peer_col, sender_col, ts_col, where, params, me = _query_source(con, my_uid, peer_uids, start_ts, end_ts)
+
+    # 1. 按会话聚合 (走 (会话, 时间) 索引)
+    id_to_uid = dict(con.execute("SELECT id, uid FROM idx.uids").fetchall()) if ec._index_attached(con) else None
+    peers = {}
+    for peer, count, sent, first_ts, last_ts in con.execute(
+            f"SELECT {peer_col}, COUNT(*), SUM({sender_col} = ?), MIN({ts_col}), MAX({ts_col}) "
+            f"FROM {source} WHERE {where} GROUP BY {peer_col}", [me] + params):
+        uid = id_to_uid.get(peer, peer) if id_to_uid is not None else peer
+        peers[uid] = {"count": count, "sent": sent or 0, "first_ts": first_ts, "last_ts": last_ts}
+
+    # 2. 按15分钟分桶计数 (走时间索引)，再逐桶换算为本地的日期、星期与小时
+    hours = [0] * 24
+    heatmap = [[0] * 24 for _ in range(7)]
+    daily, monthly = Counter(), Counter()
+    for bucket, count in con.execute(
+            f"SELECT {ts_col} / {_BUCKET_SECONDS}, COUNT(*) FROM {source} WHERE {where} AND {ts_col} >= 0 GROUP BY 1", params):
+        try:
+            t = time.localtime(bucket * _BUCKET_SECONDS)
+        except (OverflowError, OSError, ValueError):
+            continue
+        hours[t.tm_hour] += count
+        heatmap[t.tm_wday][t.tm_hour] += count
+        daily[f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"] += count
+        monthly[f"{t.tm_year:04d}-{t.tm_mon:02d}"] += count
+    return {"peers": peers, "hours": hours, "heatmap": heatmap, "daily": dict(sorted(daily.items())), "monthly": dict(sorted(monthly.items()))}
+
+def build_report(stats, profile_mgr, names, scope):
+    """将原始统计整理为报告字典 (即 JSON 报告的内容)，会话按消息数从多到少排序。"""
+    peers = []
+    for uid, info in stats["peers"].items():
+        user = profile_mgr.all_users.get(uid, {})
+        peers.append({
+            "uid": uid, "name": names.get(uid, uid), "qq": user.get('qq'), "is_friend": uid in profile_mgr.friend_uids,
+            "count": info["count"], "sent": info["sent"], "received": info["count"] - info["sent"],
+            "first": ec.format_timestamp(info["first_ts"]), "last": ec.format_timestamp(info["last_ts"]),
+        })
+    peers.sort(key=lambda p: (-p["count"], str(p["uid"])))
+
+    total = sum(p["count"] for p in peers)
+    sent = sum(p["sent"] for p in peers)
+    daily = stats["daily"]
+    busiest_day = max(daily.items(), key=lambda item: item[1]) if daily else None
+    first_ts = min((info["first_ts"] for info in stats["peers"].values() if info["first_ts"] is not None), default=None)
+    last_ts = max((info["last_ts"] for info in stats["peers"].values() if info["last_ts"] is not None), default=None)
+    return {
+        "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "scope": scope,
+        "summary": {
+            "messages": total, "sent": sent, "received": total - sent, "conversations": len(peers),
+            "first": ec.format_timestamp(first_ts) if first_ts is not None else None,
+            "last": ec.format_timestamp(last_ts) if last_ts is not None else None,
+            "active_days": len(daily),
+            "average_per_active_day": round(total / len(daily), 1) if daily else 0,
+            "busiest_day": {"date": busiest_day[0], "count": busiest_day[1]} if busiest_day else None,
+        },
+        "conversations": peers,
+        "hours": stats["hours"],
+        "heatmap": {"weekdays": _WEEKDAYS, "counts": stats["heatmap"]},
+        "monthly": stats["monthly"],
+        "daily": daily,
+    }
+
+# --- 输出 ---
+def _bar(count, peak, width=_BAR_WIDTH):
+    return "█" * round(count / peak * width) if peak else ""
+
+def _heat_char(count, peak):
+    """热力图单元格的浓淡字符：0 条为空白，其余按占峰值的比例向上取整到 1-4 级。"""
+    if not peak: return _HEAT_CHARS[0]
+    return _HEAT_CHARS[-(-count * (len(_HEAT_CHARS) - 1) // peak)]
+
+def write_txt_report(f, report, top):
+    s = report["summary"]
+    f.write("===== QQ 聊天记录统计 =====\n")
+    f.write(f"统计范围: {report['scope']['description']}\n")
+    f.write(f"生成时间: {report['generated_at']}\n\n")
+    f.write(f"消息总数: {s['messages']} (发送 {s['sent']} / 接收 {s['received']})\n")
+    f.write(f"会话数: {s['conversations']}\n")
+    f.write(f"时间跨度: {s['first'] or 'N/A'} ~ {s['last'] or 'N/A'}\n")
+    f.write(f"活跃天数: {s['active_days']} (平均每个活跃日 {s['average_per_active_day']} 条)\n")
+    if s['busiest_day']:
+        f.write(f"最活跃的一天: {s['busiest_day']['date']} ({s['busiest_day']['count']} 条)\n")
+
+    f.write(f"\n--- 消息最多的会话 (前 {top} 个) ---\n")
+    for rank, p in enumerate(report["conversations"][:top], 1):
+        tag = "" if p["is_friend"] else " [非好友]"
+        f.write(f"{rank:>3}. {p['name']}{tag}  {p['count']} 条 (发送 {p['sent']} / 接收 {p['received']})  "
+                f"首次 {p['first'][:10]}  最近 {p['last'][:10]}\n")
+
+    hours = report["hours"]
+    f.write("\n--- 按小时分布 ---\n")
+    for hour, count in enumerate(hours):
+        f.write(f"{hour:02d}时 | {_bar(count, max(hours))} {count}\n")
+
+    counts = report["heatmap"]["counts"]
+    peak = max(max(row) for row in counts)
+    f.write(f"\n--- 星期 × 小时 热力图 (最浓 = {peak} 条) ---\n")
+    f.write("      " + "".join(f"{h:<3d}" if h % 3 == 0 else "   " for h in range(24)).rstrip() + "\n")
+    for day, row in zip(_WEEKDAYS, counts):
+        cells = "".join(_heat_char(c, peak) * 3 for c in row)
+        f.write(f"{day}  {cells}\n")
+
+    monthly = report["monthly"]
+    f.write("\n--- 按月统计 ---\n")
+    peak = max(monthly.values(), default=0)
+    for month, count in monthly.items():
+        f.write(f"{month} | {_bar(count, peak)} {count}\n")
+
+def write_html_report(f, report, top):
+    """生成独立的 HTML 摘要页 (不依赖模板与脚本)，热力图单元格的颜色深浅与消息数成正比。"""
+    e = lambda value: html.escape(str(value))
+    s = report["summary"]
+    f.write("<!DOCTYPE html>\n<html lang=\"zh-CN\">\n<head>\n<meta charset=\"UTF-8\">\n"
+            "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">\n<title>QQ 聊天记录统计</title>\n<style>\n"
+            "body{font-family:sans-serif;max-width:960px;margin:0 auto;padding:1em;color:#222}\n"
+            "table{border-collapse:collapse;margin:.5em 0 1.5em}td,th{padding:.25em .6em;border-bottom:1px solid #ddd;text-align:left}\n"
+            ".num{text-align:right}.bar{background:#4a90d9;height:.9em;display:inline-block}\n"
+            ".heat td{width:1.6em;height:1.6em;padding:0;border:1px solid #fff}.heat th{font-weight:normal;font-size:.8em}\n"
+            "</style>\n</head>\n<body>\n<h1>QQ 聊天记录统计</h1>\n")
+    f.write(f"<p>统计范围: {e(report['scope']['description'])}<br>生成时间: {e(report['generated_at'])}</p>\n<table>\n")
+    rows = [("消息总数", f"{s['messages']} (发送 {s['sent']} / 接收 {s['received']})"), ("会话数", s['conversations']),
+            ("时间跨度", f"{s['first'] or 'N/A'} ~ {s['last'] or 'N/A'}"),
+            ("活跃天数", f"{s['active_days']} (平均每个活跃日 {s['average_per_active_day']} 条)")]
+    if s['busiest_day']:
+        rows.append(("最活跃的一天", f"{s['busiest_day']['date']} ({s['busiest_day']['count']} 条)"))
+    for label, value in rows:
+        f.write(f"<tr><th>{e(label)}</th><td>{e(value)}</td></tr>\n")
+    f.write("</table>\n")
+
+    f.write(f"<h2>消息最多的会话 (前 {top} 个)</h2>\n<table>\n<tr><th>#</th><th>名称</th><th class=\"num\">消息数</th>"
+            "<th class=\"num\">发送</th><th class=\"num\">接收</th><th>首次聊天</th><th>最近聊天</th></tr>\n")
+    for rank, p in enumerate(report["conversations"][:top], 1):
+        tag = "" if p["is_friend"] else " [非好友]"
+        f.write(f"<tr><td>{rank}</td><td>{e(p['name'] + tag)}</td><td class=\"num\">{p['count']}</td><td class=\"num\">{p['sent']}</td>"
+                f"<td class=\"num\">{p['received']}</td><td>{e(p['first'][:10])}</td><td>{e(p['last'][:10])}</td></tr>\n")
+    f.write("</table>\n")
+
+    counts = report["heatmap"]["counts"]
+    peak = max(max(row) for row in counts) or 1
+    f.write("<h2>星期 × 小时 热力图</h2>\n<table class=\"heat\">\n<tr><th></th>" + "".join(f"<th>{h}</th>" for h in range(24)) + "</tr>\n")
+    for day, row in zip(_WEEKDAYS, counts):
+        cells = "".join(f"<td title=\"{day} {h}时: {c} 条\" style=\"background:rgba(74,144,217,{c / peak:.2f})\"></td>" for h, c in enumerate(row))
+        f.write(f"<tr><th>{day}</th>{cells}</tr>\n")
+    f.write("</table>\n")
+
+    for title, items in (("按小时分布", [(f"{h:02d}时", c) for h, c in enumerate(report["hours"])]), ("按月统计", list(report["monthly"].items()))):
+        peak = max((c for _, c in items), default=0) or 1
+        f.write(f"<h2>{title}</h2>\n<table>\n")
+        for label, count in items:
+            f.write(f"<tr><td>{e(label)}</td><td class=\"num\">{count}</td><td><span class=\"bar\" style=\"width:{count / peak * 20:.2f}em\"></span></td></tr>\n")
+        f.write("</table>\n")
+    f.write("</body>\n</html>\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="QQ NT 聊天记录统计工具")
+    parser.add_argument('--workdir', type=str, default='.', help='指定工作目录，应包含解密后的数据库文件，报告保存在其中的输出文件夹。')
+    parser.add_argument('--peer', type=str, nargs='+', help='只统计指定好友: UID或QQ号，可多个，用空格或逗号分隔。')
+    parser.add_argument('--start', type=str, help='开始时间，格式与 export_chats.py 相同 (例如 2025-06-23 08:30)。')
+    parser.add_argument('--end', type=str, help='结束时间，只输入日期则包含全天。')
+    parser.add_argument('--top', type=int, default=_DEFAULT_TOP, help=f'报告中会话排行显示的数量 (JSON 中始终包含全部会话)，默认为 {_DEFAULT_TOP}。')
+    parser.add_argument('--html', action='store_true', help='额外生成 HTML 摘要页。')
+    parser.add_argument('--name-style', type=str, choices=['default', 'nickname', 'qq', 'uid', 'custom'], help='用户标识格式，默认使用配置文件中的设置。')
+    parser.add_argument('--name-format', type=str, help='name-style 为 custom 时的格式，可用占位符: {nickname}, {remark}, {qq}, {uid}。')
+    args = parser.parse_args()
+
+    _setup_paths(args.workdir)
+    try:
+        start_ts = ec._parse_time_arg(args.start)
+        end_ts = ec._parse_time_arg(args.end, is_end=True)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 1
+    if not os.path.exists(ec.DB_PATH):
+        print(f"错误: 消息数据库文件 '{ec.DB_PATH}' 不存在。")
+        return 1
+
+    try:
+        profile_mgr = ec.ProfileManager(ec.PROFILE_DB_PATH)
+        profile_mgr.load_data()
+    except ec.ProfileDataError as e:
+        print(f"错误: {e}")
+        return 1
+    config_mgr = ec.ConfigManager(ec.CONFIG_PATH)
+    name_style = args.name_style or config_mgr.config.get('name_style', 'default')
+    name_format = args.name_format if args.name_format is not None else config_mgr.config.get('name_format', '')
+    names = profile_mgr.get_name_table(name_style, name_format)
+
+    peer_uids = None
+    if args.peer:
+        peer_uids, unknown = ec._resolve_uid_args(args.peer, profile_mgr)
+        if unknown:
+            print(f"错误: 无法识别的好友: {', '.join(unknown)}")
+            return 1
+    description = "、".join(names.get(uid, uid) for uid in peer_uids) if peer_uids else "全部会话"
+    if start_ts or end_ts:
+        description += f" ({ec.format_timestamp(start_ts) if start_ts else '最早'} ~ {ec.format_timestamp(end_ts) if end_ts else '最新'})"
+    scope = {"description": description, "peers": peer_uids, "start_ts": start_ts, "end_ts": end_ts}
+
+    started = time.perf_counter()
+    try:
+        with sqlite3.connect(f"file:{ec.DB_PATH}?mode=ro", uri=True) as con:
+            if config_mgr.config.get('use_index_db', True) and ec.ensure_index_db():
+                ec.attach_index_db(con)
+            stats = collect_stats(con, profile_mgr.my_uid, peer_uids, start_ts, end_ts)
+    except sqlite3.Error as e:
+        print(f"\n数据库错误: {e}")
+        return 1
+    report = build_report(stats, profile_mgr, names, scope)
+
+    output_dir = os.path.join(args.workdir, f"{profile_mgr.my_qq}_output")
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"{_STATS_FILENAME_BASE}_{int(datetime.now().timestamp())}")
+    paths = [f"{base}.txt", f"{base}.json"] + ([f"{base}.html"] if args.html else [])
+    with open(paths[0], "w", encoding="utf-8") as f:
+        write_txt_report(f, report, args.top)
+    with open(paths[1], "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    if args.html:
+        with open(paths[2], "w", encoding="utf-8") as f:
+            write_html_report(f, report, args.top)
+
+    s = report["summary"]
+    print(f"\n统计完成: {s['conversations']} 个会话，{s['messages']} 条消息，耗时 {time.perf_counter() - started:.2f} 秒。")
+    for path in paths: print(f"报告已保存到: {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,14 @@ import argparse
 import warnings
 import hashlib
 import html
+import struct
+import itertools
+import marshal
+from collections import OrderedDict
+import time
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext
 
 # 忽略 google.protobuf 的 pkg_resources DEPRECATED 警告
 # 这是 protobuf 库的一个已知问题，与本脚本功能无关
@@ -48,9 +56,26 @@ _OUTPUT_DIR_NAME = "output_chats"  # 默认的顶层输出文件夹名
 _CONFIG_FILENAME = "export_config.json" # 导出配置
 _TEMPLATE_DIR_NAME = "html_templates" # HTML模板文件夹
 _NON_FRIENDS_CACHE_FILENAME = "non_friends_cache.json" # 非好友UID缓存
+_HASH_CACHE_FILENAME = "db_hash_cache.json" # 数据库SHA256缓存 (以路径、大小、修改时间、inode 为指纹)
+_INCREMENTAL_STATE_FILENAME = "incremental_state.json" # 增量导出进度记录，存放于输出根目录
+_INDEX_DB_FILENAME = "nt_msg.index.db" # 辅助索引数据库，与解密后的数据库放在同一目录
+_INDEX_DB_VERSION = "1" # 辅助索引数据库的结构版本，结构变化时自动重建
+_DECODE_CACHE_FILENAME = "nt_msg.decode_cache.db" # 消息解码缓存数据库，与解密后的数据库放在同一目录
+_DECODER_REVISION = 1 # 消息段解码逻辑 (_decode_segments 与快速解码器) 的修订号，改变解码结果时加 1，解码缓存随之清空
+_DECODE_CACHE_TRIM_RATIO = 2 # 解码缓存条目数超过消息数据库最大 rowid 的多少倍时，清理不再对应现存消息的条目
+_DECODE_CACHE_FLUSH_SIZE = 2000 # 解码缓存中累计多少条新结果后写入磁盘
 _TIMELINE_FILENAME_BASE = "chat_logs_timeline" # 全局时间线文件名前缀
 _FRIENDS_LIST_FILENAME = "friends_list.txt" # 好友信息列表文件名
 _ALL_USERS_LIST_FILENAME = "all_cached_users_list.txt" # 全部用户信息列表文件名
+_EXPORT_FORMATS = ('txt', 'md', 'html') # 支持的导出格式
+_FETCH_BATCH_SIZE = 1000 # 流式导出时每批从数据库读取的行数
+_QUOTE_CACHE_SIZE = 20000 # 引用原文缓存的默认容量 (条)，可通过配置项 quote_cache_size 修改
+_END_TIME_PLACEHOLDER = "#" * 19 # 流式写入时文件头中“记录结束时间”的等长占位符，写完后回填
+_HASH_BLOCK_SIZE = 1024 * 1024 # 计算SHA256时每次读取的块大小
+_COPY_BLOCK_SIZE = 1024 * 1024 # 增量导出更换文件开头时，移动已有内容每次复制的块大小
+_HTML_TEMPLATE_CACHE = {} # HTML模板切分结果缓存 {模板路径: (内容前部分, 内容后部分)}
+_SITE_DIR_SUFFIX = "_site" # HTML 分页站点目录名后缀 (附加在原 HTML 文件名之后)
+_SITE_INDEX_FILENAME = "index.html" # HTML 分页站点的目录页文件名
 
 # 【动态路径变量】 - 将在main函数中根据命令行参数设置
 DB_PATH = ""
@@ -59,11 +84,16 @@ OUTPUT_DIR = ""
 CONFIG_PATH = ""
 TEMPLATE_DIR_PATH = ""
 NON_FRIENDS_CACHE_PATH = ""
+HASH_CACHE_PATH = ""
+INDEX_DB_PATH = ""
+DECODE_CACHE_PATH = ""
 
 
 # 【核心数据结构缓存】
-SALVAGE_CACHE = {}
-MESSAGE_CONTENT_CACHE = {} # 用于缓存已处理消息的最终文本内容，解决引用信息不完整问题
+_EXPORT_WORKER_STATE = {} # 并行导出时工作进程内的只读数据库连接与导出配置
+FILE_HASH_CACHE = None # 文件哈希缓存 {绝对路径: {'fingerprint': [大小, 修改时间ns, inode], 'sha256': 哈希}}，首次使用时从磁盘加载
+DECODE_CACHE = None # 当前导出使用的消息解码缓存 (DecodeCache)，未启用时为 None
+PROFILER = None # 当前导出使用的性能分析器 (StageProfiler)，未启用 --profile 时为 None
 
 # 【数据库表结构与字段常量】
 # 这些常量基于对QQ NT版数据库的逆向工程得出，是脚本正确读取数据的关键。
@@ -116,6 +146,7 @@ PB_CALL_TYPE = "48154"          # 通话类型 (1:语音, 2:视频)
 PB_MARKET_FACE_TEXT = "80900"   # 商城表情文本 (如 "[贴贴]")
 PB_IMAGE_IS_FLASH = "45829"     # 图片是否为闪照的标志字段 (1:是闪照)
 PB_REDPACKET_TYPE = "48412"     # 红包类型字段 (2:普通, 6:口令, 15:语音红包)
+PB_REDPACKET_INFO = "48403"     # 红包信息的嵌套对象 (内含红包标题)
 PB_REDPACKET_TITLE = "48443"    # 红包标题 (如 "恭喜发财")
 PB_VOICE_DURATION = "45005"     # 语音消息时长字段 (此为推测值，可能不准)
 PB_VOICE_TO_TEXT = "45923"      # 语音转文字的结果文本
@@ -161,7 +192,11 @@ class ConfigManager:
             'show_media_info': False,
             'name_style': 'default',
             'name_format': '',
-            'add_file_header': True
+            'add_file_header': True,
+            'quote_cache_size': _QUOTE_CACHE_SIZE,
+            'use_index_db': True,
+            'use_decode_cache': True,
+            'html_site_split': ''
         }
         self.config = self.load_config()
 
@@ -195,6 +230,9 @@ class ConfigManager:
         except IOError as e:
             print(f"错误: 无法保存配置文件到 '{self.config_path}'。 {e}")
             
+class ProfileDataError(Exception):
+    """身份数据库缺失或无法读取。由调用方决定如何报告：交互模式打印后退出，非交互模式写入运行摘要。"""
+
 class ProfileManager:
     """
     负责从profile_info.decrypt.db加载和管理所有用户、好友和分组信息。
@@ -202,8 +240,7 @@ class ProfileManager:
     """
     def __init__(self, db_path):
         if not os.path.exists(db_path):
-            print(f"错误: 身份数据库文件 '{db_path}' 不存在。")
-            exit(1)
+            raise ProfileDataError(f"身份数据库文件 '{db_path}' 不存在。")
         self.db_path = f"file:{db_path}?mode=ro"
         self.my_uid = ""
         self.my_qq = ""
@@ -211,6 +248,7 @@ class ProfileManager:
         self.friend_uids = set() # 仅好友的UID集合，用于快速判断
         self.non_friend_uids = [] # 非好友的UID列表
         self.group_info = {}  # {group_id: group_name} 分组信息
+        self._name_tables = {} # {(名称风格, 自定义格式): {uid: 显示名称}}，见 get_name_table
 
     def load_data(self):
         """
@@ -218,6 +256,7 @@ class ProfileManager:
         以 profile_info_v6 作为所有用户的基础信息来源，再用 buddy_list 补充好友特有信息。
         """
         print(f"\n正在从 '{os.path.basename(self.db_path.replace('file:', '').split('?')[0])}' 加载用户信息...")
+        self._name_tables = {}
         try:
             with sqlite3.connect(self.db_path, uri=True) as con:
                 cur = con.cursor()
@@ -232,16 +271,14 @@ class ProfileManager:
                 
                 print("用户信息加载完毕。")
         except sqlite3.Error as e:
-            print(f"\n读取身份数据库时发生错误: {e}")
-            exit(1)
+            raise ProfileDataError(f"读取身份数据库时发生错误: {e}") from e
 
     def _load_my_uid(self, cur):
         """从category_list_v2表获取主人UID。"""
         cur.execute(f'SELECT "{PROF_COL_UID}" FROM {CATEGORY_LIST_TABLE} LIMIT 1')
         result = cur.fetchone()
         if not result or not result[0]:
-            print(f"错误: 无法在 '{CATEGORY_LIST_TABLE}' 表中找到主人UID。")
-            exit(1)
+            raise ProfileDataError(f"无法在 '{CATEGORY_LIST_TABLE}' 表中找到主人UID。")
         self.my_uid = result[0]
 
     def _load_groups(self, cur):
@@ -250,7 +287,7 @@ class ProfileManager:
         pb_data = cur.fetchone()
         if not pb_data or not pb_data[0]: return
 
-        decoded, _ = blackboxprotobuf.decode_message(pb_data[0])
+        decoded = decode_protobuf_fields(pb_data[0], _PB_GROUP_LIST_SCHEMA)
         group_list_data = decoded.get(PROF_COL_GROUP_LIST_PB)
         if not group_list_data: return
         
@@ -312,9 +349,14 @@ class ProfileManager:
             
         all_peer_uids = set()
         try:
-            with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as con:
+            if config_mgr.config.get('use_index_db', True) and ensure_index_db():
+                # 辅助索引数据库中已有每个会话的统计，无需扫描消息表
+                db_path, query = INDEX_DB_PATH, "SELECT u.uid FROM peer_stats s JOIN uids u ON u.id = s.peer_id"
+            else:
+                db_path, query = DB_PATH, f"SELECT DISTINCT `{COL_PEER_UID}` FROM {TABLE_NAME}"
+            with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as con:
                 cur = con.cursor()
-                cur.execute(f"SELECT DISTINCT `{COL_PEER_UID}` FROM {TABLE_NAME}")
+                cur.execute(query)
                 rows = cur.fetchall()
                 for row in rows:
                     if row[0]:
@@ -345,10 +387,20 @@ class ProfileManager:
         except IOError as e:
             print(f"警告: 无法写入非好友缓存文件。错误: {e}")
 
-    def get_display_name(self, uid, style, custom_format=""):
-        """根据用户选择的风格，获取一个UID对应的显示名称。"""
-        user = self.all_users.get(uid)
-        if not user: return uid
+    def get_name_table(self, style, custom_format=""):
+        """
+        返回按指定风格预先解析好的 {uid: 显示名称} 表，每种 (风格, 自定义格式) 只在首次使用时建立一次。
+        写入函数与灰字提示解析直接查表: table.get(uid, uid)，不在表中的UID (未知用户) 显示为UID本身。
+        """
+        key = (style, custom_format)
+        table = self._name_tables.get(key)
+        if table is None:
+            table = {uid: self._resolve_display_name(uid, user, style, custom_format) for uid, user in self.all_users.items()}
+            self._name_tables[key] = table
+        return table
+
+    @staticmethod
+    def _resolve_display_name(uid, user, style, custom_format):
         qq, nickname, remark = user.get('qq', uid), user.get('nickname', ''), user.get('remark', '')
         default_name = remark or nickname or str(qq)
         
@@ -382,20 +434,491 @@ class ProfileManager:
         
         return f"{qq}{is_non_friend_tag}_{safe_name_part}{safe_remark_part}{timestamp_str}{ext}"
 
+class QuoteCache:
+    """
+    引用消息原文缓存 (LRU)。
+    以 (会话UID, 时间戳, 发送者UID) 为键保存已解析消息的文本，供其后的引用消息还原完整原文。
+    容量固定，超出时淘汰最久未使用的条目，长时间的批量导出内存占用也保持恒定。
+    未命中时若提供了 loader(会话UID, 时间戳, 发送者UID)，则调用它按需加载原文，结果 (包括未找到) 同样写入缓存。
+    """
+    def __init__(self, max_size=_QUOTE_CACHE_SIZE, loader=None):
+        self.max_size = max(1, int(max_size))
+        self.loader = loader
+        self._entries = OrderedDict()
+
+    def get(self, peer_uid, ts, sender_uid):
+        """查找原文，未命中且无法加载时返回 None。"""
+        key = (peer_uid, ts, sender_uid)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.loader is None:
+            return None
+        text = self.loader(peer_uid, ts, sender_uid)
+        self.put(peer_uid, ts, sender_uid, text)
+        return text
+
+    def put(self, peer_uid, ts, sender_uid, text):
+        """写入一条原文，超出容量时淘汰最久未使用的条目。"""
+        key = (peer_uid, ts, sender_uid)
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+def _content_digest(content):
+    """消息内容 (40800 字段) 的 BLAKE2b 摘要，用作解码缓存的键。"""
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+def _decode_cache_version():
+    """解码缓存的版本：解码器修订号、marshal 版本与消息结构表的摘要，任何一项变化时缓存自动清空。"""
+    schema_digest = hashlib.blake2b(repr(_PB_MESSAGE_SCHEMA).encode('utf-8'), digest_size=8).hexdigest()
+    return f"{_DECODER_REVISION}-{marshal.version}-{schema_digest}"
+
+class DecodeCache:
+    """
+    持久化的消息解码缓存，保存在 nt_msg.decode_cache.db 中。
+    以 40800 字段内容的 BLAKE2b 摘要为键，保存其 Protobuf 解码后的消息段列表 (marshal 序列化)。
+    消息段只保留解析用到的字段，且尚未替换显示名称、未应用任何导出设置，因此不同格式、名称样式、
+    时间范围的导出都可以共用；再次导出时命中的消息完全跳过 Protobuf 解码。
+    导出时通过 prefetching() 按批次 (每批一次查询) 预取缓存结果，避免逐条查询。
+    缓存结果只取决于消息内容本身，与来自哪个数据库无关，因此重新解密 (包括 qqnt_decrypt.py --incremental 原地更新) 后
+    未变化的消息仍然命中；缓存版本 (由解码器修订号与结构表摘要得出，见 _decode_cache_version) 变化时整个清空。
+    已删除或被修改 (如撤回) 的消息留下的旧条目不会再被命中，条目数超过消息数据库最大 rowid 的 _DECODE_CACHE_TRIM_RATIO 倍时
+    扫描一遍消息内容，删除这些条目。
+    """
+    _FAILED = False # 解码失败的标记，命中时直接走内容抢救流程
+
+    def __init__(self, path, validate=True, db_path=None):
+        self.path = path
+        self._pending = {} # 尚未写入磁盘的新结果 {摘要: 序列化数据}
+        self._batch = {} # 当前批次预取的结果 {消息内容: (摘要, 序列化数据或None)}
+        self.con = sqlite3.connect(path, timeout=30)
+        self.con.execute("PRAGMA journal_mode = WAL")
+        self.con.execute("PRAGMA synchronous = NORMAL")
+        if validate:
+            self._validate()
+            if db_path: self._trim(db_path)
+
+    def _validate(self):
+        """检查缓存版本，不一致时清空。"""
+        con = self.con
+        con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        con.execute("CREATE TABLE IF NOT EXISTS segments (digest BLOB PRIMARY KEY, data BLOB) WITHOUT ROWID")
+        meta = dict(con.execute("SELECT key, value FROM meta").fetchall())
+        if meta.get('version') != _decode_cache_version() or 'entries' not in meta:
+            con.execute("DELETE FROM segments")
+            con.execute("DELETE FROM meta")
+            con.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [('version', _decode_cache_version()), ('entries', 0)])
+        con.commit()
+
+    def _trim(self, db_path):
+        """条目数 (记录在 meta 中，不必数表) 超过消息数据库最大 rowid 的 _DECODE_CACHE_TRIM_RATIO 倍时，删除不再对应任何现存消息内容的条目。"""
+        con = self.con
+        entries = int(con.execute("SELECT value FROM meta WHERE key = 'entries'").fetchone()[0])
+        with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as src:
+            max_rowid = src.execute(f"SELECT MAX(rowid) FROM {TABLE_NAME}").fetchone()[0] or 0
+            if entries <= max(max_rowid * _DECODE_CACHE_TRIM_RATIO, _DECODE_CACHE_FLUSH_SIZE): return
+            print("正在清理消息解码缓存中的过期条目...")
+            con.execute("CREATE TEMP TABLE live_digests (digest BLOB PRIMARY KEY) WITHOUT ROWID")
+            cur = src.execute(f'SELECT "{COL_MSG_CONTENT}" FROM {TABLE_NAME}')
+            con.executemany("INSERT OR IGNORE INTO temp.live_digests (digest) VALUES (?)",
+                            ((_content_digest(row[0]),) for row in cur if isinstance(row[0], bytes)))
+        src.close()
+        removed = con.execute("DELETE FROM segments WHERE digest NOT IN (SELECT digest FROM temp.live_digests)").rowcount
+        con.execute("UPDATE meta SET value = ? WHERE key = 'entries'", (entries - removed,))
+        con.execute("DROP TABLE temp.live_digests")
+        con.commit()
+        print(f"已清理 {removed} 条过期的解码结果。")
+
+    def prefetching(self, rows, batch_size=_FETCH_BATCH_SIZE):
+        """包装消息行迭代器 (第4列为消息内容)：每取出一批行，先用一次查询预取该批消息的缓存结果。"""
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch: return
+            self._prefetch(row[3] for row in batch)
+            yield from batch
+
+    def _prefetch(self, contents):
+        digests = {}
+        for content in contents:
+            if isinstance(content, bytes) and content not in digests:
+                digests[content] = _content_digest(content)
+        found = {}
+        keys = list(set(digests.values()))
+        for i in range(0, len(keys), 500): # 控制单条SQL的参数个数
+            chunk = keys[i:i + 500]
+            found.update(self.con.execute(
+                f"SELECT digest, data FROM segments WHERE digest IN ({', '.join('?' for _ in chunk)})", chunk))
+        self._batch = {content: (digest, found.get(digest)) for content, digest in digests.items()}
+
+    def get_segments(self, content):
+        """返回 content 解码后的消息段列表 (与 _decode_segments 相同)，未命中时解码并记录。"""
+        entry = self._batch.get(content)
+        if entry is not None:
+            digest, data = entry
+        else:
+            digest = _content_digest(content)
+            row = self.con.execute("SELECT data FROM segments WHERE digest = ?", (digest,)).fetchone()
+            data = row[0] if row else None
+        if data is None:
+            data = self._pending.get(digest)
+        if data is not None:
+            segments = marshal.loads(data)
+        else:
+            try:
+                segments = _decode_segments(content)
+            except Exception:
+                segments = self._FAILED
+            try:
+                self._pending[digest] = marshal.dumps(segments)
+            except ValueError:
+                pass # 含有无法序列化的值，不缓存
+            if len(self._pending) >= _DECODE_CACHE_FLUSH_SIZE:
+                self.flush()
+        if segments is self._FAILED:
+            raise ValueError("Protobuf 解码失败")
+        return segments
+
+    def flush(self):
+        """将新解码的结果写入磁盘。"""
+        if not self._pending: return
+        with self.con:
+            before = self.con.total_changes
+            self.con.executemany("INSERT OR IGNORE INTO segments (digest, data) VALUES (?, ?)", self._pending.items())
+            self.con.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = 'entries'", (self.con.total_changes - before,))
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self.con.close()
+
+def open_decode_cache():
+    """打开 (必要时清空或清理) 消息解码缓存并设为当前缓存，失败时打印警告并返回 None。"""
+    global DECODE_CACHE
+    try:
+        DECODE_CACHE = DecodeCache(DECODE_CACHE_PATH, db_path=DB_PATH)
+    except (sqlite3.Error, OSError) as e:
+        print(f"警告: 无法打开消息解码缓存，将直接解码。错误: {e}")
+        DECODE_CACHE = None
+    return DECODE_CACHE
+
+def close_decode_cache():
+    """写回并关闭当前的消息解码缓存。"""
+    global DECODE_CACHE
+    if DECODE_CACHE is not None:
+        try:
+            DECODE_CACHE.close()
+        except sqlite3.Error as e:
+            print(f"警告: 写入消息解码缓存失败。错误: {e}")
+        DECODE_CACHE = None
+
+class QuoteResolver:
+    """
+    按 (会话UID, 时间戳, 发送者UID) 从消息数据库中按需取出被引用的原消息。
+    原消息不在本次导出范围内 (设置了开始时间、增量导出等) 或已被缓存淘汰时使用，每次查找只是一次索引点查询。
+    已附加辅助索引数据库时直接使用其中的 (会话, 时间) 索引；否则由于数据库以只读方式打开，
+    在首次查找时于临时库中建立 (会话, 时间, 发送者) -> rowid 的索引表，同一连接上的后续导出直接复用。
+    """
+    _INDEX_TABLE = "quote_origin_index"
+
+    def __init__(self, db_con):
+        self.db_con = db_con
+        self._query = None
+
+    def _prepare(self):
+        if _index_attached(self.db_con):
+            self._query = (
+                f"SELECT m.`{COL_MSG_CONTENT}` FROM idx.msg_index i JOIN {TABLE_NAME} m ON m.rowid = i.src_rowid "
+                f"WHERE i.peer_id = (SELECT id FROM idx.uids WHERE uid = ?) AND i.ts = ? "
+                f"AND i.sender_id = (SELECT id FROM idx.uids WHERE uid = ?) LIMIT 1"
+            )
+            return
+        cur = self.db_con.cursor()
+        cur.execute("SELECT 1 FROM sqlite_temp_master WHERE type = 'table' AND name = ?", (self._INDEX_TABLE,))
+        if cur.fetchone() is None:
+            cur.execute(
+                f"CREATE TEMP TABLE {self._INDEX_TABLE} AS SELECT `{COL_PEER_UID}` AS peer, `{COL_TIMESTAMP}` AS ts, "
+                f"`{COL_SENDER_UID}` AS sender, rowid AS src_rowid FROM {TABLE_NAME}"
+            )
+            cur.execute(f"CREATE INDEX temp.{self._INDEX_TABLE}_key ON {self._INDEX_TABLE} (peer, ts, sender)")
+        self._query = (
+            f"SELECT m.`{COL_MSG_CONTENT}` FROM temp.{self._INDEX_TABLE} i JOIN {TABLE_NAME} m ON m.rowid = i.src_rowid "
+            f"WHERE i.peer = ? AND i.ts = ? AND i.sender = ? LIMIT 1"
+        )
+
+    def fetch(self, peer_uid, ts, sender_uid):
+        """返回原消息的 40800 字段内容，找不到时返回 None。"""
+        if self._query is None:
+            self._prepare()
+        cur = self.db_con.cursor()
+        cur.execute(self._query, (peer_uid, ts, sender_uid))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+class StageProfiler:
+    """
+    【性能分析】可选的分阶段计时器，通过 --profile 启用，未启用时导出流程中没有任何额外开销。
+    各阶段按“独占时间”统计：进入嵌套阶段时暂停外层阶段的计时 (例如解码中读取数据库行的时间只计入“查询”)，
+    因此各阶段耗时之和即为被计时的总时间，可以直接比较。
+    阶段来源：
+    - 导出流程中显式标记的阶段：查询 (执行SQL与取行)、解码、各格式的写入、建立索引；
+    - start() 时临时替换的热点函数 (_PROFILED_FUNCTIONS)，stop() 时恢复。
+    cprofile_path 非空时同时运行 cProfile，结束时将统计数据保存到该文件 (可用 pstats 或 snakeviz 查看)。
+    """
+    # 被单独计时的热点函数 {名称 (模块函数或 类名.方法名): 阶段名}
+    _PROFILED_FUNCTIONS = {
+        'decode_protobuf_fields': 'protobuf',
+        'DecodeCache._prefetch': 'decode_cache',
+        'ProfileManager.get_name_table': 'display_name', # 建表 (每种风格一次) 与取表；查表是内联的 dict.get，计入调用方所在的阶段
+        'QuoteResolver.fetch': 'quote_lookup',
+        'decode_gray_tip': 'gray_tip',
+        'decode_ark_message': 'ark_json',
+        '_extract_readable_text': 'salvage',
+        'TimestampFormatter.split': 'format_timestamp',
+    }
+    _STAGE_LABELS = {
+        'index_build': "建立索引", 'query': "查询", 'decode': "解码 (其余部分)", 'protobuf': "Protobuf 解码",
+        'decode_cache': "解码缓存预取", 'display_name': "显示名称表", 'quote_lookup': "引用原文查找",
+        'gray_tip': "灰字提示解析", 'ark_json': "Ark卡片解析", 'salvage': "内容抢救",
+        'format_timestamp': "时间格式化",
+    }
+
+    def __init__(self, cprofile_path=None):
+        self.cprofile_path = cprofile_path
+        self.stages = {} # {阶段名: [独占耗时, 调用次数]}
+        self._stack = []
+        self._last = 0.0
+        self._started = None
+        self._elapsed = 0.0
+        self._originals = {}
+        self._cprofile = None
+
+    def _switch(self):
+        now = time.perf_counter()
+        if self._stack:
+            self.stages[self._stack[-1]][0] += now - self._last
+        self._last = now
+
+    def enter(self, name):
+        self._switch()
+        self.stages.setdefault(name, [0.0, 0])[1] += 1
+        self._stack.append(name)
+
+    def exit(self):
+        self._switch()
+        self._stack.pop()
+
+    @contextmanager
+    def stage(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def timed(self, iterable, name):
+        """包装迭代器，每次取值的耗时计入指定阶段。"""
+        it = iter(iterable)
+        while True:
+            self.enter(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.exit()
+            yield item
+
+    def timed_writer(self, writer, name):
+        """包装写入协程，send() 的耗时计入指定阶段。"""
+        profiler = self
+        class _TimedWriter:
+            def send(self, value):
+                profiler.enter(name)
+                try:
+                    return writer.send(value)
+                finally:
+                    profiler.exit()
+        return _TimedWriter()
+
+    def _wrap(self, func, name):
+        def wrapper(*args, **kwargs):
+            self.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.exit()
+        return wrapper
+
+    def start(self):
+        module_globals = globals()
+        for target, name in self._PROFILED_FUNCTIONS.items():
+            owner_name, _, attr = target.rpartition('.')
+            owner = module_globals[owner_name] if owner_name else None
+            original = owner.__dict__[attr] if owner else module_globals[attr]
+            self._originals[target] = original
+            if owner:
+                setattr(owner, attr, self._wrap(original, name))
+            else:
+                module_globals[attr] = self._wrap(original, name)
+        if self.cprofile_path:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        if self._started is None: return
+        self._elapsed += time.perf_counter() - self._started
+        self._started = None
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        module_globals = globals()
+        for target, original in self._originals.items():
+            owner_name, _, attr = target.rpartition('.')
+            if owner_name:
+                setattr(module_globals[owner_name], attr, original)
+            else:
+                module_globals[attr] = original
+        self._originals.clear()
+
+    def report(self, messages, top=15):
+        """生成分析报告字典：各阶段耗时 (按耗时降序)、吞吐量、热点，以及启用 cProfile 时耗时最多的函数。"""
+        total = self._elapsed
+        timed_total = sum(seconds for seconds, _ in self.stages.values())
+        stages = {}
+        for name, (seconds, calls) in sorted(self.stages.items(), key=lambda item: -item[1][0]):
+            stages[name] = {'seconds': round(seconds, 4), 'calls': calls,
+                            'percent': round(seconds / total * 100, 1) if total else 0.0}
+        report = {
+            'total_seconds': round(total, 3), 'messages': messages,
+            'msgs_per_sec': round(messages / total) if total else None,
+            'stages': stages, 'untimed_seconds': round(max(total - timed_total, 0.0), 4),
+            'hot_spots': [name for name in stages][:5],
+        }
+        if self._cprofile is not None:
+            import pstats
+            self._cprofile.dump_stats(self.cprofile_path)
+            stats = pstats.Stats(self._cprofile).stats
+            # 排除计时器自身的函数，它们只在性能分析时存在
+            own_code = {'_switch', 'enter', 'exit', 'stage', 'timed', 'send', 'wrapper'}
+            functions = sorted(((key, value) for key, value in stats.items()
+                                if not (key[0] == __file__ and key[2] in own_code)), key=lambda item: -item[1][2])[:top]
+            report['cprofile_path'] = os.path.abspath(self.cprofile_path)
+            report['cprofile_top'] = [
+                {'function': f"{os.path.basename(filename)}:{line}({func})", 'calls': nc, 'tottime': round(tt, 4), 'cumtime': round(ct, 4)}
+                for (filename, line, func), (cc, nc, tt, ct, callers) in functions]
+        return report
+
+    def print_summary(self, report):
+        """打印易读的分析摘要。"""
+        print(f"\n===== 性能分析 =====")
+        rate = f"{report['msgs_per_sec']:,} 条/秒" if report['msgs_per_sec'] else "-"
+        print(f"总耗时 {report['total_seconds']:.3f} 秒，有效消息 {report['messages']} 条，吞吐量 {rate}")
+        for name, stage in report['stages'].items():
+            label = self._STAGE_LABELS.get(name) or (f"写入 {name[6:].upper()}" if name.startswith('write_') else name)
+            print(f"  {label}: {stage['seconds']:.3f} 秒 ({stage['percent']}%)，{stage['calls']} 次")
+        print(f"  未计时部分 (打开文件、生成文件头等): {report['untimed_seconds']:.3f} 秒")
+        if report.get('cprofile_top'):
+            print("cProfile 自身耗时最多的函数:")
+            for entry in report['cprofile_top'][:10]:
+                print(f"  {entry['function']}: {entry['tottime']:.3f} 秒，{entry['calls']} 次")
+            print(f"cProfile 统计数据已保存到: {report['cprofile_path']}")
+
+def profile_stage(name):
+    """【性能分析】启用时将 with 代码块的耗时计入指定阶段，未启用时为空操作。"""
+    return PROFILER.stage(name) if PROFILER is not None else nullcontext()
+
 # --- 时间与文件处理函数 ---
+def _load_hash_cache():
+    """从磁盘加载数据库哈希缓存，文件不存在或损坏时返回空缓存。"""
+    try:
+        if HASH_CACHE_PATH and os.path.exists(HASH_CACHE_PATH):
+            with open(HASH_CACHE_PATH, 'r', encoding='utf-8') as f:
+                cache_data = json.load(f)
+                if isinstance(cache_data, dict):
+                    return cache_data
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"警告：读取数据库哈希缓存失败，将重新计算。错误：{e}")
+    return {}
+
+def _save_hash_cache():
+    """将数据库哈希缓存写回磁盘。"""
+    if not HASH_CACHE_PATH: return
+    try:
+        with open(HASH_CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(FILE_HASH_CACHE, f, indent=4, ensure_ascii=False)
+    except IOError as e:
+        print(f"警告: 无法写入数据库哈希缓存文件。错误: {e}")
+
 def _calculate_sha256(filepath):
-    """计算文件的SHA256哈希值"""
+    """
+    计算文件的SHA256哈希值。
+    结果以 (路径, 大小, 修改时间, inode) 为指纹缓存在内存和磁盘中，文件未变化时直接复用，
+    同一次运行中为每个导出文件生成文件头也不会重复读取整个数据库。
+    """
+    global FILE_HASH_CACHE
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return "文件未找到"
+    except Exception as e:
+        return f"计算错误: {e}"
+
+    if FILE_HASH_CACHE is None:
+        FILE_HASH_CACHE = _load_hash_cache()
+    cache_key = os.path.abspath(filepath)
+    fingerprint = [st.st_size, st.st_mtime_ns, st.st_ino]
+    entry = FILE_HASH_CACHE.get(cache_key)
+    if isinstance(entry, dict) and entry.get('fingerprint') == fingerprint and entry.get('sha256'):
+        return entry['sha256']
+
     sha256_hash = hashlib.sha256()
     try:
-        with open(filepath, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        buffer = bytearray(_HASH_BLOCK_SIZE)
+        view = memoryview(buffer)
+        with open(filepath, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n: break
+                sha256_hash.update(view[:n])
+        digest = sha256_hash.hexdigest()
     except FileNotFoundError:
         return "文件未找到"
     except Exception as e:
         return f"计算错误: {e}"
 
+    FILE_HASH_CACHE[cache_key] = {'fingerprint': fingerprint, 'sha256': digest}
+    _save_hash_cache()
+    return digest
+
+def _write_tracking_placeholder(f, text, placeholder):
+    """将文本写入已打开的文件，并返回其中每个占位符的写入位置 (f.tell())，供写完后回填。"""
+    positions = []
+    pieces = text.split(placeholder)
+    f.write(pieces[0])
+    for piece in pieces[1:]:
+        positions.append(f.tell())
+        f.write(placeholder)
+        f.write(piece)
+    return positions
+
+def _fill_placeholders(f, positions, text, placeholder):
+    """将已写入文件的占位符原地替换为等长文本 (按字节不足补空格，超出截断)，随后回到文件末尾继续写入。"""
+    if not positions: return
+    width = len(placeholder.encode('utf-8'))
+    text = text.encode('utf-8')[:width].decode('utf-8', 'ignore')
+    text += ' ' * (width - len(text.encode('utf-8')))
+    for pos in positions:
+        f.seek(pos)
+        f.write(text)
+    f.seek(0, os.SEEK_END)
+
 def _parse_time_string(input_str: str) -> dict or None:
     """
     极度人性化地解析各种日期时间格式。
@@ -426,6 +949,19 @@ def _parse_time_string(input_str: str) -> dict or None:
         'second': int(second) if second is not None else None
     }
 
+def _build_datetime(parts: dict, is_end: bool = False) -> datetime:
+    """
+    将 _parse_time_string 解析出的字段组合为 datetime。
+    开始时间缺省部分补 0；结束时间只给出日期时包含全天 (23:59:59)。时间值无效时抛出 ValueError。
+    """
+    if is_end and parts['hour'] is None:
+        h, m, s = 23, 59, 59
+    else:
+        h = parts['hour'] if parts['hour'] is not None else 0
+        m = parts['minute'] if parts['minute'] is not None else 0
+        s = parts['second'] if parts['second'] is not None else 0
+    return datetime(parts['year'], parts['month'], parts['day'], h, m, s)
+
 def get_time_range(path_title):
     """
     【交互功能】提示用户输入时间范围，并返回处理后的起始和结束时间戳。
@@ -441,11 +977,8 @@ def get_time_range(path_title):
         if not parts:
             print("  -> 格式无法识别，请重新输入或直接回车跳过。")
             continue
-        h = parts['hour'] if parts['hour'] is not None else 0
-        m = parts['minute'] if parts['minute'] is not None else 0
-        s = parts['second'] if parts['second'] is not None else 0
         try:
-            start_dt = datetime(parts['year'], parts['month'], parts['day'], h, m, s)
+            start_dt = _build_datetime(parts)
             start_ts = int(start_dt.timestamp())
             print(f"  -> 开始时间设定为: {start_dt.strftime('%Y-%m-%d %H:%M:%S')}")
             break
@@ -457,14 +990,8 @@ def get_time_range(path_title):
         if not parts:
             print("  -> 格式无法识别，请重新输入或直接回车跳过。")
             continue
-        h_part, m_part, s_part = parts['hour'], parts['minute'], parts['second']
-        if h_part is None: h, m, s = 23, 59, 59
-        else:
-            h = h_part
-            m = m_part if m_part is not None else 0
-            s = s_part if s_part is not None else 0
         try:
-            end_dt = datetime(parts['year'], parts['month'], parts['day'], h, m, s)
+            end_dt = _build_datetime(parts, is_end=True)
             if start_ts and end_dt.timestamp() < start_ts:
                 print("  -> 错误: 结束时间不能早于开始时间，请重新输入。")
                 continue
@@ -474,17 +1001,247 @@ def get_time_range(path_title):
         except ValueError: print("  -> 时间值无效 (例如 小时为25)，请重新输入。")
     return start_ts, end_ts
 
+# --- Protobuf 快速解码 ---
+# blackboxprotobuf 每次调用都会推断全部字段的类型并深拷贝类型定义，开销很大。
+# 下面的解码器按字段结构表只提取脚本用到的字段，其余字段仅做跳过与校验。
+# 为保证结果与 blackboxprotobuf 完全一致，凡是其行为依赖类型推断细节的情况
+# (字段类型前后不一致、group 类型、文本字段恰好能被解析为消息等)，一律交回 blackboxprotobuf 处理。
+
+class _PbInvalid(Exception):
+    """数据不是合法的 Protobuf 消息 (与 blackboxprotobuf 判定一致)。"""
+
+class _PbFallback(Exception):
+    """快速解码器无法保证与 blackboxprotobuf 结果一致，需要回退。"""
+
+def _pb_compile_schema(spec: dict) -> dict:
+    """将 {字段ID字符串: 子结构或None} 形式的结构表编译为 {字段号: (字段ID字符串, 子结构)}。"""
+    return {int(k): (k, _pb_compile_schema(v) if v else None) for k, v in spec.items()}
+
+# 单个消息段的结构表: None 表示标量或字节串，dict 表示嵌套消息
+_PB_SEGMENT_SCHEMA = _pb_compile_schema({
+    PB_MSG_TYPE: None, PB_MSG_SUBTYPE: None, PB_EMOJI_DESC: None, PB_STICKER_DESC: None,
+    PB_APOLLO_TEXT: None, PB_TEXT_CONTENT: None, PB_ARK_JSON: None, PB_RECALLER_NAME: None,
+    PB_RECALLER_UID: None, PB_RECALL_SUFFIX: None, PB_FILE_NAME: None, PB_IMG_WIDTH: None,
+    PB_IMG_HEIGHT: None, PB_VID_DURATION: None, PB_VID_WIDTH: None, PB_VID_HEIGHT: None,
+    PB_CALL_STATUS: None, PB_CALL_TYPE: None, PB_MARKET_FACE_TEXT: None, PB_IMAGE_IS_FLASH: None,
+    PB_REDPACKET_TYPE: None, PB_REDPACKET_INFO: {PB_REDPACKET_TITLE: None},
+    PB_VOICE_DURATION: None, PB_VOICE_TO_TEXT: None, PB_GIFT_TEXT: None,
+    PB_LOCATION_SHARE_TEXT: None, PB_INTERACTIVE_EMOJI_ID: None, PB_INTERACTIVE_EMOJI_ID_IN_QUOTE: None,
+    PB_REPLY_ORIGIN_SENDER_UID: None, PB_REPLY_ORIGIN_RECEIVER_UID: None, PB_REPLY_ORIGIN_TS: None,
+    PB_REPLY_ORIGIN_SUMMARY_TEXT: None, PB_GRAYTIP_INTERACTIVE_XML: None,
+})
+# 引用的原消息对象与消息段结构相同
+_PB_SEGMENT_SCHEMA[int(PB_REPLY_ORIGIN_OBJ)] = (PB_REPLY_ORIGIN_OBJ, _PB_SEGMENT_SCHEMA)
+# 40800 消息内容的顶层结构表
+_PB_MESSAGE_SCHEMA = {int(PB_MSG_CONTAINER): (PB_MSG_CONTAINER, _PB_SEGMENT_SCHEMA)}
+# 分组列表的结构表
+_PB_GROUP_LIST_SCHEMA = _pb_compile_schema({PROF_COL_GROUP_LIST_PB: {PB_GROUP_ID: None, PB_GROUP_NAME: None}})
+
+_PB_FIXED32 = struct.Struct('<I')
+_PB_FIXED64 = struct.Struct('<Q')
+_PB_MASK64 = (1 << 64) - 1
+_PB_SIGNBIT64 = 1 << 63
+
+def _pb_read_varint(buf, pos, end):
+    """读取一个无符号varint，返回 (值, 新位置)。"""
+    result = 0
+    shift = 0
+    while pos < end:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return result & _PB_MASK64, pos
+        shift += 7
+        if shift >= 64: raise _PbInvalid()
+    raise _PbInvalid()
+
+def _pb_resolve_lazy(ftype):
+    """推断一个此前未解析的长度分隔字段的类型: 能解析为消息则返回其类型定义，否则为 'bytes'。"""
+    _, buf, start, stop = ftype
+    child_typedef = {}
+    try:
+        _pb_walk(buf, start, stop, None, child_typedef)
+    except _PbInvalid:
+        return 'bytes'
+    return child_typedef
+
+def _pb_walk(buf, pos, end, schema, typedef, group=False):
+    """
+    解析 buf[pos:end] 中的一个消息，只提取结构表 schema 中声明的字段，返回 (字段字典, 结束位置)。
+    typedef 记录每个字段首次出现时推断的类型，用于模拟 blackboxprotobuf 在重复字段上沿用首次类型的行为。
+    group 为真时解析的是 group 字段的内容，遇到 END_GROUP 即返回。
+    """
+    out = {}
+    while pos < end:
+        tag = buf[pos]
+        pos += 1
+        if tag >= 0x80: # 字段号较大时tag占多个字节，内联展开以减少函数调用
+            tag &= 0x7f
+            shift = 7
+            while True:
+                if pos >= end or shift >= 64: raise _PbInvalid()
+                b = buf[pos]
+                pos += 1
+                tag |= (b & 0x7f) << shift
+                if b < 0x80: break
+                shift += 7
+            tag &= _PB_MASK64
+        field, wire = tag >> 3, tag & 7
+        known = schema.get(field) if schema else None
+        ftype = typedef.get(field)
+        if type(ftype) is tuple and ftype[0] == 'lazy': # 未解析的长度分隔字段，再次出现时才确定其类型
+            ftype = typedef[field] = _pb_resolve_lazy(ftype)
+        if ftype is not None and type(ftype) is not str and wire != (3 if type(ftype) is tuple else 2):
+            raise _PbFallback() # 嵌套类型的字段以其他编码方式重复出现
+
+        if wire == 0:
+            if ftype is None: typedef[field] = 'int'
+            elif ftype != 'int': raise _PbInvalid()
+            b = buf[pos] if pos < end else 0x80
+            if b < 0x80:
+                value = b
+                pos += 1
+            else:
+                value, pos = _pb_read_varint(buf, pos, end)
+                value = (value ^ _PB_SIGNBIT64) - _PB_SIGNBIT64
+        elif wire == 2:
+            length, pos = _pb_read_varint(buf, pos, end)
+            if length & _PB_SIGNBIT64: raise _PbFallback()
+            start = pos
+            pos += length
+            if pos > end: raise _PbInvalid()
+            if ftype is None:
+                if known is None:
+                    typedef[field] = ('lazy', buf, start, pos)
+                    continue
+                child_typedef = {}
+                if known[1] is None and (start == pos or buf[start] & 7 in (4, 6, 7)):
+                    # 快速判定: 首字节的wire类型非法，不可能被解析为消息；空字节串则是空消息
+                    value = {} if start == pos else None
+                else:
+                    try:
+                        value = _pb_walk(buf, start, pos, known[1], child_typedef)[0]
+                    except _PbInvalid:
+                        value = None
+                if known[1] is None: # 字节串字段恰好能被解析为消息时，其结果依赖推断细节
+                    if value is not None: raise _PbFallback()
+                    typedef[field] = 'bytes'
+                    value = buf[start:pos]
+                else:
+                    if value is None: raise _PbFallback()
+                    typedef[field] = child_typedef
+            elif ftype == 'bytes':
+                value = buf[start:pos]
+            elif type(ftype) is dict:
+                if known is not None and known[1] is None: raise _PbFallback()
+                try:
+                    value = _pb_walk(buf, start, pos, known[1] if known else None, ftype)[0]
+                except _PbInvalid:
+                    raise _PbFallback()
+            else:
+                raise _PbInvalid()
+        elif wire == 1 or wire == 5:
+            wtype = 'fixed64' if wire == 1 else 'fixed32'
+            if ftype is None: typedef[field] = wtype
+            elif ftype != wtype: raise _PbInvalid()
+            packer = _PB_FIXED64 if wire == 1 else _PB_FIXED32
+            if pos + packer.size > end: raise _PbInvalid()
+            value = packer.unpack_from(buf, pos)[0]
+            pos += packer.size
+        elif wire == 3:
+            if known is not None: raise _PbFallback()
+            if ftype is None:
+                child_typedef = {}
+                typedef[field] = ('group', child_typedef)
+            elif type(ftype) is str:
+                raise _PbInvalid()
+            else:
+                child_typedef = ftype[1]
+            pos = _pb_walk(buf, pos, end, None, child_typedef, group=True)[1]
+            continue
+        elif wire == 4 and group:
+            return out, pos
+        else:
+            raise _PbInvalid()
+
+        if known is not None:
+            key = known[0]
+            if key in out:
+                existing = out[key]
+                if isinstance(existing, list): existing.append(value)
+                else: out[key] = [existing, value]
+            else:
+                out[key] = value
+    if group: raise _PbInvalid() # group 缺少 END_GROUP
+    return out, pos
+
+def decode_protobuf_fields(data, schema=_PB_MESSAGE_SCHEMA) -> dict:
+    """
+    【快速解码】按结构表从Protobuf数据中提取所需字段，结果格式与 blackboxprotobuf.decode_message 相同。
+    遇到快速解码器无法确定的数据时自动回退到 blackboxprotobuf，异常行为也与其保持一致。
+    """
+    if isinstance(data, bytes):
+        try:
+            return _pb_walk(data, 0, len(data), schema, {})[0]
+        except (_PbInvalid, _PbFallback, IndexError):
+            pass
+    decoded, _ = blackboxprotobuf.decode_message(data)
+    return decoded
+
 # --- 核心消息解析函数 ---
 def get_placeholder(value, placeholder="N/A"):
     """处理空值或"0"，返回占位符"""
     return value if value and str(value) != "0" else placeholder
 
+class TimestampFormatter:
+    """
+    按本地时区将时间戳拆分为日期 ("%Y-%m-%d") 与时间 ("%H:%M:%S") 字符串，结果与 datetime.fromtimestamp + strftime 相同。
+    聊天记录中相邻消息绝大多数在同一天，因此缓存最近两个本地日期的 [0点, 次日0点) 时间戳区间，
+    区间内的时间直接由与0点的秒数差算出，不再进行时区换算。
+    只有当天0点、当前时刻与当天最后一秒的UTC偏移相同 (当天没有夏令时切换) 时才缓存该日期，
+    夏令时切换当天 (23或25小时) 每次都按 time.localtime 换算，保证结果一致。
+    """
+    def __init__(self):
+        self._current = (0, 0, None) # (区间起点, 区间终点, 日期字符串)
+        self._previous = (0, 0, None) # 上一个缓存的日期，照顾时间线中引用消息等跨日期的交替查询
+
+    def split(self, ts):
+        """返回 (日期, 时间) 字符串。ts 无效时与 datetime.fromtimestamp 一样抛出异常。"""
+        start, end, date = self._current
+        if not (start <= ts < end) or type(ts) is not int:
+            start, end, date = self._previous
+            if not (start <= ts < end) or type(ts) is not int:
+                return self._load(ts)
+            self._current, self._previous = self._previous, self._current
+        seconds = ts - start
+        return date, f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+    def _load(self, ts):
+        if type(ts) is not int:
+            dt_object = datetime.fromtimestamp(ts)
+            return dt_object.strftime("%Y-%m-%d"), dt_object.strftime("%H:%M:%S")
+        local = time.localtime(ts)
+        date = f"{local.tm_year:04d}-{local.tm_mon:02d}-{local.tm_mday:02d}"
+        start = ts - (local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec)
+        try:
+            if time.localtime(start).tm_gmtoff == local.tm_gmtoff == time.localtime(start + 86399).tm_gmtoff:
+                self._previous, self._current = self._current, (start, start + 86400, date)
+        except (OSError, ValueError, OverflowError):
+            pass
+        return date, f"{local.tm_hour:02d}:{local.tm_min:02d}:{local.tm_sec:02d}"
+
+_TIMESTAMP_FORMATTER = TimestampFormatter() # 写入函数共用的时间格式化器
+
 def format_timestamp(ts, fmt="%Y-%m-%d %H:%M:%S"):
-    """将时间戳格式化为易读的日期时间字符串"""
+    """将时间戳格式化为易读的日期时间字符串 (默认格式使用按日期缓存的 _TIMESTAMP_FORMATTER)"""
     if isinstance(ts, int) and ts > 0:
         try:
+            if fmt == "%Y-%m-%d %H:%M:%S":
+                date, time_str = _TIMESTAMP_FORMATTER.split(ts)
+                return f"{date} {time_str}"
             return datetime.fromtimestamp(ts).strftime(fmt)
-        except (OSError, ValueError): return f"时间戳({ts})"
+        except (OSError, ValueError, OverflowError): return f"时间戳({ts})"
     return "N/A"
 
 def _sanitize_newlines(text: str) -> str:
@@ -580,7 +1337,7 @@ def _parse_single_segment(segment: dict, export_config: dict) -> str:
         return f'[语音] {duration}"' if isinstance(duration, int) and duration > 0 else "[语音]"
         
     if msg_type == 9: # 红包
-        title = segment.get("48403", {}).get(PB_REDPACKET_TITLE, b"").decode("utf-8", "ignore")
+        title = segment.get(PB_REDPACKET_INFO, {}).get(PB_REDPACKET_TITLE, b"").decode("utf-8", "ignore")
         rp_type = segment.get(PB_REDPACKET_TYPE)
         if rp_type == 2:
             return f"[普通红包] {title}"
@@ -614,8 +1371,9 @@ def _decode_interactive_gray_tip(segment: dict, profile_mgr, name_style, name_fo
         uids = re.findall(r'<qq uin="([^"]+)"', xml)
         texts = re.findall(r'<nor txt="([^"]*)"', xml)
         if len(uids) >= 2 and len(texts) >= 1:
-            actor = profile_mgr.get_display_name(uids[0], name_style, name_format)
-            target = profile_mgr.get_display_name(uids[1], name_style, name_format)
+            names = profile_mgr.get_name_table(name_style, name_format)
+            actor = names.get(uids[0], uids[0])
+            target = names.get(uids[1], uids[1])
             verb = _sanitize_newlines(texts[0]) if texts and texts[0] else "戳了戳"
             suffix = _sanitize_newlines(texts[1]) if len(texts) > 1 else ""
             return {"type": "interactive_tip", "actor": actor, "target": target,
@@ -641,7 +1399,7 @@ def decode_gray_tip(segment: dict, profile_mgr, name_style, name_format, export_
         elif isinstance(recaller_uid_raw, str):
             recaller_uid = recaller_uid_raw
 
-        display_name = profile_mgr.get_display_name(recaller_uid, name_style, name_format)
+        display_name = profile_mgr.get_name_table(name_style, name_format).get(recaller_uid, recaller_uid)
         
         if display_name == recaller_uid:
             fallback_name_raw = segment.get(PB_RECALLER_NAME)
@@ -703,20 +1461,49 @@ def decode_ark_message(segment: dict) -> str or None:
         return None
     except Exception: return "[卡片-解析失败]"
 
-def decode_message_content(content, timestamp, profile_mgr, name_style, name_format, export_config, is_timeline=False) -> list or None:
+def _pb_prune(value, schema):
+    """按结构表裁剪解码结果，只保留解析用到的字段 (主要针对回退到 blackboxprotobuf 时的完整结果)。"""
+    if isinstance(value, list):
+        return [_pb_prune(v, schema) for v in value]
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    for key, v in value.items():
+        entry = schema.get(int(key)) if isinstance(key, str) and key.isdigit() else None
+        if entry is not None:
+            out[key] = _pb_prune(v, entry[1]) if entry[1] else v
+    return out
+
+def _decode_segments(content) -> list or None:
+    """
+    【解码阶段】将 40800 字段内容解码为消息段字典列表，未找到消息容器时返回 None，数据无法解码时抛出异常。
+    结果只与消息内容有关 (不依赖导出设置与用户信息)，可由 DecodeCache 持久化复用。
     """
-    【核心消息解析函数】负责将原始字节流解码为可读的消息部分列表。
-    :param is_timeline: 标志位，用于决定引用消息的格式。
+    decoded = decode_protobuf_fields(content)
+    segments_data = decoded.get(PB_MSG_CONTAINER)
+    if segments_data is None: return None
+    segments = segments_data if isinstance(segments_data, list) else [segments_data]
+    return [_pb_prune(seg, _PB_SEGMENT_SCHEMA) for seg in segments if isinstance(seg, dict)]
+
+def decode_message_content(content, timestamp, profile_mgr, name_style, name_format, export_config, quote_cache=None, peer_uid=None) -> list or None:
+    """
+    【核心消息解析函数】负责将原始字节流解码为消息部分列表 (与输出格式无关的中间表示)：
+    - str: 可直接显示的文本片段 (换行已替换为 [%\n%] 占位符)
+    - {"type": "quote", "ts", "sender", "receiver", "text"}: 引用，包含原消息时间戳、发送者与接收者的显示名称及原文
+    - {"type": "interactive_tip", "actor", "verb", "target", "suffix"}: 拍一拍/戳一戳等互动提示
+    各格式的写入函数直接读取这些字段，不再解析拼接好的字符串。
+    :param quote_cache: 引用原文缓存 (QuoteCache)，与 peer_uid (当前消息所属会话) 一起用于还原引用消息的原文。
+    启用了消息解码缓存 (DECODE_CACHE) 时，消息段优先从缓存中读取。
     """
     if not content: return None
     try:
-        decoded, _ = blackboxprotobuf.decode_message(content)
-        segments_data = decoded.get(PB_MSG_CONTAINER)
-        if segments_data is None: return ["[结构错误: 未找到消息容器]"]
-        segments = segments_data if isinstance(segments_data, list) else [segments_data]
+        if DECODE_CACHE is not None and isinstance(content, bytes):
+            segments = DECODE_CACHE.get_segments(content)
+        else:
+            segments = _decode_segments(content)
+        if segments is None: return ["[结构错误: 未找到消息容器]"]
         parts = []
         for seg in segments:
-            if not isinstance(seg, dict): continue
             msg_type = seg.get(PB_MSG_TYPE)
             part = None
             if msg_type not in MSG_TYPE_MAP: continue
@@ -726,15 +1513,13 @@ def decode_message_content(content, timestamp, profile_mgr, name_style, name_for
                 part = _sanitize_newlines(text)
             elif msg_type == 7: # 引用消息
                 ts = seg.get(PB_REPLY_ORIGIN_TS)
-                origin_content = ""
+                s_uid = seg.get(PB_REPLY_ORIGIN_SENDER_UID, b"").decode("utf-8")
                 
-                # 优先从内容缓存中获取最准确的原文
-                if ts in MESSAGE_CONTENT_CACHE:
-                    origin_content = MESSAGE_CONTENT_CACHE[ts]
-                # 如果内容缓存没有，再尝试从“抢救缓存”获取
-                elif ts in SALVAGE_CACHE:
-                    origin_content = _sanitize_newlines(SALVAGE_CACHE[ts])
-                # 如果都没有，才回退到解析引用自带的摘要
+                # 优先从缓存中获取最准确的原文 (同一会话、同一时间、同一发送者)
+                cached_content = quote_cache.get(peer_uid, ts, s_uid) if quote_cache is not None else None
+                if cached_content is not None:
+                    origin_content = cached_content
+                # 缓存中没有，才回退到解析引用自带的摘要
                 else:
                     raw_origin_content = seg.get(PB_REPLY_ORIGIN_SUMMARY_TEXT, b"").decode("utf-8", "ignore")
                     origin_content = _sanitize_newlines(raw_origin_content)
@@ -747,15 +1532,15 @@ def decode_message_content(content, timestamp, profile_mgr, name_style, name_for
                             origin_content_parts = [_parse_single_segment(o, export_config) for o in origin_obj_list]
                             origin_content = " ".join(filter(None, origin_content_parts))
 
-                s_uid = seg.get(PB_REPLY_ORIGIN_SENDER_UID, b"").decode("utf-8")
-                sender = profile_mgr.get_display_name(get_placeholder(s_uid), name_style, name_format)
-
-                if is_timeline:
-                    r_uid = seg.get(PB_REPLY_ORIGIN_RECEIVER_UID, b"").decode("utf-8")
-                    receiver = profile_mgr.get_display_name(get_placeholder(r_uid), name_style, name_format)
-                    part = f"[引用->{format_timestamp(ts)} {sender} -> {receiver}: {origin_content}]"
-                else:
-                    part = f"[引用->{format_timestamp(ts)} {sender}: {origin_content}]"
+                r_uid_raw = seg.get(PB_REPLY_ORIGIN_RECEIVER_UID, b"")
+                if isinstance(r_uid_raw, bytes):
+                    r_uid = r_uid_raw.decode("utf-8", "ignore")
+                else: # UID 被误判为嵌套消息时无法还原，按单聊双方推断接收者
+                    r_uid = peer_uid if s_uid == profile_mgr.my_uid else profile_mgr.my_uid
+                names = profile_mgr.get_name_table(name_style, name_format)
+                s_uid, r_uid = get_placeholder(s_uid), get_placeholder(r_uid)
+                part = {"type": "quote", "ts": ts, "sender": names.get(s_uid, s_uid), "receiver": names.get(r_uid, r_uid),
+                        "text": origin_content}
 
             elif msg_type == 21: # 通话
                 status = seg.get(PB_CALL_STATUS, b"").decode("utf-8", "ignore")
@@ -781,15 +1566,15 @@ def decode_message_content(content, timestamp, profile_mgr, name_style, name_for
         except Exception: pass
         if not salvaged: salvaged = _extract_readable_text(content)
         if salvaged:
-            SALVAGE_CACHE[timestamp] = salvaged
             return [_sanitize_newlines(salvaged)]
-        b64 = f"[解码失败-BASE64] {base64.b64encode(content).decode('ascii')}"
-        SALVAGE_CACHE[timestamp] = b64
-        return [b64]
+        return [f"[解码失败-BASE64] {base64.b64encode(content).decode('ascii')}"]
 
-def _generate_text_header(config: dict, rows: list, scope_info: dict) -> str:
-    """根据导出配置和范围，动态生成用于TXT/MD的文件头字符串"""
-    if not config['export_config'].get('add_file_header', False) or not rows:
+def _generate_text_header(config: dict, time_range: tuple, scope_info: dict) -> str:
+    """
+    根据导出配置和范围，动态生成用于TXT/MD的文件头字符串。
+    :param time_range: (首条消息时间戳, 末条消息时间戳)，末条未知时写入占位符，由调用方回填。
+    """
+    if not config['export_config'].get('add_file_header', False) or not time_range:
         return ""
         
     profile_mgr = config['profile_mgr']
@@ -797,8 +1582,8 @@ def _generate_text_header(config: dict, rows: list, scope_info: dict) -> str:
     msg_db_hash = _calculate_sha256(DB_PATH)
     profile_db_hash = _calculate_sha256(PROFILE_DB_PATH)
     gen_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    start_time = format_timestamp(rows[0][0])
-    end_time = format_timestamp(rows[-1][0])
+    start_time = format_timestamp(time_range[0])
+    end_time = format_timestamp(time_range[1]) if time_range[1] is not None else _END_TIME_PLACEHOLDER
 
     my_info = profile_mgr.all_users.get(profile_mgr.my_uid, {})
     master_name = my_info.get('nickname', '未知')
@@ -859,9 +1644,12 @@ def _generate_text_header(config: dict, rows: list, scope_info: dict) -> str:
     )
     return header
 
-def _generate_html_header(config: dict, rows: list, scope_info: dict) -> str:
-    """根据导出配置和范围，动态生成文件头的HTML字符串"""
-    if not config['export_config'].get('add_file_header', False) or not rows:
+def _generate_html_header(config: dict, time_range: tuple, scope_info: dict) -> str:
+    """
+    根据导出配置和范围，动态生成文件头的HTML字符串。
+    :param time_range: (首条消息时间戳, 末条消息时间戳)，末条未知时写入占位符，由调用方回填。
+    """
+    if not config['export_config'].get('add_file_header', False) or not time_range:
         return ""
         
     profile_mgr = config['profile_mgr']
@@ -874,8 +1662,8 @@ def _generate_html_header(config: dict, rows: list, scope_info: dict) -> str:
     msg_db_hash = _calculate_sha256(DB_PATH)
     profile_db_hash = _calculate_sha256(PROFILE_DB_PATH)
     gen_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    start_time = format_timestamp(rows[0][0])
-    end_time = format_timestamp(rows[-1][0])
+    start_time = format_timestamp(time_range[0])
+    end_time = format_timestamp(time_range[1]) if time_range[1] is not None else _END_TIME_PLACEHOLDER
 
     my_info = profile_mgr.all_users.get(profile_mgr.my_uid, {})
     master_name = my_info.get('nickname', '未知')
@@ -946,6 +1734,45 @@ def _generate_html_header(config: dict, rows: list, scope_info: dict) -> str:
     )
     return header_html
 
+def get_export_formats(export_config: dict) -> list:
+    """
+    返回导出格式列表。export_format 可以是单个格式 ('md') 或格式列表 (['txt', 'html'])，
+    结果去重并保持顺序，没有有效格式时使用默认的 md。
+    """
+    value = export_config.get('export_format', 'md')
+    values = [value] if isinstance(value, str) else list(value or [])
+    formats = []
+    for fmt in values:
+        fmt = str(fmt).lower()
+        if fmt in _EXPORT_FORMATS and fmt not in formats:
+            formats.append(fmt)
+    return formats or ['md']
+
+def get_html_site_split(export_config: dict):
+    """
+    返回 HTML 分页站点的拆分方式：'month' 表示每月一页，正整数 N 表示每页约 N 条消息，未启用时返回 None。
+    启用后 HTML 格式不再导出为单个文件，而是导出为包含目录页与各分页的文件夹 (见 export_html_site)。
+    """
+    value = export_config.get('html_site_split')
+    if value == 'month': return 'month'
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+def _site_split_label(value) -> str:
+    """HTML 分页方式的显示文本。"""
+    split = get_html_site_split({'html_site_split': value})
+    if split is None: return "关"
+    return "每月一页" if split == 'month' else f"每页约 {split} 条"
+
+def _file_formats(export_config: dict) -> list:
+    """导出为单个文件的格式列表：启用 HTML 分页站点时不含 html。"""
+    formats = get_export_formats(export_config)
+    if get_html_site_split(export_config) is None: return formats
+    return [fmt for fmt in formats if fmt != 'html']
+
 # --- 用户交互与选择 ---
 def select_export_mode():
     """让用户选择主导出模式。"""
@@ -977,22 +1804,30 @@ def select_export_mode():
             return int(choice)
         exit(1)
 
-def select_export_format(path_title: str, current_format: str) -> str:
-    """让用户选择导出格式。"""
+def _format_label(export_format) -> str:
+    """导出格式的显示文本，多个格式以 '+' 连接，如 TXT+HTML。"""
+    return "+".join(get_export_formats({'export_format': export_format})).upper()
+
+def select_export_format(path_title: str, current_format) -> str or list:
+    """让用户选择导出格式，可多选 (一次导出同时生成多种格式)，多选时返回格式列表。"""
     print(f"\n--- {path_title} ---")
     formats = {'1': 'txt', '2': 'md', '3': 'html'}
     descs = {'1': "纯文本 (.txt)", '2': "Markdown (.md) [默认]", '3': "网页文件 (.html)"}
     
-    print(f"当前格式: {current_format.upper()}")
+    print(f"当前格式: {_format_label(current_format)}")
     for k, v in descs.items():
         print(f"  {k}. {v}")
     
     while True:
-        choice = input("请输入选项序号 (1-3, 直接回车使用默认值 'md'): ").strip()
+        choice = input("请输入选项序号 (1-3, 可多选，如 1 3; 直接回车使用默认值 'md'): ").strip()
         if not choice:
             return 'md'
-        if choice in formats:
-            return formats[choice]
+        keys = re.split(r'[\s,]+', choice)
+        if all(k in formats for k in keys):
+            selected = []
+            for k in keys:
+                if formats[k] not in selected: selected.append(formats[k])
+            return selected[0] if len(selected) == 1 else selected
         print("  -> 无效输入，请重试。")
 
 def select_html_template(path_title: str, current_template_in_config: str) -> str:
@@ -1038,6 +1873,27 @@ def select_html_template(path_title: str, current_template_in_config: str) -> st
             return choices[choice_str]
         print("  -> 无效输入，请重试。")
 
+def select_html_site_split(path_title: str, current_value):
+    """让用户选择 HTML 分页站点的拆分方式，返回 '' (关闭)、'month' 或每页的消息数。"""
+    print(f"\n--- {path_title} ---")
+    print(f"当前设置: {_site_split_label(current_value)}")
+    print("启用后 HTML 导出为一个文件夹: 目录页 index.html 加上各个分页，适合在手机上浏览很长的聊天记录。")
+    print("  1. 关闭 (导出为单个 HTML 文件) [默认]")
+    print("  2. 每月一页")
+    print("  3. 每页固定消息数")
+
+    while True:
+        choice = input("请输入选项序号 (1-3, 直接回车使用默认值): ").strip()
+        if not choice or choice == '1':
+            return ''
+        if choice == '2':
+            return 'month'
+        if choice == '3':
+            size = input("请输入每页的消息数 (如 5000): ").strip()
+            if size.isdigit() and int(size) > 0:
+                return int(size)
+        print("  -> 无效输入，请重试。")
+
 def manage_export_config(path_title, config_mgr):
     """管理导出配置的交互菜单"""
     temp_config = config_mgr.config.copy()
@@ -1056,19 +1912,24 @@ def manage_export_config(path_title, config_mgr):
             '7': ('export_non_friends', "导出非好友/临时会话"),
             '8': ('export_format', "导出格式"),
             '9': ('html_template', "HTML模板"),
-            '10': ('name_style', "用户标识格式")
+            '10': ('name_style', "用户标识格式"),
+            '11': ('use_index_db', "使用辅助索引数据库加速查询"),
+            '12': ('use_decode_cache', "缓存消息解码结果 (再次导出时跳过Protobuf解码)"),
+            '13': ('html_site_split', "HTML分页站点 (按月或按消息数拆分为多个页面)")
         }
         
         for key, (cfg_key, lbl) in all_options.items():
             current_value_str = ""
-            if cfg_key in ['name_style', 'export_format', 'html_template']:
+            if cfg_key in ['name_style', 'export_format', 'html_template', 'html_site_split']:
                 if cfg_key == 'name_style':
                     style_map = {'default': "备注/昵称", 'nickname': "昵称", 'qq': "QQ号", 'uid': "UID", 'custom': "自定义"}
                     current_value_str = f": [{style_map.get(temp_config.get(cfg_key, 'default'), '未知')}]"
                 elif cfg_key == 'export_format':
-                    current_value_str = f": [{temp_config.get(cfg_key, 'md').upper()}]"
+                    current_value_str = f": [{_format_label(temp_config.get(cfg_key, 'md'))}]"
                 elif cfg_key == 'html_template':
                     current_value_str = f": [{temp_config.get(cfg_key, 'default.html')}]"
+                elif cfg_key == 'html_site_split':
+                    current_value_str = f": [{_site_split_label(temp_config.get(cfg_key))}]"
             else:
                 current_value_str = f": [{'开' if temp_config.get(cfg_key) else '关'}]"
             
@@ -1094,6 +1955,8 @@ def manage_export_config(path_title, config_mgr):
                     temp_config['export_format'] = select_export_format(f"{path_title} > {label}", temp_config.get(config_key, 'md'))
                 elif config_key == 'html_template':
                     temp_config['html_template'] = select_html_template(f"{path_title} > {label}", temp_config.get(config_key, 'default.html'))
+                elif config_key == 'html_site_split':
+                    temp_config['html_site_split'] = select_html_site_split(f"{path_title} > {label}", temp_config.get(config_key))
                 else:
                     temp_config[config_key] = not temp_config.get(config_key)
                 toggled = True
@@ -1257,68 +2120,416 @@ def select_group(profile_mgr, config_mgr, path_title):
         print("  -> 无效输入，请重试。")
         return None
 
+# --- 辅助索引数据库 ---
+# 解密后的数据库通常没有适合按会话、时间查询的索引，每个好友的导出都要扫描整张消息表。
+# 辅助索引数据库是一个独立的SQLite文件，以只读方式附加到消息数据库连接上，源数据库保持不变：
+# - uids:       UID 到整数ID的映射，压缩索引体积
+# - msg_index:  每条消息的 (会话ID, 时间戳, 源rowid, 发送者ID)，按 (会话, 时间) 与 (时间) 建立覆盖索引
+# - peer_stats: 每个会话的消息数、首条与末条消息时间
+# - meta:       结构版本与源数据库指纹 (大小、修改时间、inode)
+# 指纹变化时，若源数据库只是在末尾追加了消息 (每天重新解密后的常见情况，qqnt_decrypt.py --incremental 原地更新页面也会改变修改时间)，
+# 只把新消息补充进索引；已有消息被删除或替换时才完整重建。
+
+def _db_fingerprint(db_path):
+    """返回数据库文件的指纹字符串 (大小:修改时间ns:inode)。"""
+    st = os.stat(db_path)
+    return f"{st.st_size}:{st.st_mtime_ns}:{st.st_ino}"
+
+def ensure_index_db():
+    """
+    确保与当前消息数据库对应的辅助索引数据库存在且未过期，必要时重新建立 (每个解密数据库只需建立一次)。
+    返回索引数据库是否可用。
+    """
+    if not os.path.exists(DB_PATH):
+        return False
+    try:
+        fingerprint = _db_fingerprint(DB_PATH)
+    except OSError:
+        return False
+
+    # 1. 已有索引且版本、指纹一致时直接使用；指纹变化但只追加了新消息时就地补充
+    if os.path.exists(INDEX_DB_PATH):
+        try:
+            with sqlite3.connect(f"file:{INDEX_DB_PATH}?mode=ro", uri=True) as con:
+                meta = dict(con.execute("SELECT key, value FROM meta").fetchall())
+            if meta.get('version') == _INDEX_DB_VERSION:
+                if meta.get('source_fingerprint') == fingerprint or _append_index_db(fingerprint):
+                    return True
+        except sqlite3.Error:
+            pass
+
+    # 2. 重新建立：先写入临时文件，完成后再替换，避免留下不完整的索引
+    print("正在建立辅助索引数据库 (每个解密数据库只需一次)...")
+    tmp_path = INDEX_DB_PATH + ".tmp"
+    try:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        con = sqlite3.connect(f"file:{tmp_path}", uri=True)
+        try:
+            con.execute("ATTACH DATABASE ? AS src", (f"file:{DB_PATH}?mode=ro",))
+            con.executescript(f"""
+                PRAGMA journal_mode = OFF;
+                PRAGMA synchronous = OFF;
+                CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE uids (id INTEGER PRIMARY KEY, uid TEXT UNIQUE);
+                CREATE TABLE msg_index (peer_id INTEGER, ts INTEGER, src_rowid INTEGER, sender_id INTEGER);
+                CREATE TABLE peer_stats (peer_id INTEGER PRIMARY KEY, msg_count INTEGER, first_ts INTEGER, last_ts INTEGER);
+                INSERT INTO uids (uid)
+                    SELECT `{COL_PEER_UID}` FROM src.{TABLE_NAME} WHERE `{COL_PEER_UID}` IS NOT NULL
+                    UNION SELECT `{COL_SENDER_UID}` FROM src.{TABLE_NAME} WHERE `{COL_SENDER_UID}` IS NOT NULL;
+                INSERT INTO msg_index (peer_id, ts, src_rowid, sender_id)
+                    SELECT p.id, m.`{COL_TIMESTAMP}`, m.rowid, s.id FROM src.{TABLE_NAME} m
+                    JOIN uids p ON p.uid = m.`{COL_PEER_UID}` LEFT JOIN uids s ON s.uid = m.`{COL_SENDER_UID}`;
+                CREATE INDEX msg_index_peer_ts ON msg_index (peer_id, ts, src_rowid, sender_id);
+                CREATE INDEX msg_index_ts ON msg_index (ts, src_rowid, peer_id);
+                INSERT INTO peer_stats SELECT peer_id, COUNT(*), MIN(ts), MAX(ts) FROM msg_index GROUP BY peer_id;
+            """)
+            con.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ('version', _INDEX_DB_VERSION), ('source_fingerprint', fingerprint),
+                ('source_path', os.path.abspath(DB_PATH)), ('built_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            ])
+            con.commit()
+        finally:
+            con.close()
+        os.replace(tmp_path, INDEX_DB_PATH)
+        return True
+    except (sqlite3.Error, OSError) as e:
+        print(f"警告: 无法建立辅助索引数据库，将直接查询消息表。错误: {e}")
+        try:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+        except OSError: pass
+        return False
+
+def _append_index_db(fingerprint):
+    """
+    源数据库只在末尾追加了消息时，把新消息补充到已有的辅助索引中并更新指纹，返回是否成功。
+    判断依据：索引中最大的源rowid及之前的消息数不变，且该rowid对应的 (会话, 时间, 发送者) 不变；
+    不满足时 (有消息被删除或替换) 返回 False，由调用方完整重建。
+    """
+    con = sqlite3.connect(INDEX_DB_PATH, timeout=30)
+    try:
+        con.execute("ATTACH DATABASE ? AS src", (f"file:{DB_PATH}?mode=ro",))
+        max_rowid, indexed = con.execute("SELECT MAX(src_rowid), COUNT(*) FROM msg_index").fetchone()
+        if max_rowid is None:
+            return False
+        kept = con.execute(
+            f"SELECT COUNT(*) FROM src.{TABLE_NAME} WHERE rowid <= ? AND `{COL_PEER_UID}` IS NOT NULL", (max_rowid,)).fetchone()[0]
+        if kept != indexed:
+            return False
+        source_last = con.execute(
+            f"SELECT `{COL_PEER_UID}`, `{COL_TIMESTAMP}`, `{COL_SENDER_UID}` FROM src.{TABLE_NAME} WHERE rowid = ?", (max_rowid,)).fetchone()
+        indexed_last = con.execute(
+            "SELECT p.uid, i.ts, s.uid FROM msg_index i JOIN uids p ON p.id = i.peer_id LEFT JOIN uids s ON s.id = i.sender_id "
+            "WHERE i.src_rowid = ?", (max_rowid,)).fetchone()
+        if source_last != indexed_last:
+            return False
+
+        with con:
+            con.execute(f"""
+                INSERT OR IGNORE INTO uids (uid)
+                    SELECT `{COL_PEER_UID}` FROM src.{TABLE_NAME} WHERE rowid > ? AND `{COL_PEER_UID}` IS NOT NULL
+                    UNION SELECT `{COL_SENDER_UID}` FROM src.{TABLE_NAME} WHERE rowid > ? AND `{COL_SENDER_UID}` IS NOT NULL
+            """, (max_rowid, max_rowid))
+            added = con.execute(f"""
+                INSERT INTO msg_index (peer_id, ts, src_rowid, sender_id)
+                    SELECT p.id, m.`{COL_TIMESTAMP}`, m.rowid, s.id FROM src.{TABLE_NAME} m
+                    JOIN uids p ON p.uid = m.`{COL_PEER_UID}` LEFT JOIN uids s ON s.uid = m.`{COL_SENDER_UID}`
+                    WHERE m.rowid > ?
+            """, (max_rowid,)).rowcount
+            con.execute("""
+                INSERT OR REPLACE INTO peer_stats
+                    SELECT peer_id, COUNT(*), MIN(ts), MAX(ts) FROM msg_index
+                    WHERE peer_id IN (SELECT DISTINCT peer_id FROM msg_index WHERE src_rowid > ?) GROUP BY peer_id
+            """, (max_rowid,))
+            con.execute("UPDATE meta SET value = ? WHERE key = 'source_fingerprint'", (fingerprint,))
+        print(f"辅助索引数据库已更新：新增 {added} 条消息。")
+        return True
+    finally:
+        con.close()
+
+def attach_index_db(db_con):
+    """将辅助索引数据库以只读方式附加到消息数据库连接 (别名 idx)，返回是否成功。"""
+    try:
+        db_con.execute("ATTACH DATABASE ? AS idx", (f"file:{INDEX_DB_PATH}?mode=ro",))
+        return True
+    except sqlite3.Error as e:
+        print(f"警告: 无法附加辅助索引数据库，将直接查询消息表。错误: {e}")
+        return False
+
+def _index_attached(db_con):
+    """判断连接上是否已附加辅助索引数据库。"""
+    return any(row[1] == 'idx' for row in db_con.execute("PRAGMA database_list"))
+
+def build_message_query(db_con, peer_uids, start_ts=None, end_ts=None, after_ts=None, probe=False, ts_only=False):
+    """
+    构建按会话与时间范围查询消息的SQL，返回 (query, params)。结果列依次为时间戳、发送者、会话、消息内容，按时间升序。
+    :param peer_uids: 单个会话UID，或UID列表 (时间线模式)。
+    :param after_ts: 只查询严格晚于该时间戳的消息。
+    :param probe: 为 True 时只用于判断是否存在符合条件的消息 (SELECT 1 ... LIMIT 1)。
+    :param ts_only: 为 True 时结果列只有时间戳与源rowid (不读取消息内容)，用于规划 HTML 分页。
+    已附加辅助索引数据库时通过 (会话, 时间) 索引定位消息行，否则直接查询消息表。
+    """
+    single_peer = isinstance(peer_uids, str)
+    if _index_attached(db_con):
+        columns = "i.ts, i.src_rowid" if ts_only else f"m.`{COL_TIMESTAMP}`, m.`{COL_SENDER_UID}`, m.`{COL_PEER_UID}`, m.`{COL_MSG_CONTENT}`"
+        source = "idx.msg_index i" if probe or ts_only else f"idx.msg_index i JOIN {TABLE_NAME} m ON m.rowid = i.src_rowid"
+        ts_col = "i.ts"
+        order_by = "i.ts ASC, i.src_rowid ASC"
+        if single_peer:
+            peer_clause = "i.peer_id = (SELECT id FROM idx.uids WHERE uid = ?)"
+        else:
+            # 多个会话 (时间线) 时按时间索引顺序读取，避免把包含消息内容的结果集整体排序；'+' 阻止该条件走会话索引
+            peer_clause = f"+i.peer_id IN (SELECT id FROM idx.uids WHERE uid IN ({', '.join('?' for _ in peer_uids)}))"
+    else:
+        columns = f"`{COL_TIMESTAMP}`, rowid" if ts_only else f"`{COL_TIMESTAMP}`, `{COL_SENDER_UID}`, `{COL_PEER_UID}`, `{COL_MSG_CONTENT}`"
+        source = TABLE_NAME
+        ts_col = f"`{COL_TIMESTAMP}`"
+        order_by = f"`{COL_TIMESTAMP}` ASC"
+        if single_peer:
+            peer_clause = f"`{COL_PEER_UID}` = ?"
+        else:
+            peer_clause = f"`{COL_PEER_UID}` IN ({', '.join('?' for _ in peer_uids)})"
+
+    clauses = []
+    params = []
+    if peer_uids:
+        clauses.append(peer_clause)
+        params.extend([peer_uids] if single_peer else peer_uids)
+    if after_ts is not None:
+        clauses.append(f"{ts_col} > ?")
+        params.append(after_ts)
+    if start_ts:
+        clauses.append(f"{ts_col} >= ?")
+        params.append(start_ts)
+    if end_ts:
+        clauses.append(f"{ts_col} <= ?")
+        params.append(end_ts)
+
+    query = f"SELECT {'1' if probe else columns} FROM {source}"
+    if clauses:
+        query += f" WHERE {' AND '.join(clauses)}"
+    query += " LIMIT 1" if probe else f" ORDER BY {order_by}"
+    return query, params
+
+def _build_fanout_query(db_con, start_ts=None, end_ts=None):
+    """
+    构建【单次扫描】查询，返回 (query, params)。目标会话预先写入临时表 export_targets (ord, uid)，
+    结果列依次为目标序号、时间戳、发送者、会话、消息内容，按目标序号、时间升序。
+    已附加辅助索引数据库时按目标顺序逐个会话走 (会话, 时间) 索引；否则顺序扫描一遍消息表后统一排序。
+    """
+    if _index_attached(db_con):
+        columns = f"t.ord, m.`{COL_TIMESTAMP}`, m.`{COL_SENDER_UID}`, m.`{COL_PEER_UID}`, m.`{COL_MSG_CONTENT}`"
+        # CROSS JOIN 固定连接顺序：按序号遍历目标，再逐个会话走 (会话, 时间) 索引，结果天然有序无需排序
+        source = (f"temp.export_targets t CROSS JOIN idx.uids u ON u.uid = t.uid "
+                  f"CROSS JOIN idx.msg_index i ON i.peer_id = u.id CROSS JOIN {TABLE_NAME} m ON m.rowid = i.src_rowid")
+        ts_col = "i.ts"
+        order_by = "t.ord ASC, i.ts ASC, i.src_rowid ASC"
+    else:
+        columns = f"t.ord, m.`{COL_TIMESTAMP}`, m.`{COL_SENDER_UID}`, m.`{COL_PEER_UID}`, m.`{COL_MSG_CONTENT}`"
+        # CROSS JOIN 固定以消息表为外层，保证只顺序读取一遍
+        source = f"{TABLE_NAME} m CROSS JOIN temp.export_targets t ON t.uid = m.`{COL_PEER_UID}`"
+        ts_col = f"m.`{COL_TIMESTAMP}`"
+        order_by = f"t.ord ASC, m.`{COL_TIMESTAMP}` ASC, m.rowid ASC"
+
+    clauses = []
+    params = []
+    if start_ts:
+        clauses.append(f"{ts_col} >= ?")
+        params.append(start_ts)
+    if end_ts:
+        clauses.append(f"{ts_col} <= ?")
+        params.append(end_ts)
+
+    query = f"SELECT {columns} FROM {source}"
+    if clauses:
+        query += f" WHERE {' AND '.join(clauses)}"
+    query += f" ORDER BY {order_by}"
+    return query, params
+
+def iter_peer_runs(db_con, peer_uids, start_ts=None, end_ts=None):
+    """
+    【单次扫描】用一条按 (会话, 时间) 排序的查询读取多个会话的消息，并按会话切分。
+    按 peer_uids 的顺序逐个产出 (序号, rows)，没有消息的会话产出空迭代器。
+    rows 与 build_message_query 的结果列相同；调用方必须先读完当前会话的 rows 再取下一个会话。
+    """
+    cur = db_con.cursor()
+    cur.execute("DROP TABLE IF EXISTS temp.export_targets")
+    cur.execute("CREATE TEMP TABLE export_targets (ord INTEGER PRIMARY KEY, uid TEXT)")
+    cur.executemany("INSERT INTO temp.export_targets (ord, uid) VALUES (?, ?)", enumerate(peer_uids))
+    cur.execute("CREATE INDEX temp.export_targets_uid ON export_targets (uid)")
+
+    with profile_stage('query'):
+        cur.execute(*_build_fanout_query(db_con, start_ts, end_ts))
+    next_ord = 0
+    for ord_, run in itertools.groupby(_iter_rows(cur), key=lambda row: row[0]):
+        while next_ord < ord_:
+            yield next_ord, iter(())
+            next_ord += 1
+        yield ord_, (row[1:] for row in run)
+        next_ord = ord_ + 1
+    while next_ord < len(peer_uids):
+        yield next_ord, iter(())
+        next_ord += 1
+
 # --- 导出执行逻辑 ---
-def _write_txt(f, rows, profile_mgr, config):
-    """将聊天记录写入纯文本文件"""
+def _mark_day_start(f, progress, day, count):
+    """【增量导出】记录一个日期块在文件中的起始位置，以及此前已写入的消息数。"""
+    progress['day'] = day
+    progress['day_offset'] = f.tell()
+    progress['day_start_count'] = count
+
+def _rowids_at(db_con, peer_uid, ts):
+    """
+    【增量导出】会话中时间戳恰为 ts 的消息的源rowid (升序)。
+    与上次最后一条消息同一秒到达的新消息不晚于上次的结束时间，只能通过这一秒内的rowid是否变化来发现。
+    """
+    cur = db_con.cursor()
+    cur.execute(*build_message_query(db_con, peer_uid, ts, ts, ts_only=True))
+    return sorted(rowid for _, rowid in cur)
+
+def _file_head(fmt, config, time_range, scope_info):
+    """文件中聊天内容之前的部分：TXT/MD 为文件头，HTML 为代入文件头的模板前半部分。记录结束时间为占位符。"""
+    if fmt != 'html':
+        return _generate_text_header(config, time_range, scope_info)
+    template_path = os.path.join(TEMPLATE_DIR_PATH, config['export_config'].get('html_template', 'default.html'))
+    template_prefix, _ = _load_html_template(template_path)
+    return template_prefix.replace('{{file_header}}', _generate_html_header(config, time_range, scope_info))
+
+def _refresh_file_head(path, head, file_resume):
+    """
+    【增量导出】续写前将文件截断到最后一个日期块的起始位置，并把上次写入的文件开头换成本次生成的 head，
+    使文件头中的数据库校验和与生成时间保持最新。新旧开头字节数相同时原地覆盖，否则复制保留的内容到新文件后替换。
+    head 为 None 时只截断。返回更新后的 {'day_offset', 'end_time_positions', 'head_size'}。
+    """
+    old_size, day_offset = file_resume['head_size'], file_resume['day_offset']
+    if head is None:
+        with open(path, 'r+b') as f:
+            f.truncate(day_offset)
+        return {'day_offset': day_offset, 'end_time_positions': file_resume['end_time_positions'], 'head_size': old_size}
+
+    placeholder = _END_TIME_PLACEHOLDER.encode('utf-8')
+    data = head.encode('utf-8')
+    positions, pos = [], 0
+    for piece in data.split(placeholder)[:-1]:
+        pos += len(piece)
+        positions.append(pos)
+        pos += len(placeholder)
+
+    if len(data) == old_size:
+        with open(path, 'r+b') as f:
+            f.truncate(day_offset)
+            f.write(data)
+    else:
+        tmp_path = path + ".tmp"
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            dst.write(data)
+            src.seek(old_size)
+            remaining = day_offset - old_size
+            while remaining > 0:
+                chunk = src.read(min(remaining, _COPY_BLOCK_SIZE))
+                if not chunk: break
+                dst.write(chunk)
+                remaining -= len(chunk)
+        os.replace(tmp_path, path)
+    return {'day_offset': day_offset + len(data) - old_size, 'end_time_positions': positions, 'head_size': len(data)}
+
+def _tip_text(tip: dict) -> str:
+    """互动提示对象的显示文本。"""
+    return f"{tip['actor']} {tip['verb']} {tip['target']}{tip['suffix']}"
+
+def _quote_names(quote: dict, is_timeline: bool) -> str:
+    """引用对象的 "发送者" 部分，时间线模式下为 "发送者 -> 接收者"。"""
+    return f"{quote['sender']} -> {quote['receiver']}" if is_timeline else quote['sender']
+
+def _quote_summary(quote: dict, is_timeline: bool) -> str:
+    """引用对象的完整摘要 "时间 发送者[ -> 接收者]: 原文"。"""
+    return f"{format_timestamp(quote['ts'])} {_quote_names(quote, is_timeline)}: {quote['text']}"
+
+def _is_interactive_tip(parts: list) -> bool:
+    """消息是否为互动提示 (首个部分为互动提示)，TXT 导出中这类消息的发送者显示为 "[系统提示]"。"""
+    first = parts[0]
+    return isinstance(first, dict) and first.get("type") == "interactive_tip"
+
+def _split_parts(parts: list) -> tuple:
+    """
+    将消息部分拆分为 (正文, 引用对象或None)，供各格式的写入函数使用。
+    首个部分为互动提示时，正文只包含提示文本。
+    """
+    if _is_interactive_tip(parts):
+        return _tip_text(parts[0]), None
+    texts = []
+    quote = None
+    for p in parts:
+        if isinstance(p, str):
+            texts.append(p)
+        elif p.get("type") == "quote":
+            quote = p
+        elif p.get("type") == "interactive_tip":
+            texts.append(_tip_text(p))
+    return " ".join(texts), quote
+
+def _write_txt(f, profile_mgr, config, progress=None):
+    """
+    将聊天记录写入纯文本文件。
+    与其他写入函数一样是一个协程：预激后通过 send() 逐条接收消息记录，send(None) 表示结束，
+    返回值 (StopIteration.value) 为写入的消息数。这样一次解码的记录可以同时交给多个格式的写入函数。
+    """
     name_style = config.get('name_style', 'default')
     name_format = config.get('name_format', '')
+    names = profile_mgr.get_name_table(name_style, name_format)
     count = 0
-    for row in rows:
-        ts, s_uid, p_uid, content = row
-        parts = decode_message_content(content, ts, profile_mgr, name_style, name_format, config['export_config'], config['is_timeline'])
-        if not parts: continue
+    record = yield
+    while record is not None:
+        ts, s_uid, p_uid, parts = record
         
-        is_reply = isinstance(parts[0], str) and parts[0].startswith('[引用->')
-        text = " ".join(str(p) for p in parts if not isinstance(p, dict))
-        
-        if not is_reply:
-            MESSAGE_CONTENT_CACHE[ts] = text
-        else:
-            pattern = r'\[引用->(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) (.*)\]'
-            replacement = r'[引用-> [\1] \2 <-]'
-            text = re.sub(pattern, replacement, text, count=1)
+        text, quote = _split_parts(parts)
+        if quote is not None:
+            quote_text = f"[引用-> [{format_timestamp(quote['ts'])}] {_quote_names(quote, config['is_timeline'])}: {quote['text']} <-]"
+            text = f"{quote_text} {text}" if text else quote_text
 
         time = format_timestamp(ts)
-        first = parts[0]
-        if isinstance(first, dict) and first.get("type") == "interactive_tip":
-            body = f"{first['actor']} {first['verb']} {first['target']}{first['suffix']}"
-            line = f"[{time}] [系统提示]: {body}\n"
+        if progress is not None and time[:10] != progress.get('day'):
+            _mark_day_start(f, progress, time[:10], count)
+        if _is_interactive_tip(parts):
+            line = f"[{time}] [系统提示]: {text}\n"
         else:
-            sender = profile_mgr.get_display_name(get_placeholder(s_uid), name_style, name_format)
+            s_uid = get_placeholder(s_uid)
+            sender = names.get(s_uid, s_uid)
             if sender == "N/A": sender = "[系统提示]"
             if config['is_timeline']:
-                if get_placeholder(s_uid) == get_placeholder(p_uid): p_uid = profile_mgr.my_uid
-                receiver = profile_mgr.get_display_name(get_placeholder(p_uid), name_style, name_format)
+                p_uid = get_placeholder(p_uid)
+                if s_uid == p_uid: p_uid = profile_mgr.my_uid
+                receiver = names.get(p_uid, p_uid)
                 line = f"[{time}] {sender} -> {receiver}: {text}\n"
             else: line = f"[{time}] {sender}: {text}\n"
         f.write(line)
         count += 1
+        record = yield
     return count
 
-def _write_md(f, rows, profile_mgr, config):
-    """将聊天记录写入Markdown文件"""
+def _write_md(f, profile_mgr, config, progress=None):
+    """将聊天记录写入Markdown文件 (写入协程，用法同 _write_txt)"""
     name_style = config.get('name_style', 'default')
     name_format = config.get('name_format', '')
+    names = profile_mgr.get_name_table(name_style, name_format)
     count = 0
     last_date = None
     last_sender_key = None
     last_element_was_quote = False # 状态追踪变量
     
-    for row in rows:
-        ts, s_uid, p_uid, content = row
-        parts = decode_message_content(content, ts, profile_mgr, name_style, name_format, config['export_config'], config['is_timeline'])
-        if not parts: continue
+    record = yield
+    while record is not None:
+        ts, s_uid, p_uid, parts = record
         
-        dt_object = datetime.fromtimestamp(ts)
-        current_date = dt_object.strftime("%Y-%m-%d")
-        current_time = dt_object.strftime("%H:%M:%S")
+        current_date, current_time = _TIMESTAMP_FORMATTER.split(ts)
 
-        sender_display = profile_mgr.get_display_name(get_placeholder(s_uid), name_style, name_format)
+        s_uid = get_placeholder(s_uid)
+        sender_display = names.get(s_uid, s_uid)
         if sender_display == "N/A":
             sender_key = "[系统提示]"
         elif config['is_timeline']:
-            if get_placeholder(s_uid) == get_placeholder(p_uid): p_uid = profile_mgr.my_uid
-            receiver_display = profile_mgr.get_display_name(get_placeholder(p_uid), name_style, name_format)
+            p_uid = get_placeholder(p_uid)
+            if s_uid == p_uid: p_uid = profile_mgr.my_uid
+            receiver_display = names.get(p_uid, p_uid)
             sender_key = f"{sender_display} -> {receiver_display}"
         else:
             sender_key = sender_display
@@ -1327,6 +2538,8 @@ def _write_md(f, rows, profile_mgr, config):
             if last_date is not None:
                 if not last_element_was_quote:
                     f.write(f"\n")
+            if progress is not None:
+                _mark_day_start(f, progress, current_date, count)
             f.write(f"# {current_date}\n")
             last_date = current_date
             last_sender_key = None
@@ -1339,26 +2552,8 @@ def _write_md(f, rows, profile_mgr, config):
             last_sender_key = sender_key
             last_element_was_quote = False
 
-        main_text_parts = []
-        quote_content = ""
-        is_reply = isinstance(parts[0], str) and parts[0].startswith('[引用->')
-        
-        if not is_reply and isinstance(parts[0], dict) and parts[0].get("type") == "interactive_tip":
-            tip = parts[0]
-            main_text_parts.append(f"{tip['actor']} {tip['verb']} {tip['target']}{tip['suffix']}")
-        else:
-            for p in parts:
-                p_str = str(p)
-                match = re.search(r'\[引用->(.*)\]', p_str)
-                if match:
-                    quote_content = match.group(1)
-                else:
-                    main_text_parts.append(p_str)
-        
-        main_text = " ".join(main_text_parts)
-        
-        if not is_reply:
-            MESSAGE_CONTENT_CACHE[ts] = main_text
+        main_text, quote = _split_parts(parts)
+        quote_content = _quote_summary(quote, config['is_timeline']) if quote is not None else ""
 
         if sender_key == "[系统提示]" and main_text.startswith('[') and main_text.endswith(']'):
                 main_text = main_text[1:-1]
@@ -1371,245 +2566,767 @@ def _write_md(f, rows, profile_mgr, config):
             last_element_was_quote = False
         
         count += 1
+        record = yield
     return count
 
-def _write_html(f, rows, profile_mgr, config, scope_info):
-    """将聊天记录写入HTML文件"""
+def _load_html_template(template_path):
+    """
+    读取HTML模板，并在 {{chat_content}} 处一次性切分为 (内容之前, 内容之后) 两部分。
+    切分结果按路径缓存，批量导出时每个模板只读取和切分一次。
+    """
+    template_parts = _HTML_TEMPLATE_CACHE.get(template_path)
+    if template_parts is None:
+        with open(template_path, 'r', encoding='utf-8') as tpl_f:
+            template_str = tpl_f.read()
+        prefix, _, suffix = template_str.partition('{{chat_content}}')
+        template_parts = _HTML_TEMPLATE_CACHE[template_path] = (prefix, suffix.replace('{{chat_content}}', ''))
+    return template_parts
+
+def _write_html(f, profile_mgr, config, scope_info, progress=None, resume=None):
+    """
+    将聊天记录流式写入HTML文件 (写入协程，用法同 _write_txt)。
+    收到第一条记录后写出模板前半部分 (含文件头) 先行写出，之后每个日期块边生成边写入，最后写出模板后半部分，内存占用与消息数量无关。
+    提供 resume (上次的增量导出进度) 时，文件已截断到最后一个日期块的起始位置并换上了新的开头 (见 _refresh_file_head)，只续写日期块与模板后半部分。
+    """
     template_filename = config['export_config'].get('html_template', 'default.html')
     template_path = os.path.join(TEMPLATE_DIR_PATH, template_filename)
 
     try:
-        with open(template_path, 'r', encoding='utf-8') as tpl_f:
-            template_str = tpl_f.read()
+        template_prefix, template_suffix = _load_html_template(template_path)
     except FileNotFoundError:
         print(f"\n错误：HTML模板文件 '{template_path}' 未找到。请确保它存在于 '{TEMPLATE_DIR_PATH}' 文件夹中。")
         f.write(f"<h1>错误</h1><p>HTML模板文件 '{template_filename}' 未在 '{TEMPLATE_DIR_PATH}' 文件夹中找到。</p>")
+        while (yield) is not None: pass # 丢弃记录，不影响同时写入的其他格式
         return 0
     except Exception as e:
         print(f"\n错误：读取HTML模板文件时出错: {e}")
         f.write(f"<h1>错误</h1><p>读取HTML模板文件时出错: {e}</p>")
+        while (yield) is not None: pass
         return 0
 
     name_style = config.get('name_style', 'default')
     name_format = config.get('name_format', '')
+    names = profile_mgr.get_name_table(name_style, name_format)
     
     def safe_escape(value):
         return html.escape(html.unescape(str(value)))
 
-    # 1. 生成文件头HTML
-    header_html = _generate_html_header(config, rows, scope_info)
-
-    # 2. 生成聊天内容主体HTML
-    content_html_parts = []
+    # 1. 写出模板前半部分与文件头，记录结束时间此时未知，先写入占位符
+    first_record = yield
+    if resume:
+        time_range = (resume['first_ts'], None)
+        header_html = _generate_html_header(config, time_range, scope_info) if '{{file_header}}' in template_suffix else ""
+        placeholder_positions = resume['end_time_positions']
+    else:
+        time_range = (first_record[0], None) if first_record else None
+        header_html = _generate_html_header(config, time_range, scope_info)
+        placeholder_positions = _write_tracking_placeholder(f, template_prefix.replace('{{file_header}}', header_html), _END_TIME_PLACEHOLDER)
+        if progress is not None:
+            progress['head_size'] = f.tell()
+    if progress is not None:
+        progress['end_time_positions'] = placeholder_positions
+
+    # 2. 逐条生成聊天内容主体HTML并立即写出 (HTML 分页站点的页面在聊天内容前后各有一个导航栏)
+    count = 0
+    last_ts = None
     last_date = None
     last_sender_key = None
+    is_first_fragment = resume['day_is_first'] if resume else True
+
+    def emit(fragment):
+        nonlocal is_first_fragment
+        if is_first_fragment:
+            is_first_fragment = False
+        else:
+            f.write('\n')
+        f.write(fragment)
     
     def close_open_tags():
         if last_sender_key is not None:
-            content_html_parts.append('</div></div>') 
+            emit('</div></div>') 
         if last_date is not None:
-            content_html_parts.append('</div></details>')
+            emit('</div></details>')
 
-    for row in rows:
-        ts, s_uid, p_uid, content = row
-        parts = decode_message_content(content, ts, profile_mgr, name_style, name_format, config['export_config'], config['is_timeline'])
-        if not parts: continue
+    site_nav = config.get('site_nav')
+    if site_nav: emit(site_nav)
+
+    record = first_record
+    while record is not None:
+        ts, s_uid, p_uid, parts = record
+        last_ts = ts
+        count += 1
         
-        dt_object = datetime.fromtimestamp(ts)
-        current_date = dt_object.strftime("%Y-%m-%d")
-        current_time = dt_object.strftime("%H:%M:%S")
+        current_date, current_time = _TIMESTAMP_FORMATTER.split(ts)
 
-        sender_display = profile_mgr.get_display_name(get_placeholder(s_uid), name_style, name_format)
+        s_uid = get_placeholder(s_uid)
+        sender_display = names.get(s_uid, s_uid)
         if sender_display == "N/A":
             sender_key = "[系统提示]"
         elif config['is_timeline']:
-            if get_placeholder(s_uid) == get_placeholder(p_uid): p_uid = profile_mgr.my_uid
-            receiver_display = profile_mgr.get_display_name(get_placeholder(p_uid), name_style, name_format)
+            p_uid = get_placeholder(p_uid)
+            if s_uid == p_uid: p_uid = profile_mgr.my_uid
+            receiver_display = names.get(p_uid, p_uid)
             sender_key = f"{sender_display} -> {receiver_display}"
         else:
             sender_key = sender_display
 
         if current_date != last_date:
             close_open_tags()
-            content_html_parts.append(f'<details class="date-block"><summary>{current_date}</summary><div class="chat-day-content">')
+            if progress is not None:
+                _mark_day_start(f, progress, current_date, count - 1)
+                progress['day_is_first'] = is_first_fragment
+            emit(f'<details class="date-block"><summary>{current_date}</summary><div class="chat-day-content">')
             last_date = current_date
             last_sender_key = None
         
         if sender_key != last_sender_key:
             if last_sender_key is not None:
-                content_html_parts.append('</div></div>')
+                emit('</div></div>')
             
             speaker_class = "is-self" if s_uid == profile_mgr.my_uid else "is-other"
             
             if sender_key == "[系统提示]":
-                content_html_parts.append('<div class="system-message-container"><div class="message-block">')
+                emit('<div class="system-message-container"><div class="message-block">')
             else:
-                content_html_parts.append(f'<div class="sender-message-group {speaker_class}">')
-                content_html_parts.append(f'<div class="sender">{safe_escape(sender_key)}</div>')
-                content_html_parts.append('<div class="message-block">')
+                emit(f'<div class="sender-message-group {speaker_class}">')
+                emit(f'<div class="sender">{safe_escape(sender_key)}</div>')
+                emit('<div class="message-block">')
             last_sender_key = sender_key
 
-        main_text_parts = []
-        quote_content = ""
-        is_reply = isinstance(parts[0], str) and parts[0].startswith('[引用->')
-
-        if not is_reply and isinstance(parts[0], dict) and parts[0].get("type") == "interactive_tip":
-            tip = parts[0]
-            actor = safe_escape(tip['actor'])
-            verb = safe_escape(tip['verb'])
-            target = safe_escape(tip['target'])
-            suffix = safe_escape(tip['suffix'])
-            main_text_parts.append(f"{actor} {verb} {target}{suffix}")
-        else:
-            for p in parts:
-                p_str = str(p)
-                match = re.search(r'\[引用->(.*)\]', p_str)
-                if match:
-                    quote_content = match.group(1)
-                else:
-                    main_text_parts.append(p_str)
-        
-        main_text = " ".join(main_text_parts)
-        if not is_reply:
-            MESSAGE_CONTENT_CACHE[ts] = main_text
+        main_text, quote = _split_parts(parts)
+        quote_content = _quote_summary(quote, config['is_timeline']) if quote is not None else ""
 
         escaped_main_text = safe_escape(main_text).replace('[%\\n%]', '<br>')
         
         if sender_key == "[系统提示]":
              if escaped_main_text.startswith('[') and escaped_main_text.endswith(']'):
                  escaped_main_text = escaped_main_text[1:-1]
-             content_html_parts.append(f'<div class="sys-message">{escaped_main_text}</div>')
+             emit(f'<div class="sys-message">{escaped_main_text}</div>')
         else:
-            content_html_parts.append(f'<div class="message-item"><span class="timestamp">{current_time}</span><span class="message-content">{escaped_main_text}</span></div>')
+            emit(f'<div class="message-item"><span class="timestamp">{current_time}</span><span class="message-content">{escaped_main_text}</span></div>')
 
         if quote_content:
             escaped_quote = safe_escape(quote_content).replace('[%\\n%]', '<br>')
-            content_html_parts.append(f'<div class="reply-container"><blockquote>{escaped_quote}</blockquote></div>')
+            emit(f'<div class="reply-container"><blockquote>{escaped_quote}</blockquote></div>')
+        record = yield
 
     close_open_tags()
-    
-    final_html = template_str.replace('{{file_header}}', header_html)
-    final_html = final_html.replace('{{chat_content}}', '\n'.join(content_html_parts))
+    if site_nav: emit(site_nav)
 
-    f.write(final_html)
-    return len(rows)
+    # 3. 写出模板后半部分，并回填文件头中的记录结束时间
+    f.write(template_suffix.replace('{{file_header}}', header_html))
+    if last_ts is not None:
+        _fill_placeholders(f, placeholder_positions, format_timestamp(last_ts), _END_TIME_PLACEHOLDER)
+    return count
 
-def process_and_write(output_path, rows, profile_mgr, config, scope_info):
-    """将查询到的数据库行处理并写入文件，支持txt、md、html三种格式。如果有效消息为0，则不创建文件。"""
-    export_format = config['export_config'].get('export_format', 'md')
-    count = 0
-    
-    # 预处理，检查是否有有效消息
-    valid_rows = [row for row in rows if decode_message_content(row[3], row[0], profile_mgr, config['name_style'], config['name_format'], config['export_config'], config.get('is_timeline', False))]
+def _iter_rows(cur, batch_size=_FETCH_BATCH_SIZE):
+    """按批次从游标中逐行取出查询结果，避免一次性将全部消息读入内存。"""
+    while True:
+        with profile_stage('query'):
+            batch = cur.fetchmany(batch_size)
+        if not batch: return
+        yield from batch
+
+def _quote_text(parts):
+    """从解码后的消息部分中提取供引用显示的原文，引用消息本身不作为原文 (返回 None)。"""
+    if not parts: return None
+    first = parts[0]
+    if isinstance(first, dict) and first.get("type") == "quote": return None
+    if isinstance(first, dict) and first.get("type") == "interactive_tip":
+        return _tip_text(first)
+    return " ".join(str(p) for p in parts if not isinstance(p, dict))
+
+def decode_rows(rows, profile_mgr, config):
+    """
+    【解码阶段】将数据库行逐条解码为消息记录 (ts, sender_uid, peer_uid, parts)，parts 为与格式无关的中间表示
+    (见 decode_message_content)，同一份记录可以交给任意格式的写入函数。
+    每条消息只解码一次，其结果同时用于有效性检查和各格式的写入函数，解码无结果的行直接丢弃。
+    这是一个生成器，行与记录都按需流动，内存占用与消息总数无关。
+    引用原文缓存随每次调用 (即每个输出文件) 新建，容量由配置项 quote_cache_size 决定。
+    config 中提供 quote_resolver (QuoteResolver) 时，缓存未命中的引用原文从数据库中按需查找并解码。
+    """
+    name_style = config.get('name_style', 'default')
+    name_format = config.get('name_format', '')
+    export_config = config['export_config']
+    quote_resolver = config.get('quote_resolver')
+
+    def load_quote(peer_uid, ts, sender_uid):
+        content = quote_resolver.fetch(peer_uid, ts, sender_uid)
+        if content is None: return None
+        return _quote_text(decode_message_content(content, ts, profile_mgr, name_style, name_format, export_config, None, peer_uid))
+
+    quote_cache = QuoteCache(export_config.get('quote_cache_size', _QUOTE_CACHE_SIZE), load_quote if quote_resolver else None)
+    if DECODE_CACHE is not None:
+        rows = DECODE_CACHE.prefetching(rows)
+
+    for ts, s_uid, p_uid, content in rows:
+        parts = decode_message_content(content, ts, profile_mgr, name_style, name_format, export_config, quote_cache, p_uid)
+        if not parts: continue
+
+        # 按消息顺序缓存非引用消息的原文，供其后的引用消息还原完整内容
+        quote_text = _quote_text(parts)
+        if quote_text is not None:
+            quote_cache.put(p_uid, ts, s_uid, quote_text)
+
+        yield (ts, s_uid, p_uid, parts)
+
+def _finish_writer(writer):
+    """向写入协程发送结束标记，返回其写入的消息数。"""
+    try:
+        writer.send(None)
+    except StopIteration as e:
+        return e.value
+    return 0
+
+def process_and_write(output_paths, rows, profile_mgr, config, scope_info, progress=None, resume=None):
+    """
+    将查询到的数据库行处理并写入文件，支持txt、md、html三种格式。如果有效消息为0，则不创建文件。
+    output_paths 为 {格式: 输出路径}。包含多个格式时仍只遍历、解码一遍，每条记录同时交给各格式的写入函数。
+    rows 可以是任意可迭代对象，行在解码后立即写出，不会整体驻留内存。
+    :param progress: 【增量导出】可选的字典，写入时记录最后一个日期块、首末消息时间等进度信息，
+                     各文件自己的进度 (日期块起始位置、文件头中结束时间的位置、大小、路径) 记录在 progress['files'][格式] 中。
+    :param resume: 【增量导出】上次导出时记录的进度。提供时不重建文件，而是将每个文件截断到最后一个日期块的起始位置、
+                   换上新生成的文件头后续写，此时 rows 应从该日期的0点开始。
+    """
+    # 解码阶段：每条消息只解码一次，取到第一条有效消息后才创建文件
+    records = decode_rows(rows, profile_mgr, config)
+    if PROFILER is not None:
+        records = PROFILER.timed(records, 'decode')
+    first_record = next(records, None)
     
-    if not valid_rows:
+    if first_record is None:
         return 0 # 没有有效消息，直接返回，不创建文件
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        if export_format == 'html':
-            count = _write_html(f, valid_rows, profile_mgr, config, scope_info)
+    time_range = [resume['first_ts'] if resume else first_record[0], None]
+    def track_end_time(records):
+        for record in records:
+            time_range[1] = record[0]
+            yield record
+    records = track_end_time(itertools.chain((first_record,), records))
+
+    file_progress = {fmt: ({} if progress is not None else None) for fmt in output_paths}
+    with ExitStack() as stack:
+        writers = []
+        text_files = [] # TXT/MD 文件头中结束时间占位符的位置 [(格式, 文件, 位置)]
+        text_header = None
+        for fmt, path in output_paths.items():
+            file_resume = {**resume, **resume['files'][fmt]} if resume else None
+            if file_resume:
+                # 丢弃上次的最后一个日期块 (HTML还包括模板后半部分) 并更新文件头，从该日期块开始重新生成
+                try:
+                    head = _file_head(fmt, config, (resume['first_ts'], None), scope_info)
+                except OSError:
+                    head = None # HTML模板无法读取，保留原有开头，由 _write_html 报告错误
+                file_resume.update(_refresh_file_head(path, head, file_resume))
+                if file_progress[fmt] is not None:
+                    file_progress[fmt]['head_size'] = file_resume['head_size']
+            f = stack.enter_context(open(path, "r+" if resume else "w", encoding="utf-8"))
+            if file_resume:
+                f.seek(file_resume['day_offset'])
+
+            if fmt == 'html':
+                writer = _write_html(f, profile_mgr, config, scope_info, file_progress[fmt], file_resume)
+            else:
+                if file_resume:
+                    placeholder_positions = file_resume['end_time_positions']
+                else:
+                    if text_header is None:
+                        text_header = _generate_text_header(config, (time_range[0], None), scope_info)
+                    placeholder_positions = _write_tracking_placeholder(f, text_header, _END_TIME_PLACEHOLDER)
+                    if file_progress[fmt] is not None:
+                        file_progress[fmt]['head_size'] = f.tell()
+                text_files.append((fmt, f, placeholder_positions))
+                write_func = _write_md if fmt == 'md' else _write_txt
+                writer = write_func(f, profile_mgr, config, file_progress[fmt])
+            next(writer)
+            if PROFILER is not None:
+                writer = PROFILER.timed_writer(writer, f"write_{fmt}")
+            writers.append(writer)
+
+        for record in records:
+            for writer in writers:
+                writer.send(record)
+        count = max(_finish_writer(writer) for writer in writers)
+
+        # 全部写完后回填文件头中的记录结束时间
+        for fmt, f, placeholder_positions in text_files:
+            _fill_placeholders(f, placeholder_positions, format_timestamp(time_range[1]), _END_TIME_PLACEHOLDER)
+            if progress is not None:
+                file_progress[fmt]['end_time_positions'] = placeholder_positions
+
+    if progress is not None:
+        for fmt, path in output_paths.items():
+            fp = file_progress[fmt]
+            # 各格式的日期块划分相同，日期与此前的消息数只保留一份
+            progress['day'] = fp.pop('day', progress.get('day'))
+            progress['day_start_count'] = fp.pop('day_start_count', progress.get('day_start_count'))
+            fp['size'] = os.path.getsize(path)
+            fp['path'] = os.path.relpath(path, OUTPUT_DIR)
+        progress['files'] = file_progress
+        progress['first_ts'], progress['last_ts'] = time_range
+    return count
+
+# --- HTML 分页站点导出 ---
+# 单个 HTML 文件在聊天记录很长时可达数百MB，手机浏览器难以打开。启用 html_site_split 后，HTML 格式导出为一个文件夹：
+# 每月 (或每约 N 条消息) 一个页面，另有目录页 index.html 列出各页的时间范围与消息数。
+# 各页面按自己的时间范围单独查询与生成，互不依赖，因此可以并行生成，增量导出时也只需重新生成有变化的页面。
+
+def plan_site_pages(db_con, peer_uids, start_ts, end_ts, split):
+    """
+    【分页规划】只读取时间戳与rowid (不读取消息内容)，按拆分方式划分页面，返回页面列表。
+    每个页面为 {'file', 'label', 'start_ts', 'end_ts', 'rows', 'rowid_sum'}，时间范围首尾相接且互不重叠；
+    同一秒内的消息不会被拆到两个页面。rows 与 rowid_sum 用于判断页面内容是否变化。
+    时间戳无效的消息无法归入任何页面，不会导出到分页站点中。
+    """
+    cur = db_con.cursor()
+    with profile_stage('query'):
+        cur.execute(*build_message_query(db_con, peer_uids, start_ts, end_ts, ts_only=True))
+    pages = []
+    page = None
+    for ts, rowid in _iter_rows(cur):
+        if not isinstance(ts, int) or ts <= 0: continue
+        if split == 'month':
+            key = format_timestamp(ts)[:7]
+            new_page = page is None or page['file'] != f"{key}.html"
         else:
-            header_content = _generate_text_header(config, valid_rows, scope_info)
-            if header_content:
-                f.write(header_content)
-            
-            if export_format == 'md':
-                count = _write_md(f, valid_rows, profile_mgr, config)
-            else: # 默认为 txt
-                count = _write_txt(f, valid_rows, profile_mgr, config)
-            
+            key = None
+            new_page = page is None or (page['rows'] >= split and ts != page['end_ts'])
+        if new_page:
+            file = f"{key}.html" if key else f"page-{len(pages) + 1:04d}.html"
+            page = {'file': file, 'label': key, 'start_ts': ts, 'end_ts': ts, 'rows': 0, 'rowid_sum': 0}
+            pages.append(page)
+        page['end_ts'] = ts
+        page['rows'] += 1
+        page['rowid_sum'] += rowid
+    for page in pages:
+        if page['label'] is None:
+            first, last = format_timestamp(page['start_ts'])[:10], format_timestamp(page['end_ts'])[:10]
+            page['label'] = first if first == last else f"{first} ~ {last}"
+    return pages
+
+def _site_nav_html(pages, i):
+    """分页站点中第 i 页的导航栏：目录、上一页、当前页、下一页。"""
+    links = [f'<a class="site-nav-index" href="{_SITE_INDEX_FILENAME}">目录</a>']
+    if i > 0:
+        links.append(f'<a class="site-nav-prev" href="{pages[i - 1]["file"]}">&laquo; {html.escape(pages[i - 1]["label"])}</a>')
+    links.append(f'<span class="site-nav-current">{html.escape(pages[i]["label"])}</span>')
+    if i < len(pages) - 1:
+        links.append(f'<a class="site-nav-next" href="{pages[i + 1]["file"]}">{html.escape(pages[i + 1]["label"])} &raquo;</a>')
+    return f'<nav class="site-nav">{" ".join(links)}</nav>'
+
+def _write_site_shell(path, config, content, header_html=""):
+    """用当前HTML模板写出一个不含聊天记录的页面 (目录页，或没有有效消息的分页)。"""
+    template_path = os.path.join(TEMPLATE_DIR_PATH, config['export_config'].get('html_template', 'default.html'))
+    template_prefix, template_suffix = _load_html_template(template_path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(template_prefix.replace('{{file_header}}', header_html))
+        f.write(content)
+        f.write(template_suffix.replace('{{file_header}}', header_html))
+
+def _render_site_page(db_con, config, scope_info, is_timeline, peer_uids, page, path, nav_html):
+    """生成分页站点中的一个页面 (只查询该页的时间范围)，返回有效消息数。"""
+    query, params = build_message_query(db_con, peer_uids, page['start_ts'], page['end_ts'])
+    cur = db_con.cursor()
+    with profile_stage('query'):
+        cur.execute(query, params)
+    process_config = config.copy()
+    process_config['is_timeline'] = is_timeline
+    process_config['quote_resolver'] = QuoteResolver(db_con)
+    process_config['site_nav'] = nav_html
+    count = process_and_write({'html': path}, _iter_rows(cur), config['profile_mgr'], process_config, scope_info)
+    if count == 0: # 仍然生成页面，保证相邻页面的导航链接有效
+        _write_site_shell(path, config, f'{nav_html}\n<p class="site-empty">本页没有可导出的有效消息。</p>\n{nav_html}')
+    return count
+
+def _export_site_page_worker(task):
+    """工作进程中生成一个分页，task 为 (会话UID或列表, 范围信息, 是否时间线, 页面, 路径, 导航栏)，返回有效消息数。"""
+    peer_uids, scope_info, is_timeline, page, path, nav_html = task
+    count = _render_site_page(_EXPORT_WORKER_STATE['con'], _EXPORT_WORKER_STATE['config'], scope_info, is_timeline, peer_uids, page, path, nav_html)
+    if DECODE_CACHE is not None:
+        try:
+            DECODE_CACHE.flush()
+        except sqlite3.Error:
+            pass
     return count
 
-def export_timeline(db_con, config, target_uids, scope_info):
-    """执行全局时间线导出。"""
+def _write_site_index(path, config, scope_info, pages):
+    """写出分页站点的目录页：各页的链接、时间范围与有效消息数。"""
+    header_html = _generate_html_header(config, (pages[0]['start_ts'], pages[-1]['end_ts']), scope_info)
+    total = sum(page['count'] for page in pages)
+    items = "\n".join(
+        f'<li><a href="{page["file"]}">{html.escape(page["label"])}</a> <span class="site-count">{page["count"]} 条</span> '
+        f'<span class="site-range">{format_timestamp(page["start_ts"])} ~ {format_timestamp(page["end_ts"])}</span></li>'
+        for page in pages)
+    _write_site_shell(path, config, f'<div class="site-index"><p>共 {len(pages)} 页，{total} 条消息。</p>\n<ol>\n{items}\n</ol></div>', header_html)
+
+def _page_key(pages, i):
+    """判断页面能否沿用上次结果的依据：页面本身的范围与内容摘要，以及导航栏 (相邻页面的文件名与标题)。"""
+    page = pages[i]
+    return [page['file'], page['start_ts'], page['end_ts'], page['rows'], page['rowid_sum'], _site_nav_html(pages, i)]
+
+def export_html_site(db_con, peer_uids, config, scope_info, site_dir, is_timeline, jobs=1, previous=None):
+    """
+    将聊天记录导出为 HTML 分页站点 (site_dir 文件夹)，返回 (有效消息数, 页数, 本次生成的页数, 站点记录)，没有消息时页数为0。
+    jobs > 1 时使用进程池并行生成各页面 (与并行导出好友相同，每个工作进程持有一个只读数据库连接)。
+    previous 为上次导出同一站点时返回的站点记录：设置未变时，范围、内容摘要与相邻页面都未变化的页面直接沿用，
+    不再查询与生成；无论设置是否变化，上次有而本次没有的页面文件都会被删除。
+    """
+    split = get_html_site_split(config['export_config'])
+    pages = plan_site_pages(db_con, peer_uids, config['start_ts'], config['end_ts'], split)
+    if not pages:
+        return 0, 0, 0, None
+
+    signature = _incremental_signature(config)
+    os.makedirs(site_dir, exist_ok=True)
+    reusable = {}
+    if previous:
+        current_files = {page['file'] for page in pages}
+        for entry in previous.get('pages', []):
+            stale_path = os.path.join(site_dir, entry['key'][0])
+            if entry['key'][0] not in current_files and os.path.isfile(stale_path):
+                os.remove(stale_path)
+        if previous.get('signature') == signature:
+            reusable = {tuple(entry['key']): entry['count'] for entry in previous.get('pages', [])}
+
+    tasks = []
+    for i, page in enumerate(pages):
+        key = tuple(_page_key(pages, i))
+        path = os.path.join(site_dir, page['file'])
+        if key in reusable and os.path.isfile(path):
+            page['count'] = reusable[key]
+        else:
+            tasks.append((i, (peer_uids, scope_info, is_timeline, page, path, _site_nav_html(pages, i))))
+
+    if jobs <= 1 or len(tasks) <= 1:
+        for i, task in tasks:
+            pages[i]['count'] = _render_site_page(db_con, config, task[1], task[2], task[0], task[3], task[4], task[5])
+    else:
+        if config['export_config'].get('add_file_header', False):
+            _calculate_sha256(DB_PATH)
+            _calculate_sha256(PROFILE_DB_PATH)
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), initializer=_init_export_worker,
+                                 initargs=(_path_globals(), FILE_HASH_CACHE, config, _index_attached(db_con), DECODE_CACHE is not None)) as executor:
+            for (i, _), count in zip(tasks, executor.map(_export_site_page_worker, [task for _, task in tasks])):
+                pages[i]['count'] = count
+
+    _write_site_index(os.path.join(site_dir, _SITE_INDEX_FILENAME), config, scope_info, pages)
+    record = {
+        'signature': signature, 'dir': os.path.relpath(site_dir, OUTPUT_DIR),
+        'pages': [{'key': _page_key(pages, i), 'count': page['count']} for i, page in enumerate(pages)],
+    }
+    return sum(page['count'] for page in pages), len(pages), len(tasks), record
+
+def export_timeline(db_con, config, target_uids, scope_info, jobs=1):
+    """
+    执行全局时间线导出，返回导出的有效消息数。
+    启用 HTML 分页站点时，HTML 格式导出为分页站点 (jobs > 1 时并行生成各页面)，其余格式照常导出为单个文件。
+    """
     print("\n正在执行“全局时间线”导出...")
     start_ts, end_ts, name_style, name_format, profile_mgr, run_timestamp, export_config = config.values()
-    
-    query = f"SELECT `{COL_TIMESTAMP}`, `{COL_SENDER_UID}`, `{COL_PEER_UID}`, `{COL_MSG_CONTENT}` FROM {TABLE_NAME}"
-    clauses = []
-    params = []
+    count = _export_timeline_files(db_con, config, target_uids, scope_info) if _file_formats(export_config) else 0
 
-    if target_uids:
-        placeholders = ', '.join('?' for _ in target_uids)
-        clauses.append(f"`{COL_PEER_UID}` IN ({placeholders})")
-        params.extend(target_uids)
+    if get_html_site_split(export_config) is not None and 'html' in get_export_formats(export_config):
+        site_dir = os.path.join(OUTPUT_DIR, "Timeline", f"{_TIMELINE_FILENAME_BASE}{run_timestamp}{_SITE_DIR_SUFFIX}")
+        site_count, page_count, _, _ = export_html_site(db_con, list(target_uids or []), config, scope_info, site_dir, True, jobs)
+        if page_count:
+            print(f"\nHTML 分页站点已生成：共 {page_count} 页，{site_count} 条有效消息，目录页 {os.path.join(site_dir, _SITE_INDEX_FILENAME)}")
+        else:
+            print("\nHTML 分页站点：指定范围内没有聊天记录。")
+        count = max(count, site_count)
+    return count
 
-    if start_ts:
-        clauses.append(f"`{COL_TIMESTAMP}` >= ?")
-        params.append(start_ts)
-    if end_ts:
-        clauses.append(f"`{COL_TIMESTAMP}` <= ?")
-        params.append(end_ts)
-        
-    if clauses:
-        query += f" WHERE {' AND '.join(clauses)}"
+def _export_timeline_files(db_con, config, target_uids, scope_info):
+    """全局时间线导出为单个文件的部分 (各格式共用一次查询与解码)，返回导出的有效消息数。"""
+    start_ts, end_ts, name_style, name_format, profile_mgr, run_timestamp, export_config = config.values()
     
-    query += f" ORDER BY `{COL_TIMESTAMP}` ASC"
+    query, params = build_message_query(db_con, list(target_uids or []), start_ts, end_ts)
     
     cur = db_con.cursor()
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    if not rows:
+    with profile_stage('query'):
+        cur.execute(query, params)
+    rows = _iter_rows(cur)
+    first_row = next(rows, None)
+    if first_row is None:
         print("查询完成，但未能获取任何记录。")
-        return
+        return 0
+    rows = itertools.chain((first_row,), rows)
         
-    ext = f".{export_config.get('export_format', 'md')}"
     timeline_dir = os.path.join(OUTPUT_DIR, "Timeline")
     os.makedirs(timeline_dir, exist_ok=True)
-    filename = f"{_TIMELINE_FILENAME_BASE}{run_timestamp}{ext}"
-    path = os.path.join(timeline_dir, filename)
+    paths = {fmt: os.path.join(timeline_dir, f"{_TIMELINE_FILENAME_BASE}{run_timestamp}.{fmt}") for fmt in _file_formats(export_config)}
     
     process_config = config.copy()
     process_config['is_timeline'] = True
-    count = process_and_write(path, rows, profile_mgr, process_config, scope_info)
+    process_config['quote_resolver'] = QuoteResolver(db_con)
+    count = process_and_write(paths, rows, profile_mgr, process_config, scope_info)
     if count > 0:
-        print(f"\n处理完成！共导出 {count} 条有效消息到 {path}")
+        print(f"\n处理完成！共导出 {count} 条有效消息到 {', '.join(paths.values())}")
     else:
         print("\n处理完成，但在指定范围内未发现可导出的有效消息。")
+    return count
+
+def _incremental_signature(config):
+    """【增量导出】生成影响输出内容的设置签名，设置变化后旧文件不能续写，需要重新完整导出。"""
+    return json.dumps({
+        'start_ts': config['start_ts'], 'name_style': config['name_style'], 'name_format': config['name_format'],
+        'export_config': config['export_config']
+    }, sort_keys=True, ensure_ascii=False)
+
+def _incremental_key(out_dir, uid):
+    """【增量导出】进度记录的键：输出目录 (相对输出根目录) + 好友UID。"""
+    return os.path.join(os.path.relpath(out_dir, OUTPUT_DIR), uid)
+
+def load_incremental_state():
+    """从输出根目录加载增量导出进度记录，文件不存在或损坏时返回空字典。"""
+    state_path = os.path.join(OUTPUT_DIR, _INCREMENTAL_STATE_FILENAME)
+    try:
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+                if isinstance(state, dict):
+                    return state
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"警告：读取增量导出记录失败，将完整导出。错误：{e}")
+    return {}
+
+def save_incremental_state(state):
+    """将增量导出进度记录写回输出根目录。"""
+    state_path = os.path.join(OUTPUT_DIR, _INCREMENTAL_STATE_FILENAME)
+    try:
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=4, ensure_ascii=False)
+    except IOError as e:
+        print(f"警告: 无法写入增量导出记录文件。错误: {e}")
 
 def export_one_on_one(db_con, friend_uid, config, scope_info, out_dir=None, index=None, total=None):
-    """导出一个好友的一对一聊天记录。"""
-    start_ts, end_ts, name_style, name_format, profile_mgr, run_timestamp, export_config = config.values()
-    
+    """导出一个好友的一对一聊天记录，返回导出的有效消息数。"""
+    log_line, count, _, _ = _export_one_on_one(db_con, friend_uid, config, scope_info, out_dir, index, total)
+    print(log_line)
+    return count
+
+def _friend_log_prefix(profile_mgr, friend_uid, index, total):
+    """单独文件导出时每个好友的进度日志前缀 "(序号/总数) 昵称 (备注-xx)"。"""
     friend_info = profile_mgr.all_users.get(friend_uid, {})
     friend_nickname = friend_info.get('nickname', friend_uid)
     friend_remark = friend_info.get('remark', '')
     friend_display_name = f"{friend_nickname or friend_uid}{f' (备注-{friend_remark})' if friend_remark else ''}"
-    
-    log_prefix = f"    ({index}/{total}) {friend_display_name}"
-    
-    query = f"SELECT `{COL_TIMESTAMP}`, `{COL_SENDER_UID}`, `{COL_PEER_UID}`, `{COL_MSG_CONTENT}` FROM {TABLE_NAME}"
-    clauses = [f"`{COL_PEER_UID}` = ?"]
-    params = [friend_uid]
+    return f"    ({index}/{total}) {friend_display_name}"
 
-    if start_ts:
-        clauses.append(f"`{COL_TIMESTAMP}` >= ?")
-        params.append(start_ts)
-    if end_ts:
-        clauses.append(f"`{COL_TIMESTAMP}` <= ?")
-        params.append(end_ts)
-    query += f" WHERE {' AND '.join(clauses)} ORDER BY `{COL_TIMESTAMP}` ASC"
+def _export_one_on_one(db_con, friend_uid, config, scope_info, out_dir=None, index=None, total=None, incremental=None, rows=None, site_jobs=1):
+    """
+    导出一个好友的一对一聊天记录，返回 (进度日志, 有效消息数, 增量导出记录, 生成或更新的文件数)，日志由调用方按顺序打印。
+    单个文件的各格式由 _export_one_on_one_files 导出；启用 HTML 分页站点时 HTML 格式另行导出为分页站点
+    (site_jobs > 1 时并行生成各页面)，其记录保存在增量导出记录的 'site' 中，增量导出时沿用同一个站点文件夹，
+    只重新生成有变化的页面。有页面重新生成的站点计为一个文件。
+    """
+    export_config = config['export_config']
+    if get_html_site_split(export_config) is None or 'html' not in get_export_formats(export_config):
+        log_line, count, entry = _export_one_on_one_files(db_con, friend_uid, config, scope_info, out_dir, index, total, incremental, rows)
+        return log_line, count, entry, len(_file_formats(export_config)) if count > 0 else 0
+
+    log_lines, count, entry, files = [], 0, None, 0
+    if _file_formats(export_config):
+        log_line, count, entry = _export_one_on_one_files(db_con, friend_uid, config, scope_info, out_dir, index, total, incremental, rows)
+        log_lines.append(log_line)
+        files = len(_file_formats(export_config)) if count > 0 else 0
+
+    profile_mgr = config['profile_mgr']
+    previous = incremental.get('site') if incremental else None
+    if previous and os.path.isdir(os.path.join(OUTPUT_DIR, previous.get('dir', ''))):
+        site_dir = os.path.join(OUTPUT_DIR, previous['dir'])
+    else:
+        previous = None
+        html_name = profile_mgr.get_filename(friend_uid, config['run_timestamp'], 'html')
+        site_dir = os.path.join(out_dir or os.path.join(OUTPUT_DIR, "Individual"), os.path.splitext(html_name)[0] + _SITE_DIR_SUFFIX)
+    site_count, page_count, rendered, record = export_html_site(db_con, friend_uid, config, scope_info, site_dir, False, site_jobs, previous)
+
+    log_prefix = _friend_log_prefix(profile_mgr, friend_uid, index, total)
+    if not page_count:
+        log_lines.append(f"{log_prefix}... -> 指定时间内无聊天记录 (HTML 分页站点)。")
+    elif previous and rendered == 0:
+        log_lines.append(f"{log_prefix}... -> HTML 分页站点没有变化 (共 {page_count} 页)。")
+    else:
+        log_lines.append(f"{log_prefix}... -> HTML 分页站点共 {page_count} 页 (本次生成 {rendered} 页)，{site_count} 条消息，目录 \"{os.path.basename(site_dir)}\"")
+    if rendered:
+        files += 1
+    if not _file_formats(export_config):
+        # 只有分页站点时，沿用上次的站点 (设置未变) 的新增消息数按站点的消息总数之差计算，否则整个站点都是新导出的
+        if previous and previous.get('signature') == _incremental_signature(config):
+            count = site_count - sum(page['count'] for page in previous['pages'])
+        else:
+            count = site_count
+    if incremental is not None and record is not None:
+        entry = {**(entry or {}), 'site': record}
+    return "\n".join(log_lines), count, entry, files
+
+def _export_one_on_one_files(db_con, friend_uid, config, scope_info, out_dir=None, index=None, total=None, incremental=None, rows=None):
+    """
+    导出一个好友的一对一聊天记录 (单个文件的各格式)，返回 (进度日志行, 有效消息数, 增量导出记录)，日志由调用方按顺序打印。
+    rows 为【单次扫描】中已切分出的该好友的消息行，提供时不再单独查询 (不能与 incremental 同时使用)。
+    incremental 为该好友上次的增量导出记录 (没有记录时为空字典)，为 None 时执行普通导出且不返回记录。
+    记录有效且输出文件未被改动时，只查询最后一个已导出日期及之后的消息，截断该日期块并更新文件头后续写，
+    返回的有效消息数为新增的消息数。上次结束时间之后有消息、或结束时间那一秒内的源rowid有变化时才视为有新消息。
+    """
+    start_ts, end_ts, name_style, name_format, profile_mgr, run_timestamp, export_config = config.values()
     
-    cur = db_con.cursor()
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    if not rows:
-        print(f"{log_prefix}... -> 指定时间内无聊天记录。")
-        return
-
-    output_dir = out_dir or os.path.join(OUTPUT_DIR, "Individual")
-    os.makedirs(output_dir, exist_ok=True)
-    filename = profile_mgr.get_filename(friend_uid, run_timestamp, export_config.get('export_format', 'md'))
-    path = os.path.join(output_dir, filename)
+    log_prefix = _friend_log_prefix(profile_mgr, friend_uid, index, total)
+
+    formats = _file_formats(export_config)
+
+    # 增量导出：检查上次的记录能否续写 (设置未变，且每个格式的文件都未被改动)
+    resume = None
+    if incremental and incremental.get('signature') == _incremental_signature(config):
+        prev_files = incremental.get('files')
+        if isinstance(prev_files, dict) and set(prev_files) == set(formats) and all(
+                'day_offset' in entry and 'head_size' in entry and os.path.isfile(os.path.join(OUTPUT_DIR, entry.get('path', '')))
+                and os.path.getsize(os.path.join(OUTPUT_DIR, entry.get('path', ''))) == entry.get('size')
+                for entry in prev_files.values()):
+            resume = incremental
+    
+    if resume:
+        cur = db_con.cursor()
+        cur.execute(*build_message_query(db_con, friend_uid, end_ts=end_ts, after_ts=resume['last_ts'], probe=True))
+        if cur.fetchone() is None and _rowids_at(db_con, friend_uid, resume['last_ts']) == resume.get('last_rowids'):
+            return f"{log_prefix}... -> 没有新消息。", 0, resume
+        # 从最后一个已导出日期的0点开始重新查询，该日期块将被重新生成
+        day_start_ts = int(datetime.strptime(resume['day'], "%Y-%m-%d").timestamp())
+        start_ts = max(day_start_ts, start_ts or 0)
+
+    if rows is None:
+        query, params = build_message_query(db_con, friend_uid, start_ts, end_ts)
+        cur = db_con.cursor()
+        with profile_stage('query'):
+            cur.execute(query, params)
+        rows = _iter_rows(cur)
+    first_row = next(rows, None)
+    if first_row is None:
+        return f"{log_prefix}... -> 指定时间内无聊天记录。", 0, incremental or None
+    rows = itertools.chain((first_row,), rows)
+
+    if resume:
+        paths = {fmt: os.path.join(OUTPUT_DIR, resume['files'][fmt]['path']) for fmt in formats}
+    else:
+        output_dir = out_dir or os.path.join(OUTPUT_DIR, "Individual")
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {fmt: os.path.join(output_dir, profile_mgr.get_filename(friend_uid, run_timestamp, fmt)) for fmt in formats}
+    filenames = ", ".join(f'"{os.path.basename(path)}"' for path in paths.values())
         
     process_config = config.copy()
     process_config['is_timeline'] = False
-    count = process_and_write(path, rows, profile_mgr, process_config, scope_info)
+    process_config['quote_resolver'] = QuoteResolver(db_con)
+    progress = {} if incremental is not None else None
+    count = process_and_write(paths, rows, profile_mgr, process_config, scope_info, progress, resume)
+
+    if resume:
+        if count == 0:
+            return f"{log_prefix}... -> 没有新消息。", 0, resume
+        # 本次写入的消息数从截断位置算起，换算为整个文件的累计值
+        total_count = resume['day_start_count'] + count
+        progress['day_start_count'] += resume['day_start_count']
+        new_count = total_count - resume['count']
+        progress.update(signature=resume['signature'], count=total_count, last_rowids=_rowids_at(db_con, friend_uid, progress['last_ts']))
+        return f"{log_prefix}... -> 新增 {new_count} 条消息到 {filenames}", new_count, progress
+
+    if progress is not None and count > 0:
+        progress.update(signature=_incremental_signature(config), count=count, last_rowids=_rowids_at(db_con, friend_uid, progress['last_ts']))
+    else:
+        progress = incremental or None
     
     if count > 0:
-        print(f"{log_prefix}... -> 共导出 {count} 条消息到 \"{filename}\"")
-    else:
-        print(f"{log_prefix}... -> 指定时间内无有效消息可导出。")
+        return f"{log_prefix}... -> 共导出 {count} 条消息到 {filenames}", count, progress
+    return f"{log_prefix}... -> 指定时间内无有效消息可导出。", count, progress
+
+def _path_globals():
+    """工作进程需要同步的路径变量。"""
+    return {
+        'DB_PATH': DB_PATH, 'PROFILE_DB_PATH': PROFILE_DB_PATH, 'OUTPUT_DIR': OUTPUT_DIR,
+        'CONFIG_PATH': CONFIG_PATH, 'TEMPLATE_DIR_PATH': TEMPLATE_DIR_PATH,
+        'NON_FRIENDS_CACHE_PATH': NON_FRIENDS_CACHE_PATH, 'HASH_CACHE_PATH': HASH_CACHE_PATH,
+        'INDEX_DB_PATH': INDEX_DB_PATH, 'DECODE_CACHE_PATH': DECODE_CACHE_PATH
+    }
+
+def _init_export_worker(path_globals, hash_cache, config, use_index, use_decode_cache):
+    """
+    进程池工作进程初始化：同步路径与哈希缓存，并为本进程打开一个只读数据库连接 (按需附加辅助索引数据库)。
+    主进程已启用消息解码缓存时，工作进程各自打开同一个缓存文件 (主进程已完成有效性检查)。
+    """
+    global FILE_HASH_CACHE, DECODE_CACHE
+    globals().update(path_globals)
+    FILE_HASH_CACHE = hash_cache
+    _EXPORT_WORKER_STATE['con'] = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    if use_index:
+        attach_index_db(_EXPORT_WORKER_STATE['con'])
+    if use_decode_cache:
+        try:
+            DECODE_CACHE = DecodeCache(DECODE_CACHE_PATH, validate=False)
+        except sqlite3.Error:
+            DECODE_CACHE = None
+    _EXPORT_WORKER_STATE['config'] = config
+
+def _export_one_on_one_worker(task):
+    """工作进程中导出单个好友，task 为 (uid, 输出目录, 序号, 总数, 增量导出记录)，返回值同 _export_one_on_one。"""
+    uid, out_dir, index, total, incremental = task
+    individual_scope_info = {'type': 'individual', 'friend_uid': uid}
+    result = _export_one_on_one(_EXPORT_WORKER_STATE['con'], uid, _EXPORT_WORKER_STATE['config'], individual_scope_info, out_dir, index, total, incremental)
+    if DECODE_CACHE is not None:
+        # 工作进程退出时没有清理时机，每个好友导出完成后即写回新的解码结果
+        try:
+            DECODE_CACHE.flush()
+        except sqlite3.Error:
+            pass
+    return result
+
+def export_individuals(db_con, tasks, config, jobs=1, incremental_state=None):
+    """
+    依次导出多个好友的单独文件。
+    tasks 为 (uid, 输出目录, 标题) 列表，标题非空时在该好友的进度日志之前打印。
+    串行导出多个好友时只执行一次按 (好友, 时间) 排序的查询，消息行按好友依次交给各自的写入流程，
+    每个好友的文件在其消息读完时即关闭；增量导出仍逐个好友查询 (各自的起始时间不同)。
+    jobs > 1 时使用进程池并行导出，每个工作进程各自持有一个只读数据库连接，进度日志仍按原顺序输出。
+    incremental_state 不为 None 时执行增量导出，并就地更新其中各好友的进度记录。
+    返回 (按 tasks 顺序排列的各好友有效消息数列表, 生成或更新的文件总数)。
+    """
+    total = len(tasks)
+    counts = []
+    files = [0]
+
+    def task_entry(uid, out_dir):
+        if incremental_state is None: return None
+        return incremental_state.get(_incremental_key(out_dir, uid), {})
+
+    def collect(uid, out_dir, banner, result):
+        log_line, count, entry, file_count = result
+        if banner: print(banner)
+        print(log_line)
+        counts.append(count)
+        files[0] += file_count
+        if incremental_state is not None and entry:
+            incremental_state[_incremental_key(out_dir, uid)] = entry
+
+    if jobs <= 1 or total <= 1:
+        peer_runs = None
+        if incremental_state is None and total > 1 and _file_formats(config['export_config']):
+            peer_runs = iter_peer_runs(db_con, [uid for uid, _, _ in tasks], config['start_ts'], config['end_ts'])
+        for index, (uid, out_dir, banner) in enumerate(tasks, 1):
+            individual_scope_info = {'type': 'individual', 'friend_uid': uid}
+            if banner: print(banner)
+            rows = next(peer_runs)[1] if peer_runs else None
+            result = _export_one_on_one(db_con, uid, config, individual_scope_info, out_dir, index, total, task_entry(uid, out_dir), rows, jobs)
+            collect(uid, out_dir, None, result)
+        return counts, files[0]
+
+    # 文件头所需的数据库哈希在主进程中先行算好，工作进程直接复用
+    if config['export_config'].get('add_file_header', False):
+        _calculate_sha256(DB_PATH)
+        _calculate_sha256(PROFILE_DB_PATH)
+
+    worker_tasks = [(uid, out_dir, index, total, task_entry(uid, out_dir)) for index, (uid, out_dir, _) in enumerate(tasks, 1)]
+    with ProcessPoolExecutor(max_workers=min(jobs, total), initializer=_init_export_worker,
+                             initargs=(_path_globals(), FILE_HASH_CACHE, config, _index_attached(db_con), DECODE_CACHE is not None)) as executor:
+        # executor.map 按提交顺序返回结果，保证日志顺序与串行导出一致
+        for (uid, out_dir, banner), result in zip(tasks, executor.map(_export_one_on_one_worker, worker_tasks)):
+            collect(uid, out_dir, banner, result)
+    return counts, files[0]
 
 
 def export_user_list(profile_mgr, list_mode, timestamp_str):
@@ -1645,36 +3362,358 @@ def export_user_list(profile_mgr, list_mode, timestamp_str):
             count += 1
     
     print(f"\n处理完成！共导出 {count} 位用户的信息到 {output_path}")
+    return count
+
+_MODE_TITLES = {
+    1: "导出合并的时间线单文件 > 全部好友", 2: "导出合并的时间线单文件 > 选择分组", 3: "导出合并的时间线单文件 > 选择好友",
+    4: "导出每个好友单独的文件 > 全部好友", 5: "导出每个好友单独的文件 > 选择分组", 6: "导出每个好友单独的文件 > 选择好友",
+    7: "导出用户信息列表", 8: "[设置]"
+}
+
+def resolve_targets(mode, selection, profile_mgr, config_mgr):
+    """
+    根据导出模式与选择结果计算目标UID列表和范围信息。
+    selection 在分组模式下为分组ID或 'all_groups'，在选择好友模式下为UID列表，其余模式忽略。
+    """
+    target_uids = []
+    scope_info = {}
+    if mode == 1 or mode == 4:
+        target_uids = list(profile_mgr.friend_uids)
+        if config_mgr.config.get('export_non_friends'):
+            target_uids.extend(profile_mgr.non_friend_uids)
+        scope_info = {'type': 'timeline', 'selection_mode': 'all_friends'}
+    elif mode == 2 or mode == 5:
+        if selection == 'all_groups':
+            target_uids = list(profile_mgr.friend_uids)
+            if config_mgr.config.get('export_non_friends', True):
+                 target_uids.extend(profile_mgr.non_friend_uids)
+            if mode == 5: target_uids = 'all_groups_structured'
+            scope_info = {'type': 'timeline', 'selection_mode': 'all_groups'}
+        else:
+            if selection == -2: # 非好友
+                target_uids = profile_mgr.non_friend_uids
+            else: # 普通分组
+                target_uids = [uid for uid, info in profile_mgr.all_users.items() if info.get('group_id') == selection and info.get('is_friend')]
+            scope_info = {'type': 'timeline', 'selection_mode': 'group', 'details': {'gid': selection, 'count': len(target_uids)}}
+    elif mode == 3 or mode == 6:
+        target_uids = selection
+        scope_info = {'type': 'timeline', 'selection_mode': 'selected_friends', 'details': {'uids': target_uids}}
+    return target_uids, scope_info
+
+def run_export(mode, target_uids, selection, scope_info, config, config_mgr, workdir, jobs=1, incremental=False, profiler=None):
+    """
+    执行一次聊天记录导出 (模式1-6)。
+    incremental 为 True 时，单独文件模式只导出上次运行之后的新消息并续写到原文件 (时间线模式不受影响)。
+    profiler (StageProfiler) 不为 None 时对本次导出分阶段计时，结束后打印分析摘要并将JSON报告保存到输出根目录。
+    返回结果字典 {'files': 生成或更新的文件数, 'messages': 导出的有效消息数, 'error': 错误信息或None,
+                 'profile_report': 分析报告路径或None}。
+    """
+    global PROFILER
+    profile_mgr = config['profile_mgr']
+    result = {'files': 0, 'messages': 0, 'error': None, 'profile_report': None}
+    incremental_state = load_incremental_state() if incremental and mode in [4, 5, 6] else None
+    if profiler is not None:
+        PROFILER = profiler
+        profiler.start()
+    try:
+        with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as con:
+            with profile_stage('index_build'):
+                index_ready = config_mgr.config.get('use_index_db', True) and ensure_index_db()
+            if index_ready:
+                attach_index_db(con)
+            if config_mgr.config.get('use_decode_cache', True):
+                open_decode_cache()
+            if mode in [1, 2, 3]:
+                count = export_timeline(con, config, target_uids, scope_info, jobs)
+                counts = [count]
+                files = len(get_export_formats(config['export_config'])) if count > 0 else 0
+            else: # 单独文件模式
+                if target_uids == 'all_groups_structured':
+                    print("\n即将按分组结构导出所有好友...")
+                    groups_data = {}
+                    # 处理好友
+                    for uid in profile_mgr.friend_uids:
+                        gid = profile_mgr.all_users.get(uid, {}).get('group_id', -1)
+                        if gid not in groups_data:
+                            g_name = profile_mgr.group_info.get(gid, f"分组{gid}")
+                            safe_g_name = re.sub(r'[\\/*?:"<>|]', "_", f"{gid}_{g_name}")
+                            g_dir = os.path.join(OUTPUT_DIR, "Individual", "Friends", safe_g_name)
+                            groups_data[gid] = {'dir': g_dir, 'users': []}
+                        groups_data[gid]['users'].append(uid)
+                    
+                    # 处理非好友
+                    if config_mgr.config.get('export_non_friends', True):
+                        non_friend_gid = -2
+                        non_friend_dir = os.path.join(OUTPUT_DIR, "Individual", "Friends", "_非好友_")
+                        groups_data[non_friend_gid] = {'dir': non_friend_dir, 'users': profile_mgr.non_friend_uids}
+
+                    tasks = []
+                    pending_banners = [] # 空分组的标题顺延到下一个好友之前打印
+                    sorted_gids = sorted(groups_data.keys())
+                    for gid in sorted_gids:
+                        group_info_struct = groups_data[gid]
+                        pending_banners.append(f"\n以下文件导出到 \"{os.path.relpath(group_info_struct['dir'], workdir)}\"")
+                        for user_uid in group_info_struct['users']:
+                            tasks.append((user_uid, group_info_struct['dir'], "\n".join(pending_banners)))
+                            pending_banners = []
+                    
+                    counts, files = export_individuals(con, tasks, config, jobs, incremental_state)
+                    for banner in pending_banners: print(banner)
+                else:
+                    output_dir = os.path.join(OUTPUT_DIR, "Individual")
+                    if mode == 5:
+                         if selection == -2: #非好友
+                             name = "_非好友_"
+                             output_dir = os.path.join(output_dir, "Friends", name)
+                         else: # 普通分组
+                             name = profile_mgr.group_info.get(selection, f"分组{selection}")
+                             safe_name = re.sub(r'[\\/*?:"<>|]', "_", f"{selection}_{name}")
+                             output_dir = os.path.join(output_dir, "Friends", safe_name)
+                    
+                    print(f"\n以下文件将导出到 \"{os.path.relpath(output_dir, workdir)}\"")
+                    counts, files = export_individuals(con, [(uid, output_dir, None) for uid in target_uids], config, jobs, incremental_state)
+
+            result['files'] = files
+            result['messages'] = sum(counts)
+
+    except sqlite3.Error as e:
+        print(f"\n数据库错误: {e}")
+        result['error'] = f"数据库错误: {e}"
+    except Exception as e:
+        print(f"\n发生未知错误: {e}")
+        import traceback
+        traceback.print_exc()
+        result['error'] = f"发生未知错误: {e}"
+    finally:
+        close_decode_cache()
+        if incremental_state is not None:
+            save_incremental_state(incremental_state)
+        if profiler is not None:
+            profiler.stop()
+            PROFILER = None
+            result['profile_report'] = _save_profile_report(profiler, result['messages'], config['run_timestamp'])
+    return result
+
+def _save_profile_report(profiler, messages, run_timestamp):
+    """【性能分析】打印分析摘要，并将JSON报告保存到输出根目录，返回报告路径 (保存失败时为 None)。"""
+    report = profiler.report(messages)
+    profiler.print_summary(report)
+    report_path = os.path.join(OUTPUT_DIR, f"profile_report{run_timestamp}.json")
+    try:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    except IOError as e:
+        print(f"警告: 无法写入性能分析报告。错误: {e}")
+        return None
+    print(f"性能分析报告已保存到: {report_path}")
+    return report_path
+
+def _resolve_uid_args(values, profile_mgr):
+    """将命令行给出的UID或QQ号解析为UID列表 (去重并保持顺序)，返回 (UID列表, 无法识别的输入列表)。"""
+    qq_to_uid = {str(info.get('qq')): uid for uid, info in profile_mgr.all_users.items() if info.get('qq')}
+    uids, unknown = [], []
+    for value in values:
+        for item in re.split(r'[\s,]+', value.strip()):
+            if not item: continue
+            uid = item if item in profile_mgr.all_users else qq_to_uid.get(item)
+            if uid is None:
+                unknown.append(item)
+            elif uid not in uids:
+                uids.append(uid)
+    return uids, unknown
+
+def _parse_time_arg(value, is_end=False):
+    """解析 --start/--end 参数为时间戳，格式与交互模式相同，无法识别时抛出 ValueError。"""
+    if not value: return None
+    parts = _parse_time_string(value)
+    if not parts:
+        raise ValueError(f"时间格式无法识别: '{value}'")
+    try:
+        return int(_build_datetime(parts, is_end).timestamp())
+    except ValueError:
+        raise ValueError(f"时间值无效: '{value}'")
+
+def run_batch(args, profile_mgr, config_mgr, workdir, jobs, load_error=None):
+    """
+    【非交互模式】按命令行参数完成一次导出，全程不出现菜单与输入提示。
+    结束时在最后一行打印JSON格式的运行摘要 (并可写入 --summary 指定的文件)，返回进程退出码 (成功为0，失败为1)。
+    load_error 为初始化 (加载身份数据库) 时的错误，非空时不再导出，直接按失败写出摘要。
+    """
+    started = time.time()
+    mode = args.mode
+    summary = {'status': 'ok', 'mode': mode, 'mode_title': _MODE_TITLES.get(mode), 'incremental': args.incremental, 'files': 0, 'messages': 0}
+
+    def finish(error=None):
+        if error:
+            print(f"\n错误: {error}")
+            summary['status'] = 'error'
+            summary['error'] = error
+        summary['elapsed_seconds'] = round(time.time() - started, 3)
+        summary_line = json.dumps(summary, ensure_ascii=False)
+        print(summary_line)
+        if args.summary:
+            try:
+                with open(args.summary, 'w', encoding='utf-8') as f:
+                    f.write(summary_line + "\n")
+            except IOError as e:
+                print(f"警告: 无法写入运行摘要文件。错误: {e}")
+        return 1 if error else 0
+
+    if load_error:
+        return finish(load_error)
+
+    # 1. 应用命令行中的导出设置 (仅对本次运行生效，不写回配置文件)
+    cfg = config_mgr.config
+    if args.format: cfg['export_format'] = args.format[0] if len(args.format) == 1 else list(dict.fromkeys(args.format))
+    if args.template:
+        if not os.path.isfile(os.path.join(TEMPLATE_DIR_PATH, args.template)):
+            return finish(f"HTML模板文件 '{args.template}' 未在 '{TEMPLATE_DIR_PATH}' 文件夹中找到。")
+        cfg['html_template'] = args.template
+    if args.html_split is not None:
+        value = args.html_split.strip().lower()
+        if value in ('off', '0', ''):
+            cfg['html_site_split'] = ''
+        elif value == 'month' or get_html_site_split({'html_site_split': value}) is not None:
+            cfg['html_site_split'] = value if value == 'month' else int(value)
+        else:
+            return finish(f"无效的 HTML 分页方式: '{args.html_split}' (可选 off、month 或每页的消息数)。")
+    if args.name_style: cfg['name_style'] = args.name_style
+    if args.name_format is not None: cfg['name_format'] = args.name_format
+    if cfg.get('name_style') == 'custom' and not cfg.get('name_format'):
+        return finish("名称风格为 custom 时需要通过 --name-format 指定自定义格式。")
+
+    summary['format'] = cfg.get('export_format', 'md')
+    summary['output_dir'] = os.path.abspath(OUTPUT_DIR)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    run_timestamp = f"_{int(datetime.now().timestamp())}"
+
+    if mode == 7: # 导出用户信息列表
+        list_mode = 2 if args.list_mode == 'all' else 1
+        summary['users'] = export_user_list(profile_mgr, list_mode, run_timestamp)
+        summary['files'] = 1
+        return finish()
+
+    # 2. 解析导出范围
+    selection = None
+    if mode in [2, 5]:
+        if args.group is None:
+            return finish("模式 2/5 需要通过 --group 指定分组 (分组ID，-2 表示非好友，all 表示全部分组)。")
+        if args.group.lower() == 'all':
+            selection = 'all_groups'
+        else:
+            try:
+                selection = int(args.group)
+            except ValueError:
+                return finish(f"无效的分组: '{args.group}'")
+            if selection != -2 and selection not in profile_mgr.group_info:
+                return finish(f"分组ID {selection} 不存在。")
+    elif mode in [3, 6]:
+        if not args.uids:
+            return finish("模式 3/6 需要通过 --uids 指定好友 (UID或QQ号)。")
+        selection, unknown = _resolve_uid_args(args.uids, profile_mgr)
+        if unknown:
+            return finish(f"未找到以下用户: {', '.join(unknown)}")
+
+    target_uids, scope_info = resolve_targets(mode, selection, profile_mgr, config_mgr)
+    if not target_uids and target_uids != 'all_groups_structured':
+        return finish("未选择任何用户或分组内无用户。")
+
+    # 3. 解析时间范围
+    try:
+        start_ts = _parse_time_arg(args.start)
+        end_ts = _parse_time_arg(args.end, is_end=True)
+    except ValueError as e:
+        return finish(str(e))
+    if start_ts and end_ts and end_ts < start_ts:
+        return finish("结束时间不能早于开始时间。")
+    summary['start_ts'], summary['end_ts'] = start_ts, end_ts
+
+    if not os.path.exists(DB_PATH):
+        return finish(f"消息数据库文件 '{DB_PATH}' 不存在。")
+
+    config = {
+        "start_ts": start_ts, "end_ts": end_ts, 
+        "name_style": cfg.get('name_style', 'default'),
+        "name_format": cfg.get('name_format', ''),
+        "profile_mgr": profile_mgr, "run_timestamp": run_timestamp,
+        "export_config": cfg
+    }
+    result = run_export(mode, target_uids, selection, scope_info, config, config_mgr, workdir, jobs, args.incremental, _make_profiler(args))
+    summary['files'] = result['files']
+    summary['messages'] = result['messages']
+    if result['profile_report']:
+        summary['profile_report'] = os.path.abspath(result['profile_report'])
+    return finish(result['error'])
+
+def _make_profiler(args):
+    """根据 --profile / --cprofile 参数创建性能分析器，未启用时返回 None。"""
+    if not (args.profile or args.cprofile): return None
+    return StageProfiler(args.cprofile)
 
 def main():
     """主执行函数，负责整个程序的流程控制。"""
     # 0. 解析命令行参数
     parser = argparse.ArgumentParser(description="QQ NT 聊天记录导出工具")
     parser.add_argument('--workdir', type=str, default='.', help='指定工作目录，应包含解密后的数据库文件，并将在此创建输出文件夹。')
+    parser.add_argument('--jobs', type=int, default=1, help='导出每个好友单独的文件时使用的并行进程数 (0 表示使用全部CPU核心)，默认为 1。')
+    parser.add_argument('--incremental', action='store_true', help='增量导出: 导出每个好友单独的文件时，只将上次运行之后的新消息续写到原文件。')
+    parser.add_argument('--profile', action='store_true', help='性能分析: 对导出的各阶段 (查询、解码、写入及热点函数) 计时，结束时打印摘要并在输出目录保存JSON报告。启用后使用单进程导出。')
+    parser.add_argument('--cprofile', type=str, metavar='FILE', help='性能分析时同时运行 cProfile，并将统计数据保存到指定文件 (隐含 --profile)。')
+    batch_group = parser.add_argument_group('非交互模式', '指定 --mode 后不再显示任何菜单，按以下参数直接导出，结束时打印一行JSON运行摘要。')
+    batch_group.add_argument('--mode', type=int, choices=range(1, 8), metavar='{1-7}',
+                             help='导出模式，与主菜单序号一致: 1/2/3 时间线 (全部好友/选择分组/选择好友)，4/5/6 单独文件 (同前)，7 用户信息列表。')
+    batch_group.add_argument('--group', type=str, help='模式 2/5 的分组: 分组ID，-2 表示非好友，all 表示全部分组。')
+    batch_group.add_argument('--uids', type=str, nargs='+', help='模式 3/6 的好友: UID或QQ号，可多个，用空格或逗号分隔。')
+    batch_group.add_argument('--start', type=str, help='开始时间，格式与交互模式相同 (例如 2025-06-23 08:30)，留空则不限。')
+    batch_group.add_argument('--end', type=str, help='结束时间，只输入日期则包含全天，留空则不限。')
+    batch_group.add_argument('--format', type=str, nargs='+', choices=list(_EXPORT_FORMATS), help='导出格式，可指定多个 (如 --format txt html，一次导出同时生成)，默认使用配置文件中的设置。')
+    batch_group.add_argument('--template', type=str, help='HTML模板文件名 (位于 html_templates 文件夹)，默认使用配置文件中的设置。')
+    batch_group.add_argument('--html-split', type=str, metavar='{off,month,N}', help='HTML 分页站点: month 每月一页，N 每页约 N 条消息，off 导出为单个HTML文件，默认使用配置文件中的设置。')
+    batch_group.add_argument('--name-style', type=str, choices=['default', 'nickname', 'qq', 'uid', 'custom'], help='用户标识格式，默认使用配置文件中的设置。')
+    batch_group.add_argument('--name-format', type=str, help='name-style 为 custom 时的格式，可用占位符: {nickname}, {remark}, {qq}, {uid}。')
+    batch_group.add_argument('--list-mode', type=str, choices=['friends', 'all'], default='friends', help='模式 7 的范围: 仅好友或全部缓存用户，默认为 friends。')
+    batch_group.add_argument('--summary', type=str, help='将JSON运行摘要额外写入指定文件。')
     args = parser.parse_args()
 
     # 设置基础路径变量
-    global DB_PATH, PROFILE_DB_PATH, OUTPUT_DIR, CONFIG_PATH, TEMPLATE_DIR_PATH, NON_FRIENDS_CACHE_PATH
+    global DB_PATH, PROFILE_DB_PATH, OUTPUT_DIR, CONFIG_PATH, TEMPLATE_DIR_PATH, NON_FRIENDS_CACHE_PATH, HASH_CACHE_PATH, INDEX_DB_PATH, DECODE_CACHE_PATH
     workdir = args.workdir
     script_dir = os.path.dirname(os.path.abspath(__file__))
     DB_PATH = os.path.join(workdir, _DB_FILENAME)
     PROFILE_DB_PATH = os.path.join(workdir, _PROFILE_DB_FILENAME)
+    INDEX_DB_PATH = os.path.join(workdir, _INDEX_DB_FILENAME)
+    DECODE_CACHE_PATH = os.path.join(workdir, _DECODE_CACHE_FILENAME)
     CONFIG_PATH = os.path.join(script_dir, _CONFIG_FILENAME)
     TEMPLATE_DIR_PATH = os.path.join(script_dir, _TEMPLATE_DIR_NAME)
     NON_FRIENDS_CACHE_PATH = os.path.join(script_dir, _NON_FRIENDS_CACHE_FILENAME)
+    HASH_CACHE_PATH = os.path.join(script_dir, _HASH_CACHE_FILENAME)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
 
 
     print("===== QQ聊天记录导出工具 =====")
     print(f"当前工作目录: {os.path.abspath(workdir)}")
+    if (args.profile or args.cprofile) and jobs > 1:
+        print("提示: 性能分析只能统计当前进程，本次使用单进程导出。")
+        jobs = 1
     
     # 1. 初始化，加载所有用户信息和配置
-    profile_mgr = ProfileManager(PROFILE_DB_PATH)
-    profile_mgr.load_data()
+    try:
+        profile_mgr = ProfileManager(PROFILE_DB_PATH)
+        profile_mgr.load_data()
+    except ProfileDataError as e:
+        if args.mode is not None: # 非交互模式：错误同样通过运行摘要与退出码报告
+            sys.exit(run_batch(args, None, None, workdir, jobs, load_error=str(e)))
+        print(f"错误: {e}")
+        exit(1)
     config_mgr = ConfigManager(CONFIG_PATH)
     profile_mgr.load_non_friends(config_mgr) # 扫描并加载非好友
 
     # 1.5. 动态设置最终的输出根目录
     OUTPUT_DIR = os.path.join(workdir, f"{profile_mgr.my_qq}_output")
+
+    # 非交互模式：直接按参数导出并退出
+    if args.mode is not None:
+        sys.exit(run_batch(args, profile_mgr, config_mgr, workdir, jobs))
     
     # 主循环，允许从子菜单返回
     while True:
@@ -1686,12 +3725,7 @@ def main():
         run_timestamp = f"_{int(datetime.now().timestamp())}"
         
         # 4. 根据模式执行不同操作
-        mode_titles = {
-            1: "导出合并的时间线单文件 > 全部好友", 2: "导出合并的时间线单文件 > 选择分组", 3: "导出合并的时间线单文件 > 选择好友",
-            4: "导出每个好友单独的文件 > 全部好友", 5: "导出每个好友单独的文件 > 选择分组", 6: "导出每个好友单独的文件 > 选择好友",
-            7: "导出用户信息列表", 8: "[设置]"
-        }
-        path_title = mode_titles.get(mode)
+        path_title = _MODE_TITLES.get(mode)
 
         if mode == 8: # 设置
             manage_export_config(path_title, config_mgr)
@@ -1707,36 +3741,16 @@ def main():
         
         # --- 导出聊天记录流程 ---
         
-        target_uids = []
-        is_timeline_mode = mode in [1, 2, 3]
-        scope_info = {}
         selection = None
         
         # 根据模式获取目标用户UIDs和范围信息
-        if mode == 1 or mode == 4:
-            target_uids = list(profile_mgr.friend_uids)
-            if config_mgr.config.get('export_non_friends'):
-                target_uids.extend(profile_mgr.non_friend_uids)
-            scope_info = {'type': 'timeline', 'selection_mode': 'all_friends'}
-        elif mode == 2 or mode == 5:
+        if mode == 2 or mode == 5:
             selection = select_group(profile_mgr, config_mgr, path_title)
             if selection is None: continue
-            if selection == 'all_groups':
-                target_uids = list(profile_mgr.friend_uids)
-                if config_mgr.config.get('export_non_friends', True):
-                     target_uids.extend(profile_mgr.non_friend_uids)
-                if mode == 5: target_uids = 'all_groups_structured'
-                scope_info = {'type': 'timeline', 'selection_mode': 'all_groups'}
-            else:
-                if selection == -2: # 非好友
-                    target_uids = profile_mgr.non_friend_uids
-                else: # 普通分组
-                    target_uids = [uid for uid, info in profile_mgr.all_users.items() if info.get('group_id') == selection and info.get('is_friend')]
-                scope_info = {'type': 'timeline', 'selection_mode': 'group', 'details': {'gid': selection, 'count': len(target_uids)}}
         elif mode == 3 or mode == 6:
-            target_uids = select_friends(profile_mgr, config_mgr, path_title)
-            if not target_uids: continue
-            scope_info = {'type': 'timeline', 'selection_mode': 'selected_friends', 'details': {'uids': target_uids}}
+            selection = select_friends(profile_mgr, config_mgr, path_title)
+            if not selection: continue
+        target_uids, scope_info = resolve_targets(mode, selection, profile_mgr, config_mgr)
 
         if not target_uids and target_uids != 'all_groups_structured':
             print("未选择任何用户或分组内无用户。")
@@ -1756,68 +3770,10 @@ def main():
             print(f"错误: 消息数据库文件 '{DB_PATH}' 不存在。")
             return
 
-        try:
-            with sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True) as con:
-                if is_timeline_mode:
-                    export_timeline(con, config, target_uids, scope_info)
-                else: # 单独文件模式
-                    if target_uids == 'all_groups_structured':
-                        print("\n即将按分组结构导出所有好友...")
-                        groups_data = {}
-                        # 处理好友
-                        for uid in profile_mgr.friend_uids:
-                            gid = profile_mgr.all_users.get(uid, {}).get('group_id', -1)
-                            if gid not in groups_data:
-                                g_name = profile_mgr.group_info.get(gid, f"分组{gid}")
-                                safe_g_name = re.sub(r'[\\/*?:"<>|]', "_", f"{gid}_{g_name}")
-                                g_dir = os.path.join(OUTPUT_DIR, "Individual", "Friends", safe_g_name)
-                                groups_data[gid] = {'dir': g_dir, 'users': []}
-                            groups_data[gid]['users'].append(uid)
-                        
-                        # 处理非好友
-                        if config_mgr.config.get('export_non_friends', True):
-                            non_friend_gid = -2
-                            non_friend_dir = os.path.join(OUTPUT_DIR, "Individual", "Friends", "_非好友_")
-                            groups_data[non_friend_gid] = {'dir': non_friend_dir, 'users': profile_mgr.non_friend_uids}
-
-                        total_users_count = len(profile_mgr.friend_uids) + (len(profile_mgr.non_friend_uids) if config_mgr.config.get('export_non_friends') else 0)
-                        current_user_index = 0
-                        
-                        sorted_gids = sorted(groups_data.keys())
-                        for gid in sorted_gids:
-                            group_info_struct = groups_data[gid]
-                            print(f"\n以下文件导出到 \"{os.path.relpath(group_info_struct['dir'], workdir)}\"")
-                            for user_uid in group_info_struct['users']:
-                                current_user_index += 1
-                                individual_scope_info = {'type': 'individual', 'friend_uid': user_uid}
-                                export_one_on_one(con, user_uid, config, individual_scope_info, group_info_struct['dir'], current_user_index, total_users_count)
-                    else:
-                        output_dir = os.path.join(OUTPUT_DIR, "Individual")
-                        if mode == 5:
-                             if selection == -2: #非好友
-                                 name = "_非好友_"
-                                 output_dir = os.path.join(output_dir, "Friends", name)
-                             else: # 普通分组
-                                 name = profile_mgr.group_info.get(selection, f"分组{selection}")
-                                 safe_name = re.sub(r'[\\/*?:"<>|]', "_", f"{selection}_{name}")
-                                 output_dir = os.path.join(output_dir, "Friends", safe_name)
-                        
-                        print(f"\n以下文件将导出到 \"{os.path.relpath(output_dir, workdir)}\"")
-                        total = len(target_uids)
-                        for i, uid in enumerate(target_uids):
-                            individual_scope_info = {'type': 'individual', 'friend_uid': uid}
-                            export_one_on_one(con, uid, config, individual_scope_info, output_dir, i + 1, total)
-
-        except sqlite3.Error as e:
-            print(f"\n数据库错误: {e}")
-        except Exception as e:
-            print(f"\n发生未知错误: {e}")
-            import traceback
-            traceback.print_exc()
-            
+        run_export(mode, target_uids, selection, scope_info, config, config_mgr, workdir, jobs, args.incremental, _make_profiler(args))
         break # 任务完成，退出主循环
 
     print("\n--- 所有任务已完成 ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+QQ NT 数据库解密工具 (纯 Python 实现)
+
+直接按页解密 QQ NT 的 SQLCipher 数据库，输出普通的 SQLite 数据库文件：
+- rand 只从文件开头的 QQ 文件头 (1024 字节) 中读取，不扫描整个数据库；
+- key 的计算与 qqnt_decrypt.sh 相同: md5(md5(uid) + rand)；
+- 解密参数与 qqnt_decrypt.sh 中传给 sqlcipher 的相同: kdf_iter = 4000, HMAC_SHA1, 页大小 4096；
+- 从文件头之后的偏移处读取各页，由多个进程并行解密后直接写入目标文件的对应位置，
+  不再生成去头副本、SQL 文本和重建的数据库等中间文件。
+- 增量解密 (--incremental)：在解密结果旁保存每一页的摘要清单 (<输出文件>.manifest)，
+  再次解密时只解密并覆写发生变化的页，耗时取决于变化量而不是数据库大小。
+
+用法:
+    python qqnt_decrypt.py nt_msg.db nt_msg.decrypt.db --key <key>
+    python qqnt_decrypt.py nt_msg.db nt_msg.decrypt.db --uid <uid>    (从文件头读取 rand 并计算 key)
+    python qqnt_decrypt.py nt_msg.db nt_msg.decrypt.db --key <key> --incremental
+    python qqnt_decrypt.py nt_msg.db --print-rand
+    python qqnt_decrypt.py --check    (检查 AES 库是否可用)
+
+依赖:
+- AES 解密需要 pycryptodome 或 cryptography 其中之一: pip install pycryptodome
+"""
+
+import os
+import sys
+import hmac
+import struct
+import hashlib
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+# --- 常量定义 ---
+QQ_HEADER_SIZE = 1024 # QQ 在 SQLCipher 数据库之前附加的文件头大小
+QQ_HEADER_MARKER = b"QQ_NT DB" # 文件头中的标记，rand 紧随其后
+RAND_LENGTH = 8
+PAGE_SIZE = 4096 # PRAGMA cipher_page_size
+KDF_ITER = 4000 # PRAGMA kdf_iter
+KDF_ALGORITHM = "sha512" # PBKDF2 的哈希算法 (qqnt_decrypt.sh 未修改 kdf_algorithm，即 SQLCipher 4 默认的 PBKDF2_HMAC_SHA512)
+HMAC_ALGORITHM = "sha1" # PRAGMA cipher_hmac_algorithm = HMAC_SHA1
+FAST_KDF_ITER = 2 # 由加密密钥派生 HMAC 密钥时的迭代次数 (SQLCipher 固定值)
+HMAC_SALT_MASK = 0x3a # HMAC 密钥的盐为数据库盐逐字节异或此值 (SQLCipher 固定值)
+KEY_SIZE = 32 # AES-256
+SALT_SIZE = 16 # 第1页开头的盐
+IV_SIZE = 16
+HMAC_SIZE = 20 # HMAC-SHA1 的长度
+RESERVE_SIZE = 48 # 每页末尾的保留区: IV + HMAC，向上取整到 AES 块大小的倍数
+SQLITE_HEADER = b"SQLite format 3\x00" # 解密后的第1页用它替换盐
+CHUNK_PAGES = 256 # 每个并行任务解密的页数 (1MB)
+EXIT_NO_AES = 2 # 缺少 AES 库时的退出码，qqnt_decrypt.sh 据此回退到 sqlcipher
+MANIFEST_SUFFIX = ".manifest" # 增量解密的页摘要清单，与解密后的数据库放在同一目录
+MANIFEST_MAGIC = b"QQNT-DECRYPT-MANIFEST 1\n" # 清单文件的格式标识，格式变化时旧清单自动失效
+
+def _load_aes_decryptor():
+    """返回 AES-256-CBC 解密函数 decrypt(key, iv, data)，没有可用的库时返回 None。"""
+    try:
+        from Crypto.Cipher import AES
+        return lambda key, iv, data: AES.new(key, AES.MODE_CBC, iv).decrypt(data)
+    except ImportError:
+        pass
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError:
+        return None
+
+    def decrypt(key, iv, data):
+        decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+        return decryptor.update(data) + decryptor.finalize()
+    return decrypt
+
+_AES_DECRYPT = _load_aes_decryptor()
+
+class DecryptError(Exception):
+    """密钥错误、文件损坏等导致无法解密的错误。"""
+
+def read_rand(db_path, header_size=QQ_HEADER_SIZE):
+    """从数据库文件头中读取 rand (8位字母数字)，只读取文件头部分。找不到时抛出 DecryptError。"""
+    with open(db_path, "rb") as f:
+        header = f.read(header_size)
+    return parse_rand(header)
+
+def parse_rand(header):
+    """
+    在文件头中找到 QQ_NT DB 标记，取其后的第一段可打印字符串并去掉非字母数字字符，
+    与 qqnt_decrypt.sh 中 strings | grep -A 1 'QQ_NT DB' 的结果相同。
+    """
+    pos = header.find(QQ_HEADER_MARKER)
+    if pos < 0:
+        raise DecryptError("文件头中未找到 QQ_NT DB 标记，可能不是 QQ NT 数据库。")
+    rest = header[pos + len(QQ_HEADER_MARKER):]
+    run = bytearray()
+    for byte in rest:
+        if 0x20 <= byte <= 0x7e or byte == 0x09:
+            run.append(byte)
+            continue
+        if len(run) >= 4: # strings 默认只输出长度不小于 4 的字符串
+            break
+        run.clear()
+    rand = "".join(ch for ch in run.decode("ascii") if ch.isascii() and ch.isalnum())
+    if len(rand) != RAND_LENGTH:
+        raise DecryptError(f"提取 rand 失败或提取到的值 '{rand}' 格式不正确。")
+    return rand
+
+def compute_key(uid, rand):
+    """由 QQ 账号的 uid 与文件头中的 rand 计算数据库密钥: md5(md5(uid) + rand)。"""
+    uid_hash = hashlib.md5(uid.encode("utf-8")).hexdigest()
+    return hashlib.md5(f"{uid_hash}{rand}".encode("utf-8")).hexdigest()
+
+def derive_keys(passphrase, salt, kdf_algorithm=KDF_ALGORITHM):
+    """按 SQLCipher 的方式由密码和盐派生 (AES 密钥, HMAC 密钥)。"""
+    cipher_key = hashlib.pbkdf2_hmac(kdf_algorithm, passphrase.encode("utf-8"), salt, KDF_ITER, KEY_SIZE)
+    hmac_salt = bytes(b ^ HMAC_SALT_MASK for b in salt)
+    hmac_key = hashlib.pbkdf2_hmac(kdf_algorithm, cipher_key, hmac_salt, FAST_KDF_ITER, KEY_SIZE)
+    return cipher_key, hmac_key
+
+def page_hmac_ok(page, pgno, hmac_key):
+    """校验一页的 HMAC (覆盖密文与 IV，再加上小端序的页号)。"""
+    offset = SALT_SIZE if pgno == 1 else 0
+    data_end = PAGE_SIZE - RESERVE_SIZE
+    mac = hmac.new(hmac_key, page[offset:data_end + IV_SIZE], HMAC_ALGORITHM)
+    mac.update(struct.pack("<I", pgno))
+    return hmac.compare_digest(mac.digest(), page[data_end + IV_SIZE:data_end + IV_SIZE + HMAC_SIZE])
+
+def decrypt_page(page, pgno, cipher_key, hmac_key=None):
+    """
+    解密一页，返回同样大小的明文页 (保留区填零)。第1页开头的盐替换为 SQLite 文件头。
+    提供 hmac_key 时先校验 HMAC，不通过时抛出 DecryptError。
+    """
+    if hmac_key is not None and not page_hmac_ok(page, pgno, hmac_key):
+        raise DecryptError(f"第 {pgno} 页 HMAC 校验失败，密钥错误或数据已损坏。")
+    offset = SALT_SIZE if pgno == 1 else 0
+    data_end = PAGE_SIZE - RESERVE_SIZE
+    iv = page[data_end:data_end + IV_SIZE]
+    plain = _AES_DECRYPT(cipher_key, iv, page[offset:data_end])
+    if pgno == 1:
+        plain = SQLITE_HEADER + plain
+    return plain + bytes(RESERVE_SIZE)
+
+def _decrypt_chunk(task):
+    """
+    并行任务：解密从 first_pgno 开始的 count 页，直接写入目标文件的对应位置，返回处理的页数。
+    task 为 (源路径, 目标路径, 文件头大小, 起始页号, 页数, AES 密钥, HMAC 密钥或None)。
+    """
+    src_path, dst_path, header_size, first_pgno, count, cipher_key, hmac_key = task
+    with open(src_path, "rb") as src:
+        src.seek(header_size + (first_pgno - 1) * PAGE_SIZE)
+        data = src.read(count * PAGE_SIZE)
+    out = bytearray(len(data))
+    for i in range(0, len(data), PAGE_SIZE):
+        out[i:i + PAGE_SIZE] = decrypt_page(data[i:i + PAGE_SIZE], first_pgno + i // PAGE_SIZE, cipher_key, hmac_key)
+    with open(dst_path, "r+b") as dst:
+        dst.seek((first_pgno - 1) * PAGE_SIZE)
+        dst.write(out)
+    return count
+
+def open_encrypted(src_path, key, header_size=QQ_HEADER_SIZE, kdf_algorithm=KDF_ALGORITHM):
+    """
+    读取盐并派生密钥，用第1页的 HMAC 检查密钥是否正确。
+    返回 (总页数, AES 密钥, HMAC 密钥)，密钥错误或文件大小不对时抛出 DecryptError。
+    """
+    size = os.path.getsize(src_path) - header_size
+    if size <= 0 or size % PAGE_SIZE:
+        raise DecryptError(f"文件大小 ({size + header_size} 字节) 与 {PAGE_SIZE} 字节的页大小不符，可能不是 QQ NT 数据库或文件不完整。")
+    with open(src_path, "rb") as f:
+        f.seek(header_size)
+        first_page = f.read(PAGE_SIZE)
+    cipher_key, hmac_key = derive_keys(key, first_page[:SALT_SIZE], kdf_algorithm)
+    if not page_hmac_ok(first_page, 1, hmac_key):
+        raise DecryptError("密钥错误: 第1页 HMAC 校验失败。")
+    return size // PAGE_SIZE, cipher_key, hmac_key
+
+def _run_tasks(tasks, jobs):
+    """执行解密任务，任务多于一个且 jobs > 1 时使用进程池。"""
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks: _decrypt_chunk(task)
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+            for _ in executor.map(_decrypt_chunk, tasks): pass
+
+def read_page_macs(src_path, page_count, header_size=QQ_HEADER_SIZE):
+    """
+    【增量解密】按顺序读取每一页保存的 HMAC 作为页摘要，返回连接在一起的字节串 (每页 HMAC_SIZE 字节)。
+    SQLCipher 每次写入页时都会生成新的随机 IV，HMAC 覆盖密文、IV 与页号，
+    因此 HMAC 不变即说明该页未被改写，无需另外计算哈希。
+    """
+    mac_start = PAGE_SIZE - RESERVE_SIZE + IV_SIZE
+    macs = bytearray()
+    with open(src_path, "rb") as f:
+        f.seek(header_size)
+        for _ in range(0, page_count, CHUNK_PAGES):
+            data = f.read(CHUNK_PAGES * PAGE_SIZE)
+            for i in range(0, len(data), PAGE_SIZE):
+                macs += data[i + mac_start:i + mac_start + HMAC_SIZE]
+    return bytes(macs)
+
+def _manifest_meta(dst_path, header_size, kdf_algorithm, salt, cipher_key, hmac_key, page_count):
+    stat = os.stat(dst_path)
+    return {
+        "header_size": header_size, "page_size": PAGE_SIZE, "kdf_iter": KDF_ITER, "kdf_algorithm": kdf_algorithm,
+        "salt": salt.hex(), "key_check": hashlib.blake2b(cipher_key + hmac_key, digest_size=16).hexdigest(),
+        "page_count": page_count, "output_size": stat.st_size, "output_mtime_ns": stat.st_mtime_ns,
+    }
+
+def load_manifest(dst_path):
+    """读取增量解密清单，返回 (元数据, 页摘要字节串)，不存在或已损坏时返回 (None, None)。"""
+    try:
+        with open(dst_path + MANIFEST_SUFFIX, "rb") as f:
+            if f.readline() != MANIFEST_MAGIC:
+                return None, None
+            meta = json.loads(f.readline())
+            macs = f.read()
+    except (OSError, ValueError):
+        return None, None
+    if not isinstance(meta, dict) or len(macs) != meta.get("page_count", -1) * HMAC_SIZE:
+        return None, None
+    return meta, macs
+
+def save_manifest(dst_path, meta, macs):
+    """写入增量解密清单 (先写临时文件再替换)。"""
+    manifest_path = dst_path + MANIFEST_SUFFIX
+    with open(manifest_path + ".tmp", "wb") as f:
+        f.write(MANIFEST_MAGIC)
+        f.write(json.dumps(meta).encode("utf-8") + b"\n")
+        f.write(macs)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def _changed_page_runs(old_macs, new_macs, page_count):
+    """比较新旧页摘要，返回发生变化 (含新增) 的连续页区间列表 [(起始页号, 页数)]，每段不超过 CHUNK_PAGES 页。"""
+    runs = []
+    old_count = len(old_macs) // HMAC_SIZE
+    for first in range(1, page_count + 1, CHUNK_PAGES):
+        count = min(CHUNK_PAGES, page_count - first + 1)
+        start, end = (first - 1) * HMAC_SIZE, (first - 1 + count) * HMAC_SIZE
+        if old_macs[start:end] == new_macs[start:end]:
+            continue # 整段未变化 (大多数情况)，跳过逐页比较
+        run_start = None
+        for pgno in range(first, first + count):
+            offset = (pgno - 1) * HMAC_SIZE
+            changed = pgno > old_count or old_macs[offset:offset + HMAC_SIZE] != new_macs[offset:offset + HMAC_SIZE]
+            if changed and run_start is None:
+                run_start = pgno
+            elif not changed and run_start is not None:
+                runs.append((run_start, pgno - run_start))
+                run_start = None
+        if run_start is not None:
+            runs.append((run_start, first + count - run_start))
+    return runs
+
+def decrypt_database(src_path, dst_path, key, jobs=None, verify=True, header_size=QQ_HEADER_SIZE, kdf_algorithm=KDF_ALGORITHM, incremental=False):
+    """
+    将 QQ NT 加密数据库 src_path 解密为普通的 SQLite 数据库 dst_path，返回 (总页数, 本次解密的页数)。
+    完整解密时先写入 dst_path.tmp，全部完成后再替换 dst_path，中途失败不会留下不完整的数据库。
+    :param jobs: 并行进程数，默认为 CPU 核心数；为 1 时在当前进程中解密。
+    :param verify: 是否校验每一页的 HMAC (第1页总会校验，用于检查密钥)。
+    :param incremental: 【增量解密】为 True 时在 dst_path 旁维护页摘要清单。清单与上次的输出文件、密钥、参数都一致时，
+                        只解密摘要发生变化的页并就地覆写 dst_path (数据库变小时截断)；否则执行完整解密。
+                        覆写前先删除清单，中途失败时下次会自动完整解密。
+    """
+    if _AES_DECRYPT is None:
+        raise DecryptError("缺少 AES 库，请运行: pip install pycryptodome")
+    page_count, cipher_key, hmac_key = open_encrypted(src_path, key, header_size, kdf_algorithm)
+    with open(src_path, "rb") as f:
+        f.seek(header_size)
+        salt = f.read(SALT_SIZE)
+    jobs = jobs or os.cpu_count() or 1
+    page_hmac_key = hmac_key if verify else None
+
+    # 1. 增量解密：清单有效时只处理变化的页
+    if incremental:
+        new_macs = read_page_macs(src_path, page_count, header_size)
+        old_meta, old_macs = load_manifest(dst_path)
+        if old_meta is not None and os.path.exists(dst_path):
+            expected = _manifest_meta(dst_path, header_size, kdf_algorithm, salt, cipher_key, hmac_key, old_meta.get("page_count"))
+            if old_meta == expected:
+                runs = _changed_page_runs(old_macs, new_macs, page_count)
+                os.remove(dst_path + MANIFEST_SUFFIX)
+                tasks = [(src_path, dst_path, header_size, first, count, cipher_key, page_hmac_key) for first, count in runs]
+                _run_tasks(tasks, jobs)
+                with open(dst_path, "r+b") as f:
+                    f.truncate(page_count * PAGE_SIZE)
+                save_manifest(dst_path, _manifest_meta(dst_path, header_size, kdf_algorithm, salt, cipher_key, hmac_key, page_count), new_macs)
+                return page_count, sum(count for _, count in runs)
+        if os.path.exists(dst_path + MANIFEST_SUFFIX):
+            os.remove(dst_path + MANIFEST_SUFFIX)
+
+    # 2. 完整解密
+    tmp_path = f"{dst_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.truncate(page_count * PAGE_SIZE)
+    tasks = [(src_path, tmp_path, header_size, first, min(CHUNK_PAGES, page_count - first + 1), cipher_key, page_hmac_key)
+             for first in range(1, page_count + 1, CHUNK_PAGES)]
+    try:
+        _run_tasks(tasks, jobs)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    if incremental:
+        save_manifest(dst_path, _manifest_meta(dst_path, header_size, kdf_algorithm, salt, cipher_key, hmac_key, page_count), new_macs)
+    return page_count, page_count
+
+def main():
+    parser = argparse.ArgumentParser(description="QQ NT 数据库解密工具 (纯 Python 实现)")
+    parser.add_argument("src", nargs="?", help="QQ NT 加密数据库文件 (如 nt_msg.db)")
+    parser.add_argument("dst", nargs="?", help="输出的已解密数据库文件 (如 nt_msg.decrypt.db)")
+    key_group = parser.add_mutually_exclusive_group()
+    key_group.add_argument("--key", help="数据库密钥 (32位)")
+    key_group.add_argument("--uid", help="QQ 账号的 uid，提供时从文件头读取 rand 并计算密钥")
+    parser.add_argument("--print-rand", action="store_true", help="只打印文件头中的 rand 并退出")
+    parser.add_argument("--check", action="store_true", help=f"只检查 AES 库是否可用，不可用时退出码为 {EXIT_NO_AES}")
+    parser.add_argument("--jobs", type=int, default=0, help="并行进程数 (0 表示使用全部CPU核心)，默认为 0。")
+    parser.add_argument("--no-verify", action="store_true", help="不校验每一页的 HMAC (第1页仍会校验，用于检查密钥)，速度更快。")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"增量解密: 在输出文件旁保存页摘要清单 (<输出文件>{MANIFEST_SUFFIX})，再次解密时只处理发生变化的页。")
+    parser.add_argument("--kdf-algorithm", choices=["sha1", "sha256", "sha512"], default=KDF_ALGORITHM,
+                        help=f"PBKDF2 的哈希算法，默认为 {KDF_ALGORITHM} (SQLCipher 4)，SQLCipher 3 创建的数据库为 sha1。")
+    args = parser.parse_args()
+
+    if args.check:
+        return 0 if _AES_DECRYPT is not None else EXIT_NO_AES
+    if not args.src:
+        parser.error("需要提供加密数据库文件。")
+    try:
+        if args.print_rand:
+            print(read_rand(args.src))
+            return 0
+        if not args.dst or not (args.key or args.uid):
+            parser.error("解密需要提供输出文件以及 --key 或 --uid。")
+        if _AES_DECRYPT is None:
+            print("错误: 缺少 AES 库 (pycryptodome 或 cryptography)。")
+            print("请运行: pip install pycryptodome")
+            return EXIT_NO_AES
+        key = args.key or compute_key(args.uid, read_rand(args.src))
+        print(f"正在解密 '{args.src}' -> '{args.dst}'...")
+        page_count, decrypted = decrypt_database(args.src, args.dst, key, args.jobs, not args.no_verify,
+                                                 kdf_algorithm=args.kdf_algorithm, incremental=args.incremental)
+    except (DecryptError, OSError) as e:
+        print(f"错误: {e}")
+        return 1
+    if decrypted < page_count:
+        print(f"增量解密完成，共 {page_count} 页，其中 {decrypted} 页有变化 ({decrypted * PAGE_SIZE / 1024 / 1024:.1f} MB)。")
+    else:
+        print(f"解密完成，共 {page_count} 页 ({page_count * PAGE_SIZE / 1024 / 1024:.1f} MB)。")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,10 @@ C_NC='\033[0m' # No Color
 # --- 全局变量定义 ---
 QQ_BASE_PATH=""
 CMD_OUTPUT_DIR="$1"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PY_DECRYPTOR="${SCRIPT_DIR}/qqnt_decrypt.py" # 纯 Python 解密器，可用时优先使用
+DECRYPT_BACKEND=""
+PYTHON_BIN="" # python 的完整路径 (su 环境中的 PATH 可能不包含 Termux 的 python)
 
 # --- 函数定义 (无变动) ---
 error_exit() { echo -e "${C_RED}[错误] $1${C_NC}" >&2; exit 1; }
@@ -29,14 +33,25 @@ decrypt_database() {
 
     echo "----------------------------------------"
     log_info "正在处理: ${C_YELLOW}${db_name}${C_NC}"
-    rm -f "$output_db_path" "$clean_db_path" "$sql_dump_path" "$decrypted_db_path"
+    rm -f "$output_db_path" "$clean_db_path" "$sql_dump_path"
     if ! su -c "test -f '$db_source_path'" >/dev/null 2>&1; then
         log_warn "源文件 '$db_source_path' 不存在，跳过此文件。"
         return
     fi
+    if [ "$DECRYPT_BACKEND" = "python" ]; then
+        # 以 Root 权限直接读取源文件并按页解密到目标文件，不复制整个数据库，也不生成去头副本与SQL文本；
+        # 保留上次的解密结果，增量解密只读取并覆写变化的页
+        if ! su -c "'$PYTHON_BIN' '$PY_DECRYPTOR' '$db_source_path' '$decrypted_db_path' --key '$final_key' --incremental && chmod 666 '$decrypted_db_path' '${decrypted_db_path}.manifest'"; then
+            log_warn "解密失败。可能是Key不正确或数据库版本不兼容。"
+            return
+        fi
+        log_success "解密完成: ${C_GREEN}${decrypted_db_path}${C_NC}"
+        return
+    fi
     if ! su -c "cp '$db_source_path' '$output_db_path' && chmod 666 '$output_db_path'"; then
         error_exit "复制文件 '$db_name' 失败。请检查权限。"
     fi
+    rm -f "$decrypted_db_path" "${decrypted_db_path}.manifest"
     tail -c +1025 "$output_db_path" > "$clean_db_path"
     sqlcipher "$clean_db_path" >/dev/null <<EOF
 PRAGMA key = '$final_key';
@@ -63,7 +78,16 @@ EOF
 # 1. 环境与权限检查 (无变动)
 log_info "正在检查所需环境..."
 if ! command -v su &> /dev/null; then error_exit "未找到 su 命令。此脚本需要在 Root 环境下运行。"; fi
-if ! command -v sqlcipher &> /dev/null; then error_exit "未找到 sqlcipher 命令。请先通过 'pkg install sqlcipher' 安装它。"; fi
+if command -v python &> /dev/null && [ -f "$PY_DECRYPTOR" ] && python "$PY_DECRYPTOR" --check >/dev/null 2>&1; then
+    DECRYPT_BACKEND="python"
+    PYTHON_BIN="$(command -v python)"
+elif command -v sqlcipher &> /dev/null; then
+    DECRYPT_BACKEND="sqlcipher"
+    log_warn "未找到 Python AES 库，将使用 sqlcipher 解密 (较慢，且需要额外的磁盘空间)。可通过 'pip install pycryptodome' 启用快速解密。"
+else
+    error_exit "未找到可用的解密方式。请通过 'pip install pycryptodome' 安装 AES 库，或通过 'pkg install sqlcipher' 安装 sqlcipher。"
+fi
+if ! command -v strings &> /dev/null; then error_exit "未找到 strings 命令。请先通过 'pkg install binutils' 安装它。"; fi
 if ! command -v md5sum &> /dev/null; then error_exit "未找到 md5sum 命令。请先通过 'pkg install coreutils' 安装它。"; fi
 log_success "环境检查通过。"
 echo ""
@@ -196,7 +220,8 @@ DB_PATH="${QQ_BASE_PATH}${QQ_DB_DIR_SUFFIX}${QQ_path_hash}/nt_msg.db"
 if ! su -c "test -f '$DB_PATH'" >/dev/null 2>&1; then
     error_exit "数据库文件 'nt_msg.db' 不存在！请确认该QQ账号是否已正常登录并生成了消息数据库。"
 fi
-rand_raw=$(su -c "strings '$DB_PATH' | grep -E -A 1 'QQ_NT DB\$?' | tail -n 1")
+# rand 位于文件开头的 QQ 文件头 (1024 字节) 中，只读取这一部分
+rand_raw=$(su -c "head -c 1024 '$DB_PATH'" | strings | grep -E -A 1 'QQ_NT DB$?' | tail -n 1)
 rand=$(echo -n "$rand_raw" | sed 's/[^a-zA-Z0-9]//g')
 if [ -z "$rand" ] || [ ${#rand} -ne 8 ]; then
     error_exit "提取 rand 失败或提取到的值 '$rand' 格式不正确。"
@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+QQ NT 聊天记录全文搜索工具
+
+功能:
+- 将 c2c_msg_table 中的消息按 export_chats.py 的解码逻辑解码一次，连同会话、时间戳、发送者一起写入
+  全文索引数据库 nt_msg.search.db (与解密后的数据库放在同一目录)。索引使用 SQLite FTS5 的 trigram 分词，
+  中文无需分词即可按任意子串查找。
+- 搜索时只读取索引数据库，命中的消息附带同一会话中前后若干条消息作为上下文，不再查询或解码原始消息。
+- 增量更新：解密数据库变化后 (例如重新解密了新的聊天记录)，下次搜索前只解码新增与内容变化的行，
+  并删除已不存在的行；解码设置 (用户标识格式、内容显示开关) 变化时重新建立索引。
+
+用法:
+    python search_chats.py 关键词
+    python search_chats.py "晚上 吃饭" --peer 12345678 --start 2025-01-01 --context 3 --limit 50
+    python search_chats.py --rebuild    (只建立/更新索引，不搜索)
+
+依赖:
+- 与 export_chats.py 相同 (blackboxprotobuf)。
+- SQLite 3.34 及以上 (FTS5 trigram 分词)，版本过低时退化为逐行匹配。
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+
+import export_chats as ec
+
+# --- 常量定义 ---
+_SEARCH_DB_FILENAME = "nt_msg.search.db" # 全文索引数据库，与解密后的数据库放在同一目录
+_SEARCH_DB_VERSION = "2" # 全文索引数据库的结构版本，结构变化时自动重建
+_INSERT_BATCH_SIZE = 2000 # 建立索引时每批写入的行数
+_PROGRESS_INTERVAL = 100000 # 建立索引时每解码多少条消息打印一次进度 (须为 _INSERT_BATCH_SIZE 的整数倍)
+_TRIGRAM_MIN_LENGTH = 3 # trigram 分词只能匹配不少于3个字符的关键词，更短的关键词逐行匹配
+_DEFAULT_LIMIT = 20 # 默认显示的搜索结果数
+_DEFAULT_CONTEXT = 2 # 默认在命中消息前后各显示的消息数
+_NEWLINE_PLACEHOLDER = "[%\\n%]" # decode_message_content 使用的换行占位符
+
+SEARCH_DB_PATH = ""
+
+def _setup_paths(workdir):
+    """设置 export_chats 与本工具的路径变量，与 export_chats 的 main() 中的设置方式一致。"""
+    global SEARCH_DB_PATH
+    script_dir = os.path.dirname(os.path.abspath(ec.__file__))
+    ec.DB_PATH = os.path.join(workdir, ec._DB_FILENAME)
+    ec.PROFILE_DB_PATH = os.path.join(workdir, ec._PROFILE_DB_FILENAME)
+    ec.DECODE_CACHE_PATH = os.path.join(workdir, ec._DECODE_CACHE_FILENAME)
+    ec.CONFIG_PATH = os.path.join(script_dir, ec._CONFIG_FILENAME)
+    ec.NON_FRIENDS_CACHE_PATH = os.path.join(script_dir, ec._NON_FRIENDS_CACHE_FILENAME)
+    SEARCH_DB_PATH = os.path.join(workdir, _SEARCH_DB_FILENAME)
+
+# --- 全文索引数据库 ---
+# 结构:
+# - meta:     结构版本、解码设置签名、是否启用 FTS5、源数据库指纹 (大小、修改时间、inode)
+# - messages: 每条消息一行，id 为源表 rowid；digest 为 40800 字段的 BLAKE2b 摘要 (与解码缓存的键相同)，
+#             与会话、时间戳、发送者一起用于发现变化的行；text 为消息正文 (与 TXT 导出相同，但换行占位符还原为换行符，
+#             使搜索不受占位符影响)，quote 为引用摘要，解码无结果的行两者均为 NULL；tip 表示互动提示 (显示为系统提示)
+# - msg_fts:  以 messages 为外部内容表的 FTS5 索引 (只索引 text)，由触发器随 messages 同步
+
+def _decode_signature(config_mgr):
+    """影响索引中消息文本的设置签名，变化后需要重新建立索引。"""
+    config = config_mgr.config
+    return json.dumps({
+        'name_style': config.get('name_style', 'default'), 'name_format': config.get('name_format', ''),
+        **{key: config.get(key) for key in ('show_recall', 'show_recall_suffix', 'show_poke', 'show_voice_to_text', 'show_media_info')}
+    }, sort_keys=True, ensure_ascii=False)
+
+def _create_schema(con):
+    """建立表结构，返回是否启用了 FTS5 (SQLite 不支持 trigram 分词时只建立 messages 表)。"""
+    con.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE messages (id INTEGER PRIMARY KEY, peer TEXT, ts INTEGER, sender TEXT, digest BLOB, text TEXT, quote TEXT, tip INTEGER);
+        CREATE INDEX messages_peer_ts ON messages (peer, ts, id);
+    """)
+    try:
+        con.execute("CREATE VIRTUAL TABLE msg_fts USING fts5(text, content='messages', content_rowid='id', tokenize='trigram')")
+        return True
+    except sqlite3.OperationalError as e:
+        print(f"警告: 当前 SQLite ({sqlite3.sqlite_version}) 不支持 FTS5 trigram 分词，搜索时将逐行匹配。错误: {e}")
+        return False
+
+def _create_triggers(con):
+    """建立同步 msg_fts 的触发器 (建立索引时先批量写入 messages 再整体重建 msg_fts，之后才建立触发器)。"""
+    con.executescript("""
+        CREATE TRIGGER messages_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO msg_fts (rowid, text) VALUES (new.id, new.text);
+        END;
+        CREATE TRIGGER messages_ad AFTER DELETE ON messages BEGIN
+            INSERT INTO msg_fts (msg_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+        CREATE TRIGGER messages_au AFTER UPDATE ON messages BEGIN
+            INSERT INTO msg_fts (msg_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO msg_fts (rowid, text) VALUES (new.id, new.text);
+        END;
+    """)
+
+def _message_text(parts):
+    """将解码后的消息部分转换为索引中的 (正文, 引用摘要, 是否为互动提示)，格式与 TXT 导出相同，换行占位符还原为换行符。"""
+    if not parts: return None, None, 0
+    text, quote = ec._split_parts(parts)
+    text = text.replace(_NEWLINE_PLACEHOLDER, "\n")
+    tip = 1 if ec._is_interactive_tip(parts) else 0
+    if quote is None: return text, None, tip
+    quote_text = f"[引用-> [{ec.format_timestamp(quote['ts'])}] {ec._quote_names(quote, True)}: {quote['text']} <-]"
+    return text, quote_text.replace(_NEWLINE_PLACEHOLDER, "\n"), tip
+
+def _row_digest(content):
+    """源表 40800 字段的摘要，供 SQL 比较使用；非二进制内容 (无法解码) 返回 None。"""
+    return ec._content_digest(content) if isinstance(content, bytes) else None
+
+def _sync_messages(con, profile_mgr, config_mgr):
+    """
+    【增量更新】将源数据库 (已附加为 src) 与 messages 表同步，返回 (解码的行数, 删除的行数)。
+    只解码 messages 中不存在、或会话、时间戳、发送者、内容摘要与源表不一致的行；源表中已删除的行从索引中删除。
+    """
+    name_style = config_mgr.config.get('name_style', 'default')
+    name_format = config_mgr.config.get('name_format', '')
+    export_config = config_mgr.config
+    con.create_function("content_digest", 1, _row_digest, deterministic=True)
+    cur = con.cursor()
+    cur.execute(f"DELETE FROM messages WHERE id NOT IN (SELECT rowid FROM src.{ec.TABLE_NAME})")
+    deleted = cur.rowcount
+
+    # 先记下需要解码的行再逐批写入，避免在读取 messages 的查询进行中修改它
+    cur.execute("DROP TABLE IF EXISTS temp.pending")
+    cur.execute(f"""
+        CREATE TEMP TABLE pending AS SELECT m.rowid AS id FROM src.{ec.TABLE_NAME} m LEFT JOIN messages s ON s.id = m.rowid
+        WHERE s.id IS NULL OR s.peer IS NOT m.`{ec.COL_PEER_UID}` OR s.ts IS NOT m.`{ec.COL_TIMESTAMP}`
+           OR s.sender IS NOT m.`{ec.COL_SENDER_UID}` OR s.digest IS NOT content_digest(m.`{ec.COL_MSG_CONTENT}`)
+    """)
+    read_cur = con.cursor()
+    read_cur.execute(f"""
+        SELECT m.`{ec.COL_TIMESTAMP}`, m.`{ec.COL_SENDER_UID}`, m.`{ec.COL_PEER_UID}`, m.`{ec.COL_MSG_CONTENT}`,
+               m.rowid
+        FROM temp.pending p JOIN src.{ec.TABLE_NAME} m ON m.rowid = p.id ORDER BY p.id
+    """)
+    rows = ec._iter_rows(read_cur)
+    if ec.DECODE_CACHE is not None:
+        rows = ec.DECODE_CACHE.prefetching(rows)
+
+    decoded = 0
+    batch = []
+    upsert = ("INSERT INTO messages (id, peer, ts, sender, digest, text, quote, tip) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+              "ON CONFLICT (id) DO UPDATE SET peer = excluded.peer, ts = excluded.ts, sender = excluded.sender, "
+              "digest = excluded.digest, text = excluded.text, quote = excluded.quote, tip = excluded.tip")
+    for ts, s_uid, p_uid, content, rowid in rows:
+        parts = ec.decode_message_content(content, ts, profile_mgr, name_style, name_format, export_config, None, p_uid)
+        text, quote, tip = _message_text(parts)
+        batch.append((rowid, p_uid, ts, s_uid, _row_digest(content), text, quote, tip))
+        if len(batch) >= _INSERT_BATCH_SIZE:
+            cur.executemany(upsert, batch)
+            decoded += len(batch)
+            batch.clear()
+            if decoded % _PROGRESS_INTERVAL == 0: print(f"  已解码 {decoded} 条消息...")
+    if batch:
+        cur.executemany(upsert, batch)
+        decoded += len(batch)
+    cur.execute("DROP TABLE temp.pending")
+    return decoded, deleted
+
+def _read_meta(path):
+    """读取全文索引数据库的 meta 表，不存在或无法读取时返回 None。"""
+    if not os.path.exists(path): return None
+    try:
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as con:
+            return dict(con.execute("SELECT key, value FROM meta").fetchall())
+    except sqlite3.Error:
+        return None
+
+def _write_meta(con, meta):
+    con.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
+
+def ensure_search_db(profile_mgr, config_mgr, rebuild=False):
+    """
+    确保全文索引数据库与当前消息数据库一致：源数据库未变化时直接使用；变化时增量更新；
+    索引不存在、结构版本或解码设置变化 (或 rebuild 为 True) 时重新建立。返回索引数据库是否可用。
+    """
+    if not os.path.exists(ec.DB_PATH):
+        print(f"错误: 消息数据库文件 '{ec.DB_PATH}' 不存在。")
+        return False
+    fingerprint = ec._db_fingerprint(ec.DB_PATH)
+    signature = _decode_signature(config_mgr)
+    meta = None if rebuild else _read_meta(SEARCH_DB_PATH)
+    reusable = meta is not None and meta.get('version') == _SEARCH_DB_VERSION and meta.get('decode_signature') == signature
+    if reusable and meta.get('source_fingerprint') == fingerprint:
+        return True
+
+    use_decode_cache = config_mgr.config.get('use_decode_cache', True)
+    if use_decode_cache: ec.open_decode_cache()
+    start = time.perf_counter()
+    try:
+        # 1. 增量更新：在同一个事务中同步，中途失败时索引保持原状
+        if reusable:
+            print("消息数据库已更新，正在增量更新全文索引...")
+            con = sqlite3.connect(SEARCH_DB_PATH)
+            try:
+                con.execute("ATTACH DATABASE ? AS src", (f"file:{ec.DB_PATH}?mode=ro",))
+                with con:
+                    decoded, deleted = _sync_messages(con, profile_mgr, config_mgr)
+                    _write_meta(con, {'source_fingerprint': fingerprint, 'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+            finally:
+                con.close()
+            print(f"全文索引已更新: 解码 {decoded} 条新增或变化的消息，删除 {deleted} 条，耗时 {time.perf_counter() - start:.1f} 秒。")
+            return True
+
+        # 2. 重新建立：先写入临时文件，完成后再替换，避免留下不完整的索引
+        print("正在建立全文索引 (每条消息只需解码一次，之后只增量更新)...")
+        tmp_path = SEARCH_DB_PATH + ".tmp"
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        con = sqlite3.connect(tmp_path)
+        try:
+            con.execute("PRAGMA journal_mode = OFF")
+            con.execute("PRAGMA synchronous = OFF")
+            use_fts = _create_schema(con)
+            con.execute("ATTACH DATABASE ? AS src", (f"file:{ec.DB_PATH}?mode=ro",))
+            decoded, _ = _sync_messages(con, profile_mgr, config_mgr)
+            if use_fts:
+                con.execute("INSERT INTO msg_fts (msg_fts) VALUES ('rebuild')")
+                _create_triggers(con)
+            _write_meta(con, {
+                'version': _SEARCH_DB_VERSION, 'decode_signature': signature, 'fts': '1' if use_fts else '0',
+                'source_fingerprint': fingerprint, 'source_path': os.path.abspath(ec.DB_PATH),
+                'built_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            con.commit()
+        finally:
+            con.close()
+        os.replace(tmp_path, SEARCH_DB_PATH)
+        print(f"全文索引建立完成: 共 {decoded} 条消息，耗时 {time.perf_counter() - start:.1f} 秒。")
+        return True
+    except (sqlite3.Error, OSError) as e:
+        print(f"错误: 无法建立全文索引数据库。错误: {e}")
+        return False
+    finally:
+        if use_decode_cache: ec.close_decode_cache()
+
+# --- 搜索 ---
+def _like_pattern(term):
+    """将关键词转换为 LIKE 的子串匹配模式 (转义通配符)。"""
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _build_search_query(terms, use_fts, peer_uids=None, start_ts=None, end_ts=None):
+    """
+    构建搜索条件，返回 (WHERE 子句, 参数)。每个关键词都必须出现在消息正文中。
+    启用 FTS5 时不少于3个字符的关键词通过 msg_fts 的 trigram 索引匹配，其余关键词逐行匹配。
+    """
+    clauses, params = ["s.text IS NOT NULL"], []
+    fts_terms = [t for t in terms if use_fts and len(t) >= _TRIGRAM_MIN_LENGTH]
+    if fts_terms:
+        clauses.append("s.id IN (SELECT rowid FROM msg_fts WHERE msg_fts MATCH ?)")
+        params.append(" AND ".join('"' + t.replace('"', '""') + '"' for t in fts_terms))
+    for term in terms:
+        if term in fts_terms: continue
+        clauses.append("s.text LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(term))
+    if peer_uids:
+        clauses.append(f"s.peer IN ({', '.join('?' for _ in peer_uids)})")
+        params.extend(peer_uids)
+    if start_ts:
+        clauses.append("s.ts >= ?")
+        params.append(start_ts)
+    if end_ts:
+        clauses.append("s.ts <= ?")
+        params.append(end_ts)
+    return " AND ".join(clauses), params
+
+_COLUMNS = "s.id, s.peer, s.ts, s.sender, s.text, s.quote, s.tip"
+
+def search_messages(con, query, peer_uids=None, start_ts=None, end_ts=None, limit=_DEFAULT_LIMIT, context=_DEFAULT_CONTEXT):
+    """
+    在全文索引中搜索同时包含 query 中全部关键词 (以空白分隔) 的消息，按时间从新到旧返回 (命中总数, 结果列表)。
+    每个结果为 {"hit": 命中行, "before": [之前的行], "after": [之后的行]}，行为 (id, 会话, 时间戳, 发送者, 正文, 引用摘要, 是否为互动提示)，
+    上下文取自同一会话，跳过解码无结果的行。
+    """
+    terms = query.split()
+    meta = dict(con.execute("SELECT key, value FROM meta").fetchall())
+    where, params = _build_search_query(terms, meta.get('fts') == '1', peer_uids, start_ts, end_ts)
+    total = con.execute(f"SELECT COUNT(*) FROM messages s WHERE {where}", params).fetchone()[0]
+    hits = con.execute(f"SELECT {_COLUMNS} FROM messages s WHERE {where} ORDER BY s.ts DESC, s.id DESC LIMIT ?",
+                       params + [limit]).fetchall()
+    results = []
+    for hit in hits:
+        msg_id, peer, ts = hit[0], hit[1], hit[2]
+        before = con.execute(
+            f"SELECT {_COLUMNS} FROM messages s WHERE s.peer = ? AND (s.ts, s.id) < (?, ?) "
+            f"AND (s.text IS NOT NULL OR s.quote IS NOT NULL) ORDER BY s.ts DESC, s.id DESC LIMIT ?",
+            (peer, ts, msg_id, context)).fetchall() if context else []
+        after = con.execute(
+            f"SELECT {_COLUMNS} FROM messages s WHERE s.peer = ? AND (s.ts, s.id) > (?, ?) "
+            f"AND (s.text IS NOT NULL OR s.quote IS NOT NULL) ORDER BY s.ts ASC, s.id ASC LIMIT ?",
+            (peer, ts, msg_id, context)).fetchall() if context else []
+        results.append({"hit": hit, "before": before[::-1], "after": after})
+    return total, results
+
+def _format_line(row, names):
+    """将索引中的一行格式化为与 TXT 导出相同的 "[时间] 发送者: 正文"，互动提示与 TXT 导出一样显示为系统提示。"""
+    _, _, ts, s_uid, text, quote, tip = row
+    if tip:
+        sender = "[系统提示]"
+    else:
+        s_uid = ec.get_placeholder(s_uid)
+        sender = names.get(s_uid, s_uid)
+        if sender == "N/A": sender = "[系统提示]"
+    body = " ".join(p for p in (quote, text) if p).replace("\n", _NEWLINE_PLACEHOLDER)
+    return f"[{ec.format_timestamp(ts)}] {sender}: {body}"
+
+def print_results(total, results, profile_mgr, config_mgr, elapsed):
+    names = profile_mgr.get_name_table(config_mgr.config.get('name_style', 'default'), config_mgr.config.get('name_format', ''))
+    for index, result in enumerate(results, 1):
+        peer = ec.get_placeholder(result['hit'][1])
+        print(f"\n--- [{index}] 与 {names.get(peer, peer)} 的聊天 ---")
+        for row in result['before']: print(f"  {_format_line(row, names)}")
+        print(f"> {_format_line(result['hit'], names)}")
+        for row in result['after']: print(f"  {_format_line(row, names)}")
+    print(f"\n共找到 {total} 条消息，显示最新的 {len(results)} 条 (搜索耗时 {elapsed * 1000:.1f} 毫秒)。")
+
+def main():
+    parser = argparse.ArgumentParser(description="QQ NT 聊天记录全文搜索工具")
+    parser.add_argument('query', nargs='?', help='搜索关键词，多个关键词用空格分隔 (需同时包含)。省略时只建立/更新索引。')
+    parser.add_argument('--workdir', type=str, default='.', help='指定工作目录，应包含解密后的数据库文件，全文索引数据库也保存在此。')
+    parser.add_argument('--peer', type=str, nargs='+', help='只搜索指定好友的聊天记录: UID或QQ号，可多个，用空格或逗号分隔。')
+    parser.add_argument('--start', type=str, help='开始时间，格式与 export_chats.py 相同 (例如 2025-06-23 08:30)。')
+    parser.add_argument('--end', type=str, help='结束时间，只输入日期则包含全天。')
+    parser.add_argument('--limit', type=int, default=_DEFAULT_LIMIT, help=f'最多显示的结果数，默认为 {_DEFAULT_LIMIT}。')
+    parser.add_argument('--context', type=int, default=_DEFAULT_CONTEXT, help=f'在每条结果前后各显示的消息数，默认为 {_DEFAULT_CONTEXT}。')
+    parser.add_argument('--rebuild', action='store_true', help='重新建立全文索引 (默认只增量更新)。')
+    args = parser.parse_args()
+
+    _setup_paths(args.workdir)
+    try:
+        start_ts = ec._parse_time_arg(args.start)
+        end_ts = ec._parse_time_arg(args.end, is_end=True)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 1
+
+    try:
+        profile_mgr = ec.ProfileManager(ec.PROFILE_DB_PATH)
+        profile_mgr.load_data()
+    except ec.ProfileDataError as e:
+        print(f"错误: {e}")
+        return 1
+    config_mgr = ec.ConfigManager(ec.CONFIG_PATH)
+    peer_uids = None
+    if args.peer:
+        peer_uids, unknown = ec._resolve_uid_args(args.peer, profile_mgr)
+        if unknown:
+            print(f"错误: 无法识别的好友: {', '.join(unknown)}")
+            return 1
+
+    if not ensure_search_db(profile_mgr, config_mgr, args.rebuild):
+        return 1
+    if not args.query or not args.query.split():
+        return 0
+
+    with sqlite3.connect(f"file:{SEARCH_DB_PATH}?mode=ro", uri=True) as con:
+        started = time.perf_counter()
+        total, results = search_messages(con, args.query, peer_uids, start_ts, end_ts, max(args.limit, 0), max(args.context, 0))
+        elapsed = time.perf_counter() - started
+    print_results(total, results, profile_mgr, config_mgr, elapsed)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,7 @@ import json
 import base64
 import traceback
 import argparse
+import itertools
 import os
 
 # 尝试导入 blackboxprotobuf，如果失败则给出提示
@@ -41,9 +42,42 @@ def recursively_process_object(obj):
     return obj
 
 
+def _quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _write_json_array(f, objects):
+    """逐个写出 JSON 数组的元素，格式与 json.dump(..., indent=4) 完全相同，返回写出的元素数。"""
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=4)
+    count = 0
+    for obj in objects:
+        # 将单个元素包装成数组序列化，去掉首尾的 "[\n" 与 "\n]" 即为带一级缩进的元素文本
+        text = encoder.encode([obj])
+        f.write("[\n" if count == 0 else ",\n")
+        f.write(text[2:-2])
+        count += 1
+    f.write("\n]" if count else "[]")
+    return count
+
+
+def _write_ndjson(f, objects):
+    """每行写出一个 JSON 对象 (NDJSON)，返回写出的行数。"""
+    encoder = json.JSONEncoder(ensure_ascii=False)
+    count = 0
+    for obj in objects:
+        f.write(encoder.encode(obj))
+        f.write("\n")
+        count += 1
+    return count
+
+
 def export_table_to_json(
-    db_path, table_name, json_path, enable_columns=None, ignore_columns=None
+    db_path, table_name, json_path, enable_columns=None, ignore_columns=None, output_format="json"
 ):
+    """
+    流式导出: 逐行读取、解码并立即写出，内存占用只与单行大小有关。
+    output_format 为 "json" (JSON 数组) 或 "ndjson" (每行一个 JSON 对象)。
+    """
     conn = None
     enable_columns = enable_columns or []
     ignore_columns = ignore_columns or []
@@ -52,7 +86,6 @@ def export_table_to_json(
             print(f"错误: 数据库文件不存在 '{db_path}'")
             return
         conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         print(f"成功以只读模式连接到数据库: {db_path}")
         cursor.execute(
@@ -62,15 +95,8 @@ def export_table_to_json(
         if cursor.fetchone() is None:
             print(f"错误: 在数据库中未找到表 '{table_name}'")
             return
-        cursor.execute(f"SELECT * FROM {table_name}")
-        rows = cursor.fetchall()
-        print(f"从表 '{table_name}' 中查询到 {len(rows)} 行数据。")
-        if not rows:
-            print("表中没有数据，生成空的 JSON 文件。")
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump([], f)
-            return
-        original_columns = rows[0].keys()
+        cursor.execute(f"SELECT * FROM {_quote_identifier(table_name)} LIMIT 0")
+        original_columns = [desc[0] for desc in cursor.description]
         final_columns = []
         if enable_columns:
             final_columns = [col for col in original_columns if col in enable_columns]
@@ -83,11 +109,28 @@ def export_table_to_json(
         else:
             final_columns = list(original_columns)
             print("默认模式，将导出所有列。")
-        processed_data_list = [{key: row[key] for key in final_columns} for row in rows]
-        fully_processed_data = recursively_process_object(processed_data_list)
+
+        # 只读取需要导出的列，逐行从游标取出并处理，不在内存中累积；由首行判断表是否为空，无需另行 COUNT(*)
+        column_sql = ", ".join(_quote_identifier(col) for col in final_columns) or "NULL"
+        cursor.execute(f"SELECT {column_sql} FROM {_quote_identifier(table_name)}")
+        first_row = cursor.fetchone()
+        if first_row is None:
+            print(f"表 '{table_name}' 中没有数据，生成空的 JSON 文件。")
+            with open(json_path, "w", encoding="utf-8") as f:
+                if output_format == "json":
+                    json.dump([], f)
+            return
+
+        def iter_objects():
+            for row in itertools.chain((first_row,), cursor):
+                yield recursively_process_object(dict(zip(final_columns, row)))
+
         with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(fully_processed_data, f, ensure_ascii=False, indent=4)
-        print(f"数据已成功导出到: {json_path}")
+            if output_format == "ndjson":
+                count = _write_ndjson(f, iter_objects())
+            else:
+                count = _write_json_array(f, iter_objects())
+        print(f"共 {count} 行数据已成功导出到: {json_path}")
     except sqlite3.Error as e:
         print(f"数据库错误: {e}")
     except Exception as e:
@@ -106,6 +149,13 @@ def main():
     parser.add_argument(
         "-o", "--output", help="输出的 JSON 文件路径 (可选, 默认将根据输入自动生成)"
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["json", "ndjson"],
+        default="json",
+        help="输出格式: json 为 JSON 数组 (默认)，ndjson 为每行一个 JSON 对象。两种格式均为流式写出。",
+    )
     column_group = parser.add_mutually_exclusive_group()
     column_group.add_argument(
         "-e",
@@ -124,13 +174,14 @@ def main():
         json_path = args.output
     else:
         db_basename = os.path.splitext(os.path.basename(args.db_path))[0]
-        json_path = f"{db_basename}.{args.table_name}.json"
+        json_path = f"{db_basename}.{args.table_name}.{args.format}"
     export_table_to_json(
         db_path=args.db_path,
         table_name=args.table_name,
         json_path=json_path,
         enable_columns=args.enable,
         ignore_columns=args.ignore,
+        output_format=args.format,
     )
 
 